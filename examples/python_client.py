@@ -4,6 +4,7 @@ Perfect for AI character integration like Neuro-sama
 """
 
 import asyncio
+import itertools
 import websockets
 import json
 from typing import Dict, List, Optional
@@ -14,6 +15,7 @@ class HimeDisplayClient:
         self.url = f"ws://{host}:{port}"
         self.websocket = None
         self.connected = False
+        self._ids = itertools.count(1)
 
     async def connect(self):
         """Connect to Hime Display WebSocket server"""
@@ -32,12 +34,16 @@ class HimeDisplayClient:
         if not self.connected:
             raise ConnectionError("Not connected to Hime Display")
 
-        command = {"action": action, "data": data}
+        command_id = next(self._ids)
+        command = {"id": command_id, "action": action, "data": data}
         await self.websocket.send(json.dumps(command))
         
-        # Wait for acknowledgment
-        response = await self.websocket.recv()
-        return json.loads(response)
+        # Wait for this command's acknowledgment, skipping the broadcasts
+        # (command results, trace reports) that arrive on the same socket
+        while True:
+            response = json.loads(await self.websocket.recv())
+            if response.get("type") in ("ack", "error") and response.get("id") == command_id:
+                return response
 
     async def disconnect(self):
         """Close connection"""
@@ -9,11 +9,28 @@ This version is safer for models that may not have:
 """
 
 import asyncio
-import json
+import logging
 import random
-import time
 from typing import Optional, List, Dict, Set
-import websockets
+from emotion_classifier import EmotionClassifier
+from event_log import event, setup_logging
+from hime_client import HimeDisplayConnection, apply_emotion, paced_frames
+from viseme_track import SpeechTrack, play_track, viseme_track
+import virtual_clock
+from virtual_clock import Clock
+
+# Per-frame and per-reaction output; see event_log for levels and limits
+LOG_COMMAND_ERROR = event("adaptive", "command_error", logging.WARNING, "⚠ Command error ({action}): {error}", per_second=1)
+LOG_EMOTION = event("adaptive", "emotion", logging.INFO, "→ Setting emotion: {emotion}", per_second=2)
+LOG_APPLIED = event("adaptive", "applied", logging.DEBUG, "  Applied {count} parameters")
+LOG_NO_PARAMS = event("adaptive", "no_params", logging.WARNING, "  ⚠ No compatible parameters for emotion {emotion}", per_second=0.1)
+LOG_SPEAKING = event("adaptive", "speaking", logging.INFO, "→ Speaking: {duration:.1f}s", per_second=2)
+LOG_ANIMATION = event("adaptive", "animation", logging.INFO, "→ Animation: {group}", per_second=2)
+LOG_NO_GROUPS = event("adaptive", "no_groups", logging.DEBUG, "  ℹ No compatible animation groups found")
+LOG_LOOK = event("adaptive", "look", logging.DEBUG, "→ Looking (x={x:.1f}, y={y:.1f})")
+LOG_NO_GAZE = event("adaptive", "no_gaze", logging.INFO, "  ℹ Model doesn't support gaze control", per_second=0.01)
+LOG_REACTION = event("adaptive", "reaction", logging.DEBUG, "→ Reacting to {count} chat messages")
+LOG_IDLE_ERROR = event("adaptive", "idle_error", logging.WARNING, "Idle behavior error: {error}", per_second=0.2)
 
 
 class ModelCapabilities:
@@ -65,26 +82,32 @@ class AdaptiveAnimationController:
     
     COMMON_GROUPS = ['idle', 'motion', 'greeting', 'tap_head', 'tap_body']
     
-    def __init__(self, ws_url: str = "ws://localhost:8765"):
+    def __init__(self, ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
         self.ws_url = ws_url
-        self.ws = None
-        self.connected = False
+        # Time and sleeps for every behavior (virtual in simulations)
+        self.clock = clock or virtual_clock.CLOCK
+        # Shared pipelined client; replaced on connect if ws_url was changed
+        self.display = HimeDisplayConnection(ws_url)
         self.capabilities = ModelCapabilities()
         self.last_animation_time = 0
         self.idle_task = None
         self.speaking = False
+        # ParamMouthForm held by the current emotion; speech shapes the mouth around it
+        self.mouth_form: Optional[float] = None
         
+    @property
+    def connected(self) -> bool:
+        return self.display.connected
+    
     async def connect(self):
         """Connect to Hime Display"""
-        try:
-            self.ws = await websockets.connect(self.ws_url)
-            self.connected = True
-            await self.ws.recv()  # Welcome message
+        if self.display.ws_url != self.ws_url:
+            self.display = HimeDisplayConnection(self.ws_url)
+        if await self.display.connect():
             print("✓ Connected to Hime Display")
             return True
-        except Exception as e:
-            print(f"✗ Connection failed: {e}")
-            return False
+        print("✗ Connection failed")
+        return False
     
     async def send_command(self, action: str, data: dict):
         """Send command to Hime Display with error handling"""
@@ -92,14 +115,9 @@ class AdaptiveAnimationController:
             await self.connect()
         
         try:
-            command = {"action": action, "data": data}
-            await self.ws.send(json.dumps(command))
-            response = await self.ws.recv()
-            result = json.loads(response)
-            return result
+            return await self.display.send_command(action, data)
         except Exception as e:
-            print(f"⚠ Command error ({action}): {e}")
-            self.connected = False
+            LOG_COMMAND_ERROR(action=action, error=e)
             return {"success": False, "error": str(e)}
     
     async def test_parameter(self, param_id: str) -> bool:
@@ -136,7 +154,7 @@ class AdaptiveAnimationController:
             for param in params:
                 if await self.test_parameter(param):
                     tested_count += 1
-                await asyncio.sleep(0.05)  # Don't spam
+                await self.clock.sleep(0.05)  # Don't spam
         
         print(f"  ✓ Found {tested_count} supported parameters")
         
@@ -145,7 +163,7 @@ class AdaptiveAnimationController:
         for group in self.COMMON_GROUPS:
             if await self.test_animation_group(group):
                 group_count += 1
-            await asyncio.sleep(0.1)
+            await self.clock.sleep(0.1)
         
         print(f"  ✓ Found {group_count} animation groups")
         
@@ -167,7 +185,7 @@ class AdaptiveAnimationController:
     
     async def set_emotion_adaptive(self, emotion: str):
         """Set emotion using only available parameters"""
-        print(f"→ Setting emotion: {emotion}")
+        LOG_EMOTION(emotion=emotion)
         
         # Build parameter list based on what's available
         params_to_set = []
@@ -207,10 +225,15 @@ class AdaptiveAnimationController:
                 params_to_set.append({"parameterId": param_id, "value": value})
         
         if params_to_set:
-            await self.send_command("setParameters", {"parameters": params_to_set})
-            print(f"  Applied {len(params_to_set)} parameters")
+            # Hold the expression until changed; eyes and head go back to blink and tracking
+            await apply_emotion(self.send_command, params_to_set,
+                                {pid for preset in emotion_configs.values() for pid in preset})
+            self.mouth_form = next(
+                (p["value"] for p in params_to_set if p["parameterId"] == "ParamMouthForm"), None
+            )
+            LOG_APPLIED(count=len(params_to_set))
         else:
-            print(f"  ⚠ No compatible parameters for emotion")
+            LOG_NO_PARAMS(emotion=emotion)
     
     async def speak_animation_adaptive(self, duration: float, intensity: float = 0.7):
         """Speaking animation using available parameters"""
@@ -221,31 +244,46 @@ class AdaptiveAnimationController:
             self.speaking = False
             return
         
-        print(f"→ Speaking animation: {duration:.1f}s")
-        
-        # Disable auto breath if supported
-        await self.send_command("setAutoBreath", {"enabled": False})
-        
-        # Simple mouth animation
-        frames = int(duration * 10)
-        for i in range(frames):
-            value = intensity * abs((i % 4) - 2) / 2
-            await self.send_command("setParameter", {
-                "parameterId": "ParamMouthOpenY",
-                "value": value
-            })
-            await asyncio.sleep(0.1)
-        
-        # Close mouth
-        await self.send_command("setParameter", {
-            "parameterId": "ParamMouthOpenY",
-            "value": 0.0
-        })
+        LOG_SPEAKING(duration=duration)
         
-        # Re-enable auto breath
-        await self.send_command("setAutoBreath", {"enabled": True})
+        try:
+            # Simple mouth animation (held values win over breath): a 0.4s open/close cycle
+            # sampled at the link's adaptive frame rate
+            async for elapsed in paced_frames(duration, self.display.send_rate, self.clock):
+                value = intensity * abs((elapsed * 10) % 4 - 2) / 2
+                await self.send_command("setParameter", {
+                    "parameterId": "ParamMouthOpenY",
+                    "value": value,
+                    "hold": True,
+                    "ttl": 300
+                })
+            
+            # Hand the mouth back to the model
+            await self.send_command("releaseParameters", {"parameterIds": ["ParamMouthOpenY"]})
+        finally:
+            self.speaking = False
+    
+    async def speak_track_adaptive(self, track: SpeechTrack, intensity: float = 0.7):
+        """Lip-sync a viseme track using available mouth parameters"""
+        if not self.capabilities.supports_param("ParamMouthOpenY"):
+            return
         
+        LOG_SPEAKING(duration=track.duration)
+        self.speaking = True
+        try:
+            await play_track(
+                self.send_command, track, intensity,
+                base_form=self.mouth_form,
+                shape=self.capabilities.supports_param("ParamMouthForm"),
+                clock=self.clock,
+            )
+        finally:
+            self.speaking = False
+    
+    async def stop_speaking(self):
+        """Reset the mouth after an interrupted speaking animation"""
         self.speaking = False
+        await self.send_command("releaseParameters", {"parameterIds": ["ParamMouthOpenY"]})
     
     async def play_animation_adaptive(self, emotion: str = None):
         """Play animation if model supports it"""
@@ -264,11 +302,11 @@ class AdaptiveAnimationController:
         for group in groups_to_try:
             if self.capabilities.supports_group(group):
                 await self.send_command("playRandomMotion", {"group": group})
-                print(f"  Played animation: {group}")
-                self.last_animation_time = time.time()
+                LOG_ANIMATION(group=group)
+                self.last_animation_time = self.clock.monotonic()
                 return
         
-        print("  ℹ No compatible animation groups found")
+        LOG_NO_GROUPS()
     
     async def look_at_adaptive(self, x: float, y: float):
         """Look direction using available parameters"""
@@ -288,15 +326,15 @@ class AdaptiveAnimationController:
         
         if params_to_set:
             await self.send_command("setParameters", {"parameters": params_to_set})
-            print(f"→ Looking (x={x:.1f}, y={y:.1f})")
+            LOG_LOOK(x=x, y=y)
         else:
-            print("  ℹ Model doesn't support gaze control")
+            LOG_NO_GAZE()
     
     async def idle_behavior_loop(self):
         """Background idle behaviors"""
         while True:
             try:
-                await asyncio.sleep(random.uniform(5, 10))
+                await self.clock.sleep(random.uniform(5, 10))
                 
                 if not self.speaking:
                     # Random look
@@ -307,15 +345,15 @@ class AdaptiveAnimationController:
                     
                     # Occasional idle animation
                     if (self.capabilities.has_motions and 
-                        time.time() - self.last_animation_time > 15):
+                        self.clock.monotonic() - self.last_animation_time > 15):
                         if self.capabilities.supports_group('idle'):
                             await self.send_command("playRandomMotion", {"group": "idle"})
-                            self.last_animation_time = time.time()
-                            print("→ Idle animation")
+                            self.last_animation_time = self.clock.monotonic()
+                            LOG_ANIMATION(group="idle")
             
             except Exception as e:
-                print(f"Idle behavior error: {e}")
-                await asyncio.sleep(5)
+                LOG_IDLE_ERROR(error=e)
+                await self.clock.sleep(5)
     
     def start_idle_behaviors(self):
         """Start idle behaviors"""
@@ -327,15 +365,16 @@ class AdaptiveAnimationController:
         """Close connection"""
         if self.idle_task:
             self.idle_task.cancel()
-        if self.ws:
-            await self.ws.close()
+        await self.display.close()
 
 
 class SimpleBridge:
     """Simplified bridge for basic models"""
     
-    def __init__(self):
-        self.controller = AdaptiveAnimationController()
+    def __init__(self, ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
+        self.controller = AdaptiveAnimationController(ws_url, clock)
+        # Heavier model off the event loop when configured, keywords otherwise
+        self.classifier = EmotionClassifier(fallback=self.detect_emotion)
         self.running = False
     
     async def initialize(self):
@@ -371,16 +410,23 @@ class SimpleBridge:
         y = random.uniform(-0.1, 0.2)
         await self.controller.look_at_adaptive(x, y)
     
-    async def on_ai_response_complete(self, response: str):
-        """Called when AI completes response (for emotion and speaking)"""
-        # Simple emotion detection
-        emotion = "neutral"
+    def detect_emotion(self, response: str) -> str:
+        """Simple keyword emotion detection"""
         if any(word in response.lower() for word in ['happy', '!', 'great', 'awesome']):
-            emotion = "happy"
+            return "happy"
         elif '?' in response:
-            emotion = "neutral"
+            return "neutral"
         elif any(word in response.lower() for word in ['sad', 'sorry']):
-            emotion = "sad"
+            return "sad"
+        return "neutral"
+    
+    async def classify_emotion(self, response: str) -> str:
+        """Emotion from the classifier, falling back to keywords past its deadline"""
+        return await self.classifier.classify(response)
+    
+    async def on_ai_response_complete(self, response: str):
+        """Called when AI completes response (for emotion and speaking)"""
+        emotion = await self.classify_emotion(response)
         
         # Set emotion
         await self.controller.set_emotion_adaptive(emotion)
@@ -389,11 +435,17 @@ class SimpleBridge:
         if response.count('!') >= 2:
             await self.controller.play_animation_adaptive(emotion)
         
-        # Speaking animation
-        words = len(response.split())
-        duration = min(words * 0.15, 8.0)
-        if duration > 0.3:
-            await self.controller.speak_animation_adaptive(duration)
+        # Lip-sync the whole response
+        track = viseme_track(response)
+        if track.duration > 0.3:
+            await self.controller.speak_track_adaptive(track)
+    
+    async def react_to_messages(self, messages: list):
+        """Cheap reaction to chat messages the AI won't answer"""
+        if any('?' in message.text for message in messages):
+            # Tilt head slightly when chat asks questions
+            await self.controller.look_at_adaptive(0.1, 0.1)
+            LOG_REACTION(count=len(messages))
     
     async def on_ai_response(self, response: str):
         """Process AI response adaptively (legacy method)"""
@@ -403,13 +455,14 @@ class SimpleBridge:
         """Shutdown"""
         print("\nShutting down...")
         self.running = False
+        self.classifier.close()
         await self.controller.close()
 
 
 # Can be imported by lmstudio_integration.py
-async def test_adaptive_bridge():
+async def test_adaptive_bridge(ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
     """Test the adaptive bridge"""
-    bridge = SimpleBridge()
+    bridge = SimpleBridge(ws_url, clock)
     
     if not await bridge.initialize():
         return
@@ -425,22 +478,24 @@ async def test_adaptive_bridge():
     print("Testing animations...")
     print("=" * 60)
     
+    clock = bridge.controller.clock
     for response in test_responses:
         await bridge.on_ai_response(response)
-        await asyncio.sleep(3)
+        await clock.sleep(3)
     
     print("\n✓ Test complete!")
     print("Idle behaviors will continue. Press Ctrl+C to stop.")
     
     try:
         while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
+            await clock.sleep(1)
+    finally:
         await bridge.shutdown()
 
 
 if __name__ == "__main__":
     print("Testing Adaptive Animation Bridge...\n")
+    setup_logging()
     try:
         asyncio.run(test_adaptive_bridge())
     except KeyboardInterrupt:
@@ -0,0 +1,104 @@
+"""
+Background animation jobs for the Hime Display MCP servers
+
+Long-running tools (like `speak`) schedule their animation here and return
+a job id straight away, so the AI's next step doesn't wait for the whole
+animation to finish. Jobs can be inspected and cancelled by id.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Coroutine, Dict, List, Optional
+
+
+class AnimationJob:
+    """A single animation running in the background"""
+
+    def __init__(self, job_id: str, name: str, task: asyncio.Task):
+        self.job_id = job_id
+        self.name = name
+        self.task = task
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        """One of: running, completed, cancelled, failed"""
+        if not self.task.done():
+            return "running"
+        if self.task.cancelled():
+            return "cancelled"
+        if self.error is not None:
+            return "failed"
+        return "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary used by the job_status tool"""
+        end = self.finished_at if self.finished_at is not None else time.time()
+        info = {
+            "job_id": self.job_id,
+            "name": self.name,
+            "state": self.state,
+            "elapsed": round(end - self.started_at, 2),
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """Schedules and tracks background animation jobs"""
+
+    def __init__(self, max_finished: int = 50):
+        self.jobs: "OrderedDict[str, AnimationJob]" = OrderedDict()
+        self.max_finished = max_finished
+        self._ids = itertools.count(1)
+
+    def start(self, name: str, coro: Coroutine) -> AnimationJob:
+        """Run a coroutine in the background and return its job"""
+        job_id = f"job-{next(self._ids)}"
+        task = asyncio.create_task(coro)
+        job = AnimationJob(job_id, name, task)
+        task.add_done_callback(lambda t: self._on_done(job))
+        self.jobs[job_id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[AnimationJob]:
+        """Look up a job by id"""
+        return self.jobs.get(job_id)
+
+    def active(self) -> List[AnimationJob]:
+        """Jobs that are still running"""
+        return [job for job in self.jobs.values() if job.state == "running"]
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a running job and wait for its cleanup to finish"""
+        job = self.jobs.get(job_id)
+        if job is None or job.task.done():
+            return False
+        job.task.cancel()
+        try:
+            await job.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        return True
+
+    async def cancel_all(self):
+        """Cancel every running job (used on shutdown)"""
+        for job in self.active():
+            await self.cancel(job.job_id)
+
+    def _on_done(self, job: AnimationJob):
+        job.finished_at = time.time()
+        if not job.task.cancelled() and job.task.exception() is not None:
+            job.error = str(job.task.exception())
+
+    def _prune(self):
+        # Keep the history bounded; running jobs are never dropped
+        finished = [job_id for job_id, job in self.jobs.items() if job.task.done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
@@ -12,12 +12,77 @@ Features:
 """
 
 import asyncio
-import json
+import logging
 import re
 import random
-import time
 from typing import Optional, List, Dict
-import websockets
+from client_metrics import start_from_env
+from event_log import event, setup_logging
+from loop_monitor import monitor_from_env
+from motion_baker import BakedMotionCache, ParameterTimeline, cache_from_env
+from session_log import recorder_from_env, stop_recording
+from emotion_classifier import EmotionClassifier
+from hime_client import HimeDisplayConnection, apply_emotion, paced_frames, split_expression
+from viseme_track import SpeechTrack, play_track, viseme_track
+import virtual_clock
+from virtual_clock import Clock
+
+# Per-frame and per-reaction output; see event_log for levels and limits
+LOG_COMMAND_ERROR = event("bridge", "command_error", logging.WARNING, "Command error: {error}", per_second=1)
+LOG_EMOTION = event("bridge", "emotion", logging.INFO, "→ Emotion: {emotion}", per_second=2)
+LOG_SPEAKING = event("bridge", "speaking", logging.INFO, "→ Speaking: {duration:.1f}s", per_second=2)
+LOG_ANIMATION = event("bridge", "animation", logging.INFO, "→ Animation: {group}", per_second=2)
+LOG_BAKED = event("bridge", "baked", logging.INFO, "→ Baked reaction: {key}")
+LOG_LOOK = event("bridge", "look", logging.DEBUG, "→ {reason}")
+LOG_IDLE_ERROR = event("bridge", "idle_error", logging.WARNING, "Idle behavior error: {error}", per_second=0.2)
+
+
+# Parameters each emotion holds until the next one
+EMOTIONS = {
+    "happy": [
+        {"parameterId": "ParamMouthForm", "value": 1.0},
+        {"parameterId": "ParamEyeLOpen", "value": 0.9},
+        {"parameterId": "ParamEyeROpen", "value": 0.9},
+    ],
+    "sad": [
+        {"parameterId": "ParamMouthForm", "value": -1.0},
+        {"parameterId": "ParamEyeLOpen", "value": 0.6},
+        {"parameterId": "ParamEyeROpen", "value": 0.6},
+        {"parameterId": "ParamAngleY", "value": -5},
+    ],
+    "surprised": [
+        {"parameterId": "ParamMouthOpenY", "value": 0.8},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+    ],
+    "angry": [
+        {"parameterId": "ParamMouthForm", "value": -0.5},
+        {"parameterId": "ParamEyeLOpen", "value": 0.7},
+        {"parameterId": "ParamEyeROpen", "value": 0.7},
+    ],
+    "confused": [
+        {"parameterId": "ParamMouthForm", "value": 0.2},
+        {"parameterId": "ParamAngleX", "value": 10},
+    ],
+    "neutral": [
+        {"parameterId": "ParamMouthForm", "value": 0.0},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+    ],
+    "worried": [
+        {"parameterId": "ParamMouthForm", "value": -0.3},
+        {"parameterId": "ParamBrowLY", "value": 0.3},
+        {"parameterId": "ParamBrowRY", "value": 0.3},
+    ],
+    "excited": [
+        {"parameterId": "ParamMouthForm", "value": 1.0},
+        {"parameterId": "ParamMouthOpenY", "value": 0.3},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+    ]
+}
+# Everything an emotion may hold: switching emotions releases what the new one doesn't set
+EMOTION_PARAMETER_IDS = sorted({p["parameterId"] for preset in EMOTIONS.values() for p in preset})
 
 
 class EmotionAnalyzer:
@@ -70,100 +135,67 @@ class EmotionAnalyzer:
 class AnimationController:
     """Controls character animations and behaviors"""
     
-    def __init__(self, ws_url: str = "ws://localhost:8765"):
+    def __init__(self, ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
         self.ws_url = ws_url
-        self.ws = None
-        self.connected = False
+        # Time and sleeps for every behavior (virtual in simulations)
+        self.clock = clock or virtual_clock.CLOCK
+        # Shared pipelined client; replaced on connect if ws_url was changed
+        self.display = HimeDisplayConnection(ws_url)
         self.last_animation_time = 0
         self.idle_task = None
         self.speaking = False
+        # ParamMouthForm held by the current emotion; speech shapes the mouth around it
+        self.mouth_form: Optional[float] = None
+        # Heavier model off the event loop when configured, keywords otherwise
+        self.classifier = EmotionClassifier(fallback=EmotionAnalyzer.detect_emotion)
+        # Reactions baked into motions (see speak_reaction); None streams every frame
+        self.baked_motions: Optional[BakedMotionCache] = None
+        # Timeline the commands being sent are captured into while baking
+        self._capture: Optional[ParameterTimeline] = None
         
+    @property
+    def connected(self) -> bool:
+        return self.display.connected
+    
     async def connect(self):
         """Connect to Hime Display"""
-        try:
-            self.ws = await websockets.connect(self.ws_url)
-            self.connected = True
-            await self.ws.recv()  # Welcome message
+        if self.display.ws_url != self.ws_url:
+            self.display = HimeDisplayConnection(self.ws_url)
+        if await self.display.connect():
             print("✓ Connected to Hime Display")
             return True
-        except Exception as e:
-            print(f"✗ Connection failed: {e}")
-            return False
+        print("✗ Connection failed")
+        return False
     
     async def send_command(self, action: str, data: dict):
         """Send command to Hime Display"""
         if not self.connected:
             await self.connect()
+        if self._capture is not None and data.get("hold"):
+            # Only held values stay on screen; one-shot sets are gone the next frame
+            self._capture.record(action, data)
         
         try:
-            command = {"action": action, "data": data}
-            await self.ws.send(json.dumps(command))
-            response = await self.ws.recv()
-            return json.loads(response)
+            return await self.display.send_command(action, data)
         except Exception as e:
-            print(f"Command error: {e}")
-            self.connected = False
+            LOG_COMMAND_ERROR(action=action, error=e)
             return None
     
     async def set_emotion(self, emotion: str):
         """Set character emotion with smooth transition"""
-        emotions = {
-            "happy": [
-                {"parameterId": "ParamMouthForm", "value": 1.0},
-                {"parameterId": "ParamEyeLOpen", "value": 0.9},
-                {"parameterId": "ParamEyeROpen", "value": 0.9},
-            ],
-            "sad": [
-                {"parameterId": "ParamMouthForm", "value": -1.0},
-                {"parameterId": "ParamEyeLOpen", "value": 0.6},
-                {"parameterId": "ParamEyeROpen", "value": 0.6},
-                {"parameterId": "ParamAngleY", "value": -5},
-            ],
-            "surprised": [
-                {"parameterId": "ParamMouthOpenY", "value": 0.8},
-                {"parameterId": "ParamEyeLOpen", "value": 1.0},
-                {"parameterId": "ParamEyeROpen", "value": 1.0},
-            ],
-            "angry": [
-                {"parameterId": "ParamMouthForm", "value": -0.5},
-                {"parameterId": "ParamEyeLOpen", "value": 0.7},
-                {"parameterId": "ParamEyeROpen", "value": 0.7},
-            ],
-            "confused": [
-                {"parameterId": "ParamMouthForm", "value": 0.2},
-                {"parameterId": "ParamAngleX", "value": 10},
-            ],
-            "neutral": [
-                {"parameterId": "ParamMouthForm", "value": 0.0},
-                {"parameterId": "ParamEyeLOpen", "value": 1.0},
-                {"parameterId": "ParamEyeROpen", "value": 1.0},
-            ],
-            "worried": [
-                {"parameterId": "ParamMouthForm", "value": -0.3},
-                {"parameterId": "ParamBrowLY", "value": 0.3},
-                {"parameterId": "ParamBrowRY", "value": 0.3},
-            ],
-            "excited": [
-                {"parameterId": "ParamMouthForm", "value": 1.0},
-                {"parameterId": "ParamMouthOpenY", "value": 0.3},
-                {"parameterId": "ParamEyeLOpen", "value": 1.0},
-                {"parameterId": "ParamEyeROpen", "value": 1.0},
-            ]
-        }
-        
-        params = emotions.get(emotion, emotions["neutral"])
-        await self.send_command("setParameters", {"parameters": params})
-        print(f"→ Emotion: {emotion}")
+        params = EMOTIONS.get(emotion, EMOTIONS["neutral"])
+        # Hold the expression until changed; eyes and head go back to blink and tracking
+        await apply_emotion(self.send_command, params, EMOTION_PARAMETER_IDS)
+        self.mouth_form = next(
+            (p["value"] for p in params if p["parameterId"] == "ParamMouthForm"), None
+        )
+        LOG_EMOTION(emotion=emotion)
     
     async def speak_animation(self, duration: float, intensity: float = 0.7):
         """Animate character speaking"""
         self.speaking = True
         
-        # Disable auto breath
-        await self.send_command("setAutoBreath", {"enabled": False})
-        
-        # Animate mouth with varied pattern for natural look
-        frames = int(duration * 10)
+        # Animate mouth with varied pattern for natural look (held values win over breath)
         patterns = [
             [0.0, 0.5, 0.8, 0.5, 0.2, 0.6, 0.9, 0.4],  # Pattern 1
             [0.0, 0.3, 0.7, 0.9, 0.6, 0.3, 0.1, 0.5],  # Pattern 2
@@ -172,25 +204,82 @@ class AnimationController:
         
         pattern = random.choice(patterns)
         
-        for i in range(frames):
-            value = intensity * pattern[i % len(pattern)]
+        # Pattern steps are 0.1s apart; frames come at the link's adaptive rate and interpolate
+        async for elapsed in paced_frames(duration, self.display.send_rate, self.clock):
+            position = elapsed * 10
+            step = int(position)
+            current, following = pattern[step % len(pattern)], pattern[(step + 1) % len(pattern)]
+            value = intensity * (current + (following - current) * (position - step))
             await self.send_command("setParameter", {
                 "parameterId": "ParamMouthOpenY",
-                "value": value
+                "value": value,
+                "hold": True,
+                "ttl": 300
             })
-            await asyncio.sleep(0.1)
-        
-        # Close mouth
-        await self.send_command("setParameter", {
-            "parameterId": "ParamMouthOpenY",
-            "value": 0.0
-        })
         
-        # Re-enable auto breath
-        await self.send_command("setAutoBreath", {"enabled": True})
+        # Hand the mouth back to the model
+        await self.send_command("releaseParameters", {"parameterIds": ["ParamMouthOpenY"]})
         
         self.speaking = False
-        print(f"→ Speaking: {duration}s")
+        LOG_SPEAKING(duration=duration)
+    
+    async def speak_reaction(self, emotion: str, track: SpeechTrack, intensity: float = 0.7):
+        """
+        Set an emotion and lip-sync `track`, as one baked motion when possible.
+
+        With a baked motion cache, the first time a track is spoken with an
+        emotion it is streamed as usual and baked; when the same words come
+        again they are a single playMotion. The command also carries what
+        set_emotion would leave behind: the previous emotion's holds to
+        release and the new expression to hold once the motion ends.
+        """
+        if self.baked_motions is None:
+            await self.set_emotion(emotion)
+            await self.speak_track(track, intensity)
+            return
+
+        key = self.baked_motions.key(emotion, track.duration, repr((track.keyframes, track.duration, intensity)))
+        motion = self.baked_motions.load(key)
+        if motion is None:
+            self._capture = ParameterTimeline(self.clock)
+            # Keep idle looks out of the capture
+            self.speaking = True
+            try:
+                await self.set_emotion(emotion)
+                await self.speak_track(track, intensity)
+                timeline = self._capture
+            finally:
+                self._capture = None
+            if timeline:
+                self.baked_motions.store(key, timeline)
+                LOG_BAKED(key=key)
+            return
+
+        held, _ = split_expression(EMOTIONS.get(emotion, EMOTIONS["neutral"]))
+        animated = {curve["Id"] for curve in motion["Curves"]}
+        self.speaking = True
+        try:
+            await self.send_command("playMotion", {
+                "file": key,
+                "motion": motion,
+                "release": [parameter_id for parameter_id in EMOTION_PARAMETER_IDS if parameter_id not in animated],
+                "hold": held,
+            })
+            await self.clock.sleep(motion["Meta"]["Duration"])
+        finally:
+            self.speaking = False
+        self.mouth_form = next((p["value"] for p in held if p["parameterId"] == "ParamMouthForm"), None)
+        LOG_EMOTION(emotion=emotion)
+        LOG_SPEAKING(duration=track.duration)
+    
+    async def speak_track(self, track: SpeechTrack, intensity: float = 0.7):
+        """Lip-sync a viseme track generated from the spoken text"""
+        self.speaking = True
+        try:
+            await play_track(self.send_command, track, intensity, base_form=self.mouth_form, clock=self.clock)
+        finally:
+            self.speaking = False
+        LOG_SPEAKING(duration=track.duration)
     
     async def play_reaction_animation(self, emotion: str):
         """Play a reaction animation based on emotion"""
@@ -204,8 +293,8 @@ class AnimationController:
         
         group = animation_map.get(emotion, 'idle')
         await self.send_command("playRandomMotion", {"group": group})
-        self.last_animation_time = time.time()
-        print(f"→ Animation: {group}")
+        self.last_animation_time = self.clock.monotonic()
+        LOG_ANIMATION(group=group)
     
     async def look_at_direction(self, x: float, y: float):
         """Make character look in a direction"""
@@ -223,13 +312,13 @@ class AnimationController:
         x = random.uniform(-0.3, 0.3)
         y = random.uniform(-0.2, 0.2)
         await self.look_at_direction(x, y)
-        print("→ Random look")
+        LOG_LOOK(reason="Random look", x=x, y=y)
     
     async def idle_behavior_loop(self):
         """Background task for idle behaviors"""
         while True:
             try:
-                await asyncio.sleep(random.uniform(3, 8))
+                await self.clock.sleep(random.uniform(3, 8))
                 
                 if not self.speaking:
                     # Random behavior
@@ -239,13 +328,13 @@ class AnimationController:
                         await self.random_look()
                     elif behavior == 'idle_motion':
                         # Don't spam animations
-                        if time.time() - self.last_animation_time > 10:
+                        if self.clock.monotonic() - self.last_animation_time > 10:
                             await self.send_command("playRandomMotion", {"group": "idle"})
-                            self.last_animation_time = time.time()
-                            print("→ Idle animation")
+                            self.last_animation_time = self.clock.monotonic()
+                            LOG_ANIMATION(group="idle")
             except Exception as e:
-                print(f"Idle behavior error: {e}")
-                await asyncio.sleep(5)
+                LOG_IDLE_ERROR(error=e)
+                await self.clock.sleep(5)
     
     def start_idle_behaviors(self):
         """Start background idle behavior task"""
@@ -256,22 +345,20 @@ class AnimationController:
     async def process_ai_response(self, text: str):
         """Process AI response with automatic animations"""
         # Detect emotion
-        emotion = EmotionAnalyzer.detect_emotion(text)
+        emotion = await self.classifier.classify(text)
         
-        # Set emotion
-        await self.set_emotion(emotion)
+        # Lip-sync track timed from the text itself
+        track = viseme_track(text)
         
         # Play reaction animation for strong emotions
         if emotion in ['surprised', 'excited', 'happy'] and EmotionAnalyzer.should_be_excited(text):
             await self.play_reaction_animation(emotion)
         
-        # Calculate speaking duration based on text length
-        words = len(text.split())
-        duration = min(words * 0.15, 8.0)  # ~0.15s per word, max 8s
-        
-        # Speak animation
-        if duration > 0.3:
-            await self.speak_animation(duration)
+        if track.duration > 0.3:
+            # Set emotion and lip-sync (one baked motion, layered over the reaction, once cached)
+            await self.speak_reaction(emotion, track)
+        else:
+            await self.set_emotion(emotion)
     
     async def process_user_message(self, text: str):
         """React to user's message"""
@@ -279,22 +366,24 @@ class AnimationController:
         if '?' in text:
             # Tilt head slightly when user asks question
             await self.look_at_direction(0.1, 0.1)
-            print("→ Reacting to question")
+            LOG_LOOK(reason="Reacting to question", x=0.1, y=0.1)
     
     async def close(self):
         """Close connection"""
         if self.idle_task:
             self.idle_task.cancel()
-        if self.ws:
-            await self.ws.close()
+        self.classifier.close()
+        await self.display.close()
 
 
 class HimeDisplayBridge:
     """Main bridge for auto-animation integration"""
     
-    def __init__(self):
-        self.controller = AnimationController()
+    def __init__(self, ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
+        self.controller = AnimationController(ws_url, clock)
         self.running = False
+        self.metrics_runner = None
+        self.loop_monitor = None
     
     async def initialize(self):
         """Initialize the bridge"""
@@ -303,6 +392,15 @@ class HimeDisplayBridge:
         print("Neuro-sama-style AI VTuber System")
         print("=" * 60)
         
+        # Client metrics: HTTP endpoint if HIME_METRICS_PORT is set, stderr dump on SIGUSR1
+        self.metrics_runner = await start_from_env()
+        # Event loop lag and slow callbacks, if HIME_LOOP_MONITOR is set
+        self.loop_monitor = monitor_from_env()
+        # Command/reply log for replay_session.py, if HIME_RECORD is set
+        recorder_from_env()
+        # Baked reactions, if HIME_BAKED_MOTIONS is set
+        self.controller.baked_motions = cache_from_env()
+        
         # Connect to Hime Display
         if not await self.controller.connect():
             print("\n⚠ Could not connect to Hime Display")
@@ -340,12 +438,18 @@ class HimeDisplayBridge:
         print("\nShutting down bridge...")
         self.running = False
         await self.controller.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+            print(self.loop_monitor.report())
+        stop_recording()
 
 
 # Example usage and testing
-async def test_bridge():
+async def test_bridge(ws_url: str = "ws://localhost:8765", clock: Optional[Clock] = None):
     """Test the auto-animation bridge"""
-    bridge = HimeDisplayBridge()
+    bridge = HimeDisplayBridge(ws_url, clock)
     
     if not await bridge.initialize():
         return
@@ -363,12 +467,13 @@ async def test_bridge():
     print("Running test scenarios...")
     print("=" * 60)
     
+    clock = bridge.controller.clock
     for user_msg, ai_msg in test_scenarios:
         await bridge.on_user_message(user_msg)
-        await asyncio.sleep(0.5)
+        await clock.sleep(0.5)
         
         await bridge.on_ai_response(ai_msg)
-        await asyncio.sleep(3)
+        await clock.sleep(3)
     
     print("\n" + "=" * 60)
     print("Test complete! Idle behaviors will continue...")
@@ -378,13 +483,14 @@ async def test_bridge():
     try:
         # Keep running to show idle behaviors
         while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
+            await clock.sleep(1)
+    finally:
         await bridge.shutdown()
 
 
 if __name__ == "__main__":
     print("Starting Hime Display Auto-Animation Bridge...\n")
+    setup_logging()
     try:
         asyncio.run(test_bridge())
     except KeyboardInterrupt:
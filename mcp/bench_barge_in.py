@@ -0,0 +1,113 @@
+"""
+Benchmark: barge-in latency of the LM Studio chat loop
+
+Starts local stand-ins for LM Studio (a slow token stream) and the Hime
+Display WebSocket API, lets the chatbot start answering, then interrupts
+it with a new message as a viewer would. For every interruption it
+reports:
+
+- stop:     new message -> old reply cancelled and mouth reset
+- stream:   new message -> stand-in LM Studio sees the stream dropped
+- reaction: new message -> first animation command of the new reply
+            (the chatbot's own barge-in latency, AnimatedChatbot.barge_in_ms)
+
+Usage:
+    python bench_barge_in.py --rounds 10 --token-delay 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from aiohttp import web
+
+import lmstudio_integration
+from bench_dispatch import stand_in_display
+
+
+REPLY = "Oh, that is a great question! Let me think about it for a moment. " * 20
+
+
+async def stand_in_lm_studio(port: int, token_delay: float, dropped: list):
+    """Streams REPLY word by word; records when a client goes away mid-stream"""
+
+    async def models(request):
+        return web.json_response({"data": [{"id": "stand-in"}]})
+
+    async def chat(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        try:
+            for word in REPLY.split(" "):
+                event = {"choices": [{"delta": {"content": word + " "}}]}
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+                await asyncio.sleep(token_delay)
+            await response.write(b"data: [DONE]\n\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            dropped.append(time.perf_counter())
+        return response
+
+    app = web.Application()
+    app.router.add_get("/v1/models", models)
+    app.router.add_post("/v1/chat/completions", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", port).start()
+    return runner
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--display-port", type=int, default=8799)
+    parser.add_argument("--lm-port", type=int, default=8798)
+    parser.add_argument("--token-delay", type=float, default=20.0, help="ms between streamed tokens")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    dropped = []
+    display = await stand_in_display(args.display_port, 0.001)
+    lm_studio = await stand_in_lm_studio(args.lm_port, args.token_delay / 1000, dropped)
+
+    chatbot = lmstudio_integration.AnimatedChatbot()
+    chatbot.animation_bridge.controller.ws_url = f"ws://localhost:{args.display_port}"
+    chatbot.lm_client = lmstudio_integration.LMStudioClient(f"http://localhost:{args.lm_port}/v1")
+    if not await chatbot.initialize():
+        return
+
+    stop_ms, stream_ms = [], []
+    try:
+        turn = asyncio.create_task(chatbot.chat("Tell me something"))
+        for _ in range(args.rounds):
+            # Let the current reply get going, then barge in
+            await asyncio.sleep(0.5)
+            dropped.clear()
+            reactions = len(chatbot.barge_in_ms)
+            start = time.perf_counter()
+            await chatbot.interrupt(turn, received_at=start)
+            stop_ms.append((time.perf_counter() - start) * 1000)
+            turn = asyncio.create_task(chatbot.chat("Wait, something else!"))
+            while len(chatbot.barge_in_ms) == reactions:
+                await asyncio.sleep(0.001)
+            if dropped:
+                stream_ms.append((dropped[0] - start) * 1000)
+        await chatbot.interrupt(turn)
+    finally:
+        await chatbot.shutdown()
+        await lm_studio.cleanup()
+        display.close()
+        await display.wait_closed()
+
+    print(f"\nToken delay {args.token_delay:.0f} ms, {args.rounds} interruptions")
+    print(f"{'':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in (("stop", stop_ms), ("stream", stream_ms), ("reaction", chatbot.barge_in_ms)):
+        if values:
+            print(f"{name:>10} {percentile(values, 0.5):>8.1f} {percentile(values, 0.99):>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
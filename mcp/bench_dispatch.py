@@ -0,0 +1,123 @@
+"""
+Benchmark: aggregate latency of N parallel MCP tool calls
+
+Starts a local stand-in for the Hime Display WebSocket API that acks every
+command after an injected delay, then fires N tool calls at once
+(look_at / set_emotion / play_animation, as an AI client would in one turn)
+through the tool registry. The baseline serializes every call behind one
+lock, which is how the old send/recv connection behaved. It also reports
+the registry's own per-call overhead (lookup, validation, channel locks).
+
+Usage:
+    python bench_dispatch.py --latency 5 --calls 3 10 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import websockets
+
+import hime_tools
+from hime_client import HimeDisplayConnection
+
+
+TOOL_MIX = [
+    ("look_at", {"x": 0.3, "y": -0.1}),
+    ("set_emotion", {"emotion": "happy"}),
+    ("play_animation", {"group": "idle"}),
+]
+
+
+async def stand_in_display(port: int, latency: float):
+    """Minimal ApiServer stand-in: welcome message, then delayed acks"""
+
+    async def ack_later(ws, message):
+        await asyncio.sleep(latency)
+        await ws.send(json.dumps({
+            "type": "ack",
+            "id": message.get("id"),
+            "action": message.get("action"),
+            "timestamp": time.time() * 1000,
+        }))
+
+    async def handler(ws):
+        await ws.send(json.dumps({
+            "type": "connection",
+            "status": "connected",
+            "message": "Connected to Hime Display API",
+            "timestamp": time.time() * 1000,
+        }))
+        async for raw in ws:
+            asyncio.create_task(ack_later(ws, json.loads(raw)))
+
+    return await websockets.serve(handler, "localhost", port)
+
+
+async def run_batch(calls: int, serialize: bool) -> float:
+    """Fire `calls` tool calls at once and return the wall time in ms"""
+    lock = asyncio.Lock()
+
+    async def one(name, arguments):
+        if serialize:
+            async with lock:
+                return await hime_tools.registry.call(name, arguments)
+        return await hime_tools.registry.call(name, arguments)
+
+    batch = [TOOL_MIX[i % len(TOOL_MIX)] for i in range(calls)]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(name, arguments) for name, arguments in batch))
+    return (time.perf_counter() - start) * 1000
+
+
+class InstantConnection:
+    """Connection stand-in that acks immediately, to isolate registry cost"""
+
+    async def send_command(self, action: str, data: dict):
+        return {"type": "ack", "action": action}
+
+
+async def registry_overhead(iterations: int = 20000) -> float:
+    """Average cost of one registry call in microseconds"""
+    real_display = hime_tools.display
+    hime_tools.display = InstantConnection()
+    try:
+        start = time.perf_counter()
+        for i in range(iterations):
+            name, arguments = TOOL_MIX[i % len(TOOL_MIX)]
+            await hime_tools.registry.call(name, arguments)
+        return (time.perf_counter() - start) / iterations * 1e6
+    finally:
+        hime_tools.display = real_display
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=5.0, help="injected ack delay in ms")
+    parser.add_argument("--calls", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    stand_in = await stand_in_display(args.port, args.latency / 1000)
+    hime_tools.display = HimeDisplayConnection(f"ws://localhost:{args.port}")
+    await hime_tools.display.connect()
+
+    print(f"Injected ack latency: {args.latency:.1f} ms, {args.rounds} rounds each")
+    print(f"{'calls':>6} {'serialized ms':>14} {'dispatched ms':>14} {'speedup':>8}")
+    try:
+        for calls in args.calls:
+            serial = [await run_batch(calls, True) for _ in range(args.rounds)]
+            dispatched = [await run_batch(calls, False) for _ in range(args.rounds)]
+            serial_ms = sorted(serial)[len(serial) // 2]
+            dispatched_ms = sorted(dispatched)[len(dispatched) // 2]
+            print(f"{calls:>6} {serial_ms:>14.1f} {dispatched_ms:>14.1f} {serial_ms / dispatched_ms:>7.1f}x")
+        print(f"Registry overhead: {await registry_overhead():.1f} µs per call")
+    finally:
+        await hime_tools.display.close()
+        stand_in.close()
+        await stand_in.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+Benchmark: cost per token of parsing LM Studio's streaming response
+
+Builds a synthetic `text/event-stream` body in the shape LM Studio sends
+(one `data: {...}` event per token), cuts it into network-sized chunks at
+random boundaries and parses it two ways:
+
+- line:   the previous loop - split into lines, decode, strip, slice off
+          `data: ` and `json.loads` every event
+- sse:    SSEDeltaParser working on the raw bytes
+
+For each it reports microseconds per token, the CPU share needed to keep
+up with a given token rate, and the bytes allocated per token (measured as
+the tracemalloc peak above baseline for each chunk fed).
+
+Usage:
+    python bench_sse.py --tokens 5000 --rate 500
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Iterable, List
+
+from sse_parser import SSEDeltaParser
+
+
+WORDS = ["Hello", " there", "!", " I'm", " doing", " great", ",", " thanks",
+         " for", " asking", ".", " How", " about", " you", "?", " こんにちは"]
+
+
+def build_stream(tokens: int) -> bytes:
+    """Synthetic chat completion stream with one event per token"""
+    events = []
+    for i in range(tokens):
+        event = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "local-model",
+            "choices": [{"index": 0, "delta": {"content": WORDS[i % len(WORDS)]}, "finish_reason": None}],
+        }
+        events.append(f"data: {json.dumps(event)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode("utf-8")
+
+
+def chunk_stream(body: bytes, seed: int = 7) -> List[bytes]:
+    """Split the body at random boundaries, like TCP reads would"""
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(body):
+        size = rng.randint(64, 1500)
+        chunks.append(body[i:i + size])
+        i += size
+    return chunks
+
+
+def line_parser() -> Callable[[bytes], List[str]]:
+    """The old per-line loop (line splitting as aiohttp's readline does it)"""
+    pending = b""
+
+    def feed(chunk: bytes) -> List[str]:
+        nonlocal pending
+        tokens = []
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            line = (line + b"\n").decode("utf-8").strip()
+            if line.startswith("data: "):
+                line = line[6:]
+                if line == "[DONE]":
+                    break
+                try:
+                    data = json.loads(line)
+                    if "choices" in data and len(data["choices"]) > 0:
+                        delta = data["choices"][0].get("delta", {})
+                        content = delta.get("content", "")
+                        if content:
+                            tokens.append(content)
+                except json.JSONDecodeError:
+                    continue
+        return tokens
+    return feed
+
+
+def sse_parser() -> Callable[[bytes], List[str]]:
+    return SSEDeltaParser().feed
+
+
+def time_per_token(make_parser, chunks: Iterable[bytes], tokens: int, rounds: int = 5) -> float:
+    """Best-of-N microseconds per token"""
+    best = float("inf")
+    for _ in range(rounds):
+        feed = make_parser()
+        start = time.perf_counter()
+        for chunk in chunks:
+            feed(chunk)
+        best = min(best, time.perf_counter() - start)
+    return best / tokens * 1e6
+
+
+def bytes_per_token(make_parser, chunks: Iterable[bytes], tokens: int) -> float:
+    """Transient bytes allocated per token (tracemalloc peak per chunk)"""
+    feed = make_parser()
+    total = 0
+    tracemalloc.start()
+    try:
+        for chunk in chunks:
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            feed(chunk)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=500, help="target tokens per second")
+    args = parser.parse_args()
+
+    chunks = chunk_stream(build_stream(args.tokens))
+
+    # Both parsers must agree before their numbers mean anything
+    old_feed, new_feed = line_parser(), sse_parser()
+    old_tokens = [t for chunk in chunks for t in old_feed(chunk)]
+    new_tokens = [t for chunk in chunks for t in new_feed(chunk)]
+    assert old_tokens == new_tokens, "parsers disagree"
+
+    print(f"{args.tokens} tokens in {len(chunks)} chunks, target {args.rate:.0f} tokens/s")
+    print(f"{'parser':>8} {'µs/token':>10} {'CPU @ rate':>11} {'bytes/token':>12}")
+    for name, make_parser in (("line", line_parser), ("sse", sse_parser)):
+        micros = time_per_token(make_parser, chunks, args.tokens)
+        allocated = bytes_per_token(make_parser, chunks, args.tokens)
+        cpu = micros * args.rate / 1e6 * 100
+        print(f"{name:>8} {micros:>10.2f} {cpu:>10.2f}% {allocated:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Benchmark suite: Python bridges against the mock display
+
+Runs every client path against mock_display.MockApiServer (no Electron
+needed) with the injected latency, jitter and drop rate, and reports per
+scenario:
+
+- cmds/s:   commands the display received per second of the run
+- p50/p99:  latency of one client call, in ms
+- drift:    how late a speaking animation of a known length finishes (p50, ms)
+
+Scenarios: AnimationController (auto_animation_bridge), the adaptive
+controller, the example HimeDisplayClient, and MCP call_tool requests
+through the server's request handler.
+
+Numbers can be saved as a baseline and later runs compared against it;
+a regression beyond the tolerance exits non-zero.
+
+Usage:
+    python bench_suite.py --latency 2 --jitter 1 --save-baseline bench_baseline.json
+    python bench_suite.py --latency 2 --jitter 1 --baseline bench_baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from mock_display import MockApiServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples"))
+
+
+# Per-call timeout, so dropped commands count as failures instead of stalling the run
+CALL_TIMEOUT = 1.0
+# Metrics where a higher number is better; the others regress upward
+HIGHER_IS_BETTER = {"cmds_per_s"}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Scenario:
+    """One client path: a command mix plus a speaking animation of known length"""
+
+    name = ""
+
+    async def setup(self, ws_url: str):
+        pass
+
+    def calls(self) -> List[Callable[[], Awaitable]]:
+        """The command mix, cycled through for the latency/throughput run"""
+        return []
+
+    async def speak(self, duration: float):
+        """Run a speaking animation of `duration` seconds to completion"""
+
+    async def teardown(self):
+        pass
+
+
+class AnimationControllerScenario(Scenario):
+    name = "animation_controller"
+
+    async def setup(self, ws_url):
+        from auto_animation_bridge import AnimationController
+        self.controller = AnimationController(ws_url)
+        self.controller.display.timeout = CALL_TIMEOUT
+        await self.controller.connect()
+
+    def calls(self):
+        return [
+            lambda: self.controller.set_emotion("happy"),
+            lambda: self.controller.look_at_direction(0.2, -0.1),
+            lambda: self.controller.send_command("setParameter", {"parameterId": "ParamAngleZ", "value": 5}),
+        ]
+
+    async def speak(self, duration):
+        await self.controller.speak_animation(duration)
+
+    async def teardown(self):
+        await self.controller.close()
+
+
+class AdaptiveControllerScenario(Scenario):
+    name = "adaptive_controller"
+
+    async def setup(self, ws_url):
+        from adaptive_animation import AdaptiveAnimationController
+        self.controller = AdaptiveAnimationController(ws_url)
+        self.controller.display.timeout = CALL_TIMEOUT
+        await self.controller.connect()
+        # Skip the (slow, sleep-paced) capability probe: assume the standard parameters
+        for params in self.controller.BASIC_PARAMS.values():
+            for param in params:
+                self.controller.capabilities.mark_param_supported(param)
+
+    def calls(self):
+        return [
+            lambda: self.controller.set_emotion_adaptive("happy"),
+            lambda: self.controller.look_at_adaptive(0.2, -0.1),
+            lambda: self.controller.send_command("setParameter", {"parameterId": "ParamAngleZ", "value": 5}),
+        ]
+
+    async def speak(self, duration):
+        await self.controller.speak_animation_adaptive(duration)
+
+    async def teardown(self):
+        await self.controller.close()
+
+
+class PythonClientScenario(Scenario):
+    name = "python_client"
+
+    async def setup(self, ws_url):
+        from python_client import HimeDisplayClient
+        host, port = ws_url.rsplit("//", 1)[1].split(":")
+        self.client = HimeDisplayClient(host, int(port))
+        await self.client.connect()
+
+    def calls(self):
+        return [
+            lambda: self.client.set_emotion("happy"),
+            lambda: self.client.look_at(0.2, -0.1),
+            lambda: self.client.set_parameter("ParamAngleZ", 5),
+        ]
+
+    async def speak(self, duration):
+        await self.client.speak_animation(duration)
+
+    async def teardown(self):
+        await self.client.disconnect()
+
+
+class McpCallToolScenario(Scenario):
+    name = "mcp_call_tool"
+
+    async def setup(self, ws_url):
+        from mcp import types
+        import hime_tools
+        import server
+        from hime_client import HimeDisplayConnection
+
+        self.types = types
+        self.hime_tools = hime_tools
+        hime_tools.display = HimeDisplayConnection(ws_url, timeout=CALL_TIMEOUT)
+        await hime_tools.display.connect()
+        self.handler = server.app.request_handlers[types.CallToolRequest]
+
+    async def call_tool(self, name: str, arguments: dict):
+        request = self.types.CallToolRequest(
+            method="tools/call",
+            params=self.types.CallToolRequestParams(name=name, arguments=arguments),
+        )
+        return await self.handler(request)
+
+    def calls(self):
+        return [
+            lambda: self.call_tool("set_emotion", {"emotion": "happy"}),
+            lambda: self.call_tool("look_at", {"x": 0.2, "y": -0.1}),
+            lambda: self.call_tool("set_parameter", {"parameter_id": "ParamAngleZ", "value": 5}),
+        ]
+
+    async def speak(self, duration):
+        # speak returns at once; the animation runs as a background job
+        await self.call_tool("speak", {"duration": duration})
+        job = next(reversed(self.hime_tools.jobs.jobs.values()))
+        await job.task
+
+    async def teardown(self):
+        await self.hime_tools.jobs.cancel_all()
+        await self.hime_tools.display.close()
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (AnimationControllerScenario, AdaptiveControllerScenario,
+                     PythonClientScenario, McpCallToolScenario)
+}
+
+
+async def run_scenario(scenario: Scenario, args) -> Dict[str, float]:
+    display = MockApiServer(args.port, None, args.latency, args.jitter, args.drop, args.seed)
+    await display.start()
+    try:
+        await scenario.setup(display.ws_url)
+        calls = scenario.calls()
+        latencies, failures = [], 0
+        received_before = display.stats["received"]
+        start = time.perf_counter()
+        for i in range(args.commands):
+            call_start = time.perf_counter()
+            try:
+                await asyncio.wait_for(calls[i % len(calls)](), CALL_TIMEOUT)
+                latencies.append((time.perf_counter() - call_start) * 1000)
+            except Exception:
+                failures += 1
+        elapsed = time.perf_counter() - start
+        received = display.stats["received"] - received_before
+
+        drift = []
+        for _ in range(args.speeches):
+            speak_start = time.perf_counter()
+            try:
+                await asyncio.wait_for(scenario.speak(args.speech_seconds),
+                                       args.speech_seconds + CALL_TIMEOUT)
+                drift.append((time.perf_counter() - speak_start - args.speech_seconds) * 1000)
+            except Exception:
+                # A dropped frame can fail the whole animation (e.g. the speak tool's job)
+                failures += 1
+        await scenario.teardown()
+    finally:
+        await display.stop()
+
+    return {
+        "cmds_per_s": received / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "drift_ms": percentile(drift, 0.5),
+        "failures": failures,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (a fraction) relative to the baseline"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if before is None or metric == "failures" or before != before:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = value < before * (1 - tolerance)
+            else:
+                # Small absolute numbers are noisy: allow at least 1 ms
+                worse = value > before * (1 + tolerance) + 1.0
+            if worse:
+                regressions.append(f"{name} {metric}: {before:.1f} -> {value:.1f}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8797)
+    parser.add_argument("--latency", type=float, default=2.0, help="injected reply delay in ms")
+    parser.add_argument("--jitter", type=float, default=1.0, help="± uniform jitter in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction of commands never answered")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--commands", type=int, default=300, help="calls per scenario")
+    parser.add_argument("--speeches", type=int, default=3)
+    parser.add_argument("--speech-seconds", type=float, default=1.0)
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), help="run these scenarios only")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression (fraction)")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"Latency {args.latency:.1f} ms ± {args.jitter:.1f} ms, drop {args.drop:.1%}, "
+          f"{args.commands} calls and {args.speeches}× {args.speech_seconds:.1f}s speech per scenario")
+    print(f"{'scenario':>22} {'cmds/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'drift ms':>9} {'failed':>7}")
+    for name in args.only or SCENARIOS:
+        # The bridges narrate every command; keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            metrics = await run_scenario(SCENARIOS[name](), args)
+        results[name] = metrics
+        print(f"{name:>22} {metrics['cmds_per_s']:>8.0f} {metrics['p50_ms']:>8.2f} "
+              f"{metrics['p99_ms']:>8.2f} {metrics['drift_ms']:>9.1f} {metrics['failures']:>7}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"✓ Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        changed = [key for key in ("latency", "jitter", "drop", "commands", "speech_seconds")
+                   if saved["settings"].get(key) != getattr(args, key)]
+        if changed:
+            print(f"⚠ Baseline was recorded with different settings: {', '.join(changed)}")
+        regressions = compare(results, saved["results"], args.tolerance)
+        if regressions:
+            print(f"✗ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✓ No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+"""
+Bounded chat ingestion in front of the LLM
+
+A live audience sends far more messages than the LLM can answer. Instead
+of handing every message to `chat()` in arrival order, messages go
+through an ingestion stage that:
+
+- drops duplicates (the same text seen within a time window),
+- samples the stream when it arrives faster than the LLM can answer,
+  so the queue holds a fair cross-section instead of the first burst,
+- keeps at most `max_size` candidates, evicting the least important,
+- hands the LLM the highest-priority, still-fresh message when it is
+  ready for the next one.
+
+Messages that won't reach the LLM aren't ignored: they are collected and
+answered in batches with a cheap reaction (e.g. a head tilt for
+questions), so the character still visibly responds to chat. Every
+message that is dropped is counted by reason in `stats` (see `drops()`)
+and logged at debug level.
+"""
+
+import asyncio
+import logging
+import random
+import re
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import virtual_clock
+from event_log import event
+
+
+WHITESPACE = re.compile(r"\s+")
+REPEATED_PUNCTUATION = re.compile(r"([!?.])\1+")
+
+LOG_REACTION_ERROR = event("chat", "reaction_error", logging.WARNING, "⚠ Chat reaction failed: {error}", per_second=1)
+LOG_DROPPED = event("chat", "dropped", logging.DEBUG, "→ Dropped ({reason}): {text}", per_second=5)
+
+# stats keys counting messages that never reach the LLM, one per reason
+DROP_REASONS = ("duplicate", "sampled_out", "evicted", "expired", "discarded", "reactions_overflow")
+
+
+class ChatMessage:
+    """One incoming chat message"""
+
+    def __init__(self, text: str, author: Optional[str] = None, priority: float = 0.0):
+        self.text = text
+        self.author = author
+        self.priority = priority
+        self.received = virtual_clock.CLOCK.monotonic()
+
+
+Reaction = Callable[[List[ChatMessage]], Awaitable[None]]
+Prioritizer = Callable[[ChatMessage], float]
+
+
+def normalize(text: str) -> str:
+    """Key used for deduplication ("Hi!!!" and "hi !" are the same message)"""
+    text = REPEATED_PUNCTUATION.sub(r"\1", text.lower())
+    return WHITESPACE.sub(" ", text).strip(" ")
+
+
+def question_priority(message: ChatMessage) -> float:
+    """Default prioritizer: questions first"""
+    return 1.0 if "?" in message.text else 0.0
+
+
+class ChatIngestion:
+    """Deduplicating, rate-sampled, bounded priority queue for chat messages"""
+
+    def __init__(self, max_size: int = 32, llm_rate: Optional[float] = 0.2,
+                 dedup_window: Optional[float] = 30.0, max_age: float = 60.0,
+                 always_admit: float = 2.0, prioritize: Prioritizer = question_priority,
+                 react: Optional[Reaction] = None, reaction_interval: float = 2.0,
+                 rng: Optional[random.Random] = None):
+        self.max_size = max_size
+        # Messages per second the LLM can realistically answer (None: no sampling)
+        self.llm_rate = llm_rate
+        # Seconds a repeated message counts as a duplicate (None: no deduplication)
+        self.dedup_window = dedup_window
+        self.max_age = max_age
+        # Messages at or above this priority skip rate sampling
+        self.always_admit = always_admit
+        self.prioritize = prioritize
+        self.react = react
+        self.reaction_interval = reaction_interval
+        self.rng = rng or random.Random()
+
+        self._queue: List[ChatMessage] = []
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._arrivals: Deque[float] = deque(maxlen=50)
+        self._reactions: Deque[ChatMessage] = deque(maxlen=100)
+        self._available = asyncio.Event()
+        self._closed = False
+        self.stats = {"received": 0, "answered": 0, "reacted": 0, **{reason: 0 for reason in DROP_REASONS}}
+
+    def arrival_rate(self) -> float:
+        """Messages per second over the recent arrivals"""
+        if len(self._arrivals) < 2:
+            return 0.0
+        span = self._arrivals[-1] - self._arrivals[0]
+        return (len(self._arrivals) - 1) / span if span > 0 else float("inf")
+
+    def offer(self, message: ChatMessage) -> bool:
+        """Take in a message; returns whether it may still reach the LLM"""
+        now = message.received
+        self.stats["received"] += 1
+        self._arrivals.append(now)
+
+        if self.dedup_window is not None:
+            # Forget dedup keys that fell out of the window
+            while self._seen and next(iter(self._seen.values())) < now - self.dedup_window:
+                self._seen.popitem(last=False)
+            key = normalize(message.text)
+            if key in self._seen:
+                self._drop(message, "duplicate")
+                return False
+            self._seen[key] = now
+
+        message.priority += self.prioritize(message)
+
+        # Admit a share of the stream that matches what the LLM can answer
+        rate = self.arrival_rate()
+        if self.llm_rate is not None and message.priority < self.always_admit and rate > self.llm_rate:
+            if self.rng.random() > self.llm_rate / rate:
+                self._drop(message, "sampled_out")
+                self._react_later(message)
+                return False
+
+        self._queue.append(message)
+        if len(self._queue) > self.max_size:
+            # Evict the least important message, oldest first on ties
+            worst = min(self._queue, key=lambda m: (m.priority, -m.received))
+            self._queue.remove(worst)
+            self._drop(worst, "evicted")
+            self._react_later(worst)
+            if worst is message:
+                return False
+        self._available.set()
+        return True
+
+    async def get(self) -> Optional[ChatMessage]:
+        """Best fresh message for the LLM; None once closed and empty"""
+        while True:
+            now = virtual_clock.CLOCK.monotonic()
+            fresh = [m for m in self._queue if now - m.received <= self.max_age]
+            for message in self._queue:
+                if now - message.received > self.max_age:
+                    self._drop(message, "expired")
+            self._queue = fresh
+            if self._queue:
+                # Highest priority first, oldest first among equals
+                best = max(self._queue, key=lambda m: (m.priority, -m.received))
+                self._queue.remove(best)
+                self.stats["answered"] += 1
+                return best
+            if self._closed:
+                return None
+            self._available.clear()
+            await self._available.wait()
+
+    def close(self, discard: bool = False):
+        """No more messages: wake up a waiting `get`, optionally dropping what's queued"""
+        if discard:
+            for message in self._queue:
+                self._drop(message, "discarded")
+            self._queue.clear()
+        self._closed = True
+        self._available.set()
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def drops(self) -> Dict[str, int]:
+        """Messages dropped so far, by reason"""
+        return {reason: self.stats[reason] for reason in DROP_REASONS if self.stats[reason]}
+
+    def _drop(self, message: ChatMessage, reason: str):
+        self.stats[reason] += 1
+        LOG_DROPPED(reason=reason, text=message.text[:60])
+
+    def _react_later(self, message: ChatMessage):
+        if len(self._reactions) == self._reactions.maxlen:
+            # The oldest waiting message loses its reaction
+            self._drop(self._reactions[0], "reactions_overflow")
+        self._reactions.append(message)
+
+    async def run_reactions(self):
+        """Answer messages that won't reach the LLM with batched cheap reactions"""
+        while True:
+            await asyncio.sleep(self.reaction_interval)
+            if not self._reactions or self.react is None:
+                continue
+            batch = list(self._reactions)
+            self._reactions.clear()
+            try:
+                await self.react(batch)
+                self.stats["reacted"] += len(batch)
+            except Exception as e:
+                LOG_REACTION_ERROR(error=e)
@@ -0,0 +1,254 @@
+"""
+Client-side instrumentation for the Hime Display connection
+
+Every HimeDisplayConnection records into a shared `ClientMetrics`
+registry: commands per action and outcome (ack, error, timeout,
+disconnected, cancelled, not_connected), send-to-ack latency histograms
+per action, commands in flight, and messages and bytes in each
+direction. Recording is a few dict and integer operations per command,
+cheap enough to leave on. When a loop_monitor runs, event-loop lag and
+slow callbacks are recorded here too.
+
+Latencies go into log-linear histograms in the spirit of HdrHistogram:
+each power of two is split into 8 linear sub-buckets, so any value is
+kept to within 12.5% over the whole range from microseconds to minutes,
+with memory proportional to the number of distinct buckets seen.
+Durations over MAX_SECONDS are recorded as MAX_SECONDS, the last finite
+export bucket, so the exported buckets account for every sample.
+
+The registry renders as Prometheus text, served by a small local HTTP
+endpoint (`start_metrics_server`) or written to stderr on a signal
+(`install_signal_dump`, SIGUSR1 by default).
+
+Usage:
+    HIME_METRICS_PORT=9465 python server.py
+    curl http://127.0.0.1:9465/metrics
+"""
+
+import os
+import signal
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Optional, TextIO, Tuple
+
+# Linear sub-buckets per power of two: 2**3 = 8, i.e. 12.5% resolution
+SUB_BUCKET_BITS = 3
+# Bucket boundaries of the exported Prometheus histograms, in seconds
+EXPORT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                  0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Longer durations are recorded as this, so every sample is in a finite export bucket
+MAX_SECONDS = EXPORT_BUCKETS[-1]
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, recorded in microseconds"""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def bucket_index(value_us: int) -> int:
+        shift = max(0, value_us.bit_length() - SUB_BUCKET_BITS - 1)
+        return (shift << SUB_BUCKET_BITS) + (value_us >> shift)
+
+    @staticmethod
+    def bucket_bounds(index: int) -> Tuple[int, int]:
+        """[lower, upper) of a bucket, in microseconds"""
+        shift = max(0, (index >> SUB_BUCKET_BITS) - 1)
+        sub = index - (shift << SUB_BUCKET_BITS)
+        return sub << shift, (sub + 1) << shift
+
+    def record(self, seconds: float):
+        value_us = max(0, int(min(seconds, MAX_SECONDS) * 1_000_000))
+        self.buckets[self.bucket_index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Value at `fraction` in seconds (bucket midpoint), or None when empty"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                lower, upper = self.bucket_bounds(index)
+                return min((lower + upper) / 2, self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def cumulative(self, bounds=EXPORT_BUCKETS):
+        """(bound, count of values below it) for each bound, as Prometheus buckets"""
+        ordered = sorted(self.buckets.items())
+        result, seen, i = [], 0, 0
+        for bound in bounds:
+            bound_us = bound * 1_000_000
+            # A bucket counts once every value it can hold (none above max_us) is at or below the bound
+            while i < len(ordered) and min(self.bucket_bounds(ordered[i][0])[1] - 1, self.max_us) <= bound_us:
+                seen += ordered[i][1]
+                i += 1
+            result.append((bound, seen))
+        return result
+
+
+class ClientMetrics:
+    """Counters, latency histograms and gauges for one or more connections"""
+
+    def __init__(self):
+        self.started = time.time()
+        # (action, outcome) -> commands
+        self.commands: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.in_flight = 0
+        self.in_flight_peak = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connects = 0
+        self.disconnects = 0
+        # Error messages that answer no pending command (bad JSON, renderer errors)
+        self.unmatched_errors = 0
+        # Filled by loop_monitor.LoopMonitor, when one runs
+        self.loop_lag = LatencyHistogram()
+        self.slow_callbacks = 0
+
+    def command_sent(self, nbytes: int):
+        self.messages_sent += 1
+        self.bytes_sent += nbytes
+        self.in_flight += 1
+        if self.in_flight > self.in_flight_peak:
+            self.in_flight_peak = self.in_flight
+
+    def command_done(self, action: str, outcome: str, seconds: Optional[float] = None):
+        """A sent command was answered or given up on; `seconds` is send-to-reply"""
+        self.in_flight -= 1
+        self.commands[(action, outcome)] += 1
+        if seconds is not None:
+            self.latency[action].record(seconds)
+
+    def command_rejected(self, action: str, outcome: str):
+        """A command that failed before it was sent"""
+        self.commands[(action, outcome)] += 1
+
+    def message_received(self, nbytes: int):
+        self.messages_received += 1
+        self.bytes_received += nbytes
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-action counts and latency percentiles in ms, for logs and benchmarks"""
+        actions = {}
+        for (action, outcome), count in self.commands.items():
+            actions.setdefault(action, {})[outcome] = count
+        for action, histogram in self.latency.items():
+            for name, fraction in (("p50_ms", 0.5), ("p99_ms", 0.99)):
+                actions.setdefault(action, {})[name] = histogram.percentile(fraction) * 1000
+        if self.loop_lag.count:
+            actions["event_loop"] = {
+                "lag_p50_ms": self.loop_lag.percentile(0.5) * 1000,
+                "lag_p99_ms": self.loop_lag.percentile(0.99) * 1000,
+                "slow_callbacks": self.slow_callbacks,
+            }
+        return actions
+
+    def prometheus_text(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP hime_client_{name} {help_text}")
+            lines.append(f"# TYPE hime_client_{name} {kind}")
+
+        metric("commands_total", "counter", "Commands by action and outcome")
+        for (action, outcome), count in sorted(self.commands.items()):
+            lines.append(f'hime_client_commands_total{{action="{action}",outcome="{outcome}"}} {count}')
+
+        def histogram_lines(name: str, histogram: LatencyHistogram, labels: str = ""):
+            prefix = labels + "," if labels else ""
+            for bound, count in histogram.cumulative():
+                lines.append(f'hime_client_{name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'hime_client_{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"hime_client_{name}_sum{suffix} {histogram.total_us / 1_000_000}")
+            lines.append(f"hime_client_{name}_count{suffix} {histogram.count}")
+
+        metric("ack_latency_seconds", "histogram", "Time from sending a command to its reply")
+        for action, histogram in sorted(self.latency.items()):
+            histogram_lines("ack_latency_seconds", histogram, f'action="{action}"')
+
+        if self.loop_lag.count:
+            metric("loop_lag_seconds", "histogram", "How late the event loop ran a timer it was asked to")
+            histogram_lines("loop_lag_seconds", self.loop_lag)
+
+        for name, kind, help_text, value in (
+            ("in_flight", "gauge", "Commands sent and not yet answered", self.in_flight),
+            ("in_flight_peak", "gauge", "Most commands in flight at once", self.in_flight_peak),
+            ("messages_sent_total", "counter", "WebSocket messages sent", self.messages_sent),
+            ("messages_received_total", "counter", "WebSocket messages received, broadcasts included", self.messages_received),
+            ("bytes_sent_total", "counter", "Bytes of WebSocket messages sent", self.bytes_sent),
+            ("bytes_received_total", "counter", "Bytes of WebSocket messages received", self.bytes_received),
+            ("connects_total", "counter", "Successful connections", self.connects),
+            ("disconnects_total", "counter", "Connections lost", self.disconnects),
+            ("unmatched_errors_total", "counter", "Error messages that answered no command", self.unmatched_errors),
+            ("slow_callbacks_total", "counter", "Event loop stalls over the monitor's threshold", self.slow_callbacks),
+            ("start_time_seconds", "gauge", "Unix time the metrics started", self.started),
+        ):
+            metric(name, kind, help_text)
+            lines.append(f"hime_client_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every connection in the process unless one is given its own
+METRICS = ClientMetrics()
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1", metrics: ClientMetrics = METRICS):
+    """Serve `metrics` as Prometheus text at http://host:port/metrics; returns the runner"""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=metrics.prometheus_text(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def install_signal_dump(sig: Optional[int] = None, metrics: ClientMetrics = METRICS,
+                        out: TextIO = sys.stderr) -> bool:
+    """Write the metrics to `out` whenever the process receives `sig` (SIGUSR1)"""
+    sig = sig if sig is not None else getattr(signal, "SIGUSR1", None)
+    if sig is None:
+        # Windows has no SIGUSR1; use the HTTP endpoint there
+        return False
+
+    def dump(signum, frame):
+        out.write(metrics.prometheus_text())
+        out.flush()
+
+    signal.signal(sig, dump)
+    return True
+
+
+async def start_from_env(metrics: ClientMetrics = METRICS):
+    """Enable the exporters configured by HIME_METRICS_PORT; returns the HTTP runner, if any"""
+    install_signal_dump(metrics=metrics)
+    port = os.environ.get("HIME_METRICS_PORT")
+    if not port:
+        return None
+    try:
+        runner = await start_metrics_server(int(port), metrics=metrics)
+    except (OSError, ValueError) as e:
+        print(f"[Metrics] Could not serve metrics on port {port}: {e}", file=sys.stderr)
+        return None
+    print(f"[Metrics] Serving http://127.0.0.1:{port}/metrics", file=sys.stderr)
+    return runner
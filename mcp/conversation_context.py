@@ -0,0 +1,92 @@
+"""
+Token-budgeted conversation history for LM Studio chats
+
+LM Studio (like most llama.cpp-based servers) reuses its prompt cache for
+the longest prefix that matches the previous request. To make the most of
+that, the history sent each turn is kept append-only for as long as
+possible: the system prompt is a single frozen message that is never
+rebuilt, new turns are only ever appended, and when the token budget is
+exceeded older turns are evicted in one larger chunk (down to a low-water
+mark) instead of one message per turn. Between evictions every request
+shares the whole previous request as its prefix.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+Message = Dict[str, str]
+Summarizer = Callable[[List[Message]], Awaitable[str]]
+
+# Rough per-message overhead of chat templates (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class ConversationContext:
+    """Chat history budgeted by tokens, with a byte-stable system prompt"""
+
+    def __init__(self, system_prompt: Message, max_tokens: int = 2048,
+                 low_water: float = 0.6, summarizer: Optional[Summarizer] = None):
+        # Frozen copy: the same dict is sent every turn so its bytes never change
+        self.system_prompt = dict(system_prompt)
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.summarizer = summarizer
+        self.summary: Optional[Message] = None
+        self.turns: List[Message] = []
+        self._turn_tokens: List[int] = []
+
+    def history(self) -> List[Message]:
+        """Messages to send before the next user message"""
+        prefix = [self.system_prompt]
+        if self.summary is not None:
+            prefix.append(self.summary)
+        return prefix + self.turns
+
+    def tokens(self) -> int:
+        """Estimated prompt size of the current history"""
+        total = estimate_tokens(self.system_prompt["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if self.summary is not None:
+            total += estimate_tokens(self.summary["content"]) + MESSAGE_OVERHEAD_TOKENS
+        return total + sum(self._turn_tokens)
+
+    async def add_turn(self, user_message: str, assistant_message: str):
+        """Append a finished exchange, compacting the history if over budget"""
+        for role, content in (("user", user_message), ("assistant", assistant_message)):
+            self.turns.append({"role": role, "content": content})
+            self._turn_tokens.append(estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS)
+
+        if self.tokens() > self.max_tokens:
+            await self._compact()
+
+    async def _compact(self):
+        """Evict the oldest exchanges down to the low-water mark"""
+        target = int(self.max_tokens * self.low_water)
+        evicted: List[Message] = []
+        # Always keep the latest exchange, even if it alone exceeds the budget
+        while len(self.turns) > 2 and self.tokens() > target:
+            evicted.extend(self.turns[:2])
+            del self.turns[:2]
+            del self._turn_tokens[:2]
+
+        if evicted and self.summarizer is not None:
+            previous = [self.summary] if self.summary is not None else []
+            try:
+                summary = await self.summarizer(previous + evicted)
+            except Exception as e:
+                print(f"⚠ Could not summarize history: {e}")
+                return
+            self.summary = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary.strip()}",
+            }
+
+    def clear(self):
+        """Forget everything except the system prompt"""
+        self.summary = None
+        self.turns.clear()
+        self._turn_tokens.clear()
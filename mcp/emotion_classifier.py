@@ -0,0 +1,210 @@
+"""
+Pluggable emotion classifier for animation bridges
+
+Keyword matching is cheap but crude; a real model is better but too slow
+to run on the event loop that drives animation frames. The classifier
+here runs a heavy backend in a ProcessPoolExecutor, memoizes results in
+an LRU keyed by a hash of the text, and answers with the bridge's keyword
+heuristic whenever the backend misses its deadline (the late result is
+still memoized for next time).
+
+The bundled backend is a logistic (softmax) model over hashed word
+n-grams. It needs NumPy, which is optional: without it, or without a
+trained model file, bridges simply keep using their keyword heuristic.
+
+Training a model from a tab-separated file of `emotion<TAB>text` lines:
+    python emotion_classifier.py train examples.tsv emotion_model.npz
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+
+
+# Trained model used by the bridges (None = keyword heuristics only)
+EMOTION_MODEL_PATH = None
+# Hashed feature space of the n-gram model
+FEATURE_BUCKETS = 2 ** 16
+
+TOKEN = re.compile(r"\w+|[!?]")
+
+Fallback = Callable[[str], str]
+
+
+def ngram_features(text: str, buckets: int = FEATURE_BUCKETS) -> List[int]:
+    """Hashed unigram and bigram indices (crc32, stable across processes)"""
+    tokens = TOKEN.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(gram.encode("utf-8")) % buckets for gram in grams]
+
+
+class HashedNgramLogistic:
+    """Softmax regression over hashed n-grams, loaded from a .npz file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.weights = None
+        self.bias = None
+        self.labels: List[str] = []
+
+    def load(self):
+        import numpy as np  # optional dependency, only needed by this backend
+        model = np.load(self.path)
+        self.weights = model["weights"]
+        self.bias = model["bias"]
+        self.labels = [str(label) for label in model["labels"]]
+
+    def predict(self, text: str) -> str:
+        features = ngram_features(text, self.weights.shape[1])
+        if not features:
+            return "neutral"
+        logits = self.weights[:, features].sum(axis=1) + self.bias
+        return self.labels[int(logits.argmax())]
+
+
+def train(examples: List[tuple], path: str, epochs: int = 10, learning_rate: float = 0.5):
+    """Fit a HashedNgramLogistic model on (emotion, text) pairs and save it"""
+    import numpy as np
+
+    labels = sorted({emotion for emotion, _ in examples})
+    index = {label: i for i, label in enumerate(labels)}
+    weights = np.zeros((len(labels), FEATURE_BUCKETS), dtype=np.float32)
+    bias = np.zeros(len(labels), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    encoded = [(index[emotion], ngram_features(text)) for emotion, text in examples]
+
+    for _ in range(epochs):
+        for i in rng.permutation(len(encoded)):
+            target, features = encoded[i]
+            if not features:
+                continue
+            logits = weights[:, features].sum(axis=1) + bias
+            probabilities = np.exp(logits - logits.max())
+            probabilities /= probabilities.sum()
+            probabilities[target] -= 1.0
+            # np.add.at handles n-grams that hash to the same bucket
+            np.add.at(weights, (slice(None), features), -learning_rate * probabilities[:, None])
+            bias -= learning_rate * probabilities
+
+    np.savez_compressed(path, weights=weights, bias=bias, labels=np.array(labels))
+
+
+# Backend instance inside each worker process
+_worker_backend = None
+
+
+def _init_worker(backend):
+    global _worker_backend
+    backend.load()
+    _worker_backend = backend
+
+
+def _predict(text: str) -> str:
+    return _worker_backend.predict(text)
+
+
+def default_backend():
+    """The n-gram model if one is configured and NumPy is available"""
+    if not EMOTION_MODEL_PATH or not os.path.exists(EMOTION_MODEL_PATH):
+        return None
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("⚠ NumPy is not installed, using keyword emotion detection", file=sys.stderr)
+        return None
+    return HashedNgramLogistic(EMOTION_MODEL_PATH)
+
+
+class EmotionClassifier:
+    """Off-loop emotion classification with memoization and a keyword fallback"""
+
+    def __init__(self, fallback: Fallback, backend=None, deadline: float = 0.05,
+                 max_workers: int = 1, memo_size: int = 1024):
+        self.fallback = fallback
+        self.backend = backend if backend is not None else default_backend()
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"memo_hits": 0, "backend": 0, "fallback": 0}
+
+    def _remember(self, key: str, emotion: str):
+        self._memo[key] = emotion
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    async def classify(self, text: str) -> str:
+        """Emotion for `text`, within the deadline"""
+        if self.backend is None:
+            return self.fallback(text)
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        emotion = self._memo.get(key)
+        if emotion is not None:
+            self._memo.move_to_end(key)
+            self.stats["memo_hits"] += 1
+            return emotion
+
+        if self._pool is None:
+            # Started on first use; that call usually misses the deadline while the model loads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.backend,),
+            )
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._pool, _predict, text)
+        except Exception as e:
+            print(f"⚠ Emotion classifier unavailable ({e}), using keywords", file=sys.stderr)
+            self.backend = None
+            return self.fallback(text)
+
+        # A late result still goes into the memo for the next time this text comes up
+        def remember(done: asyncio.Future):
+            if not done.cancelled() and done.exception() is None:
+                self._remember(key, done.result())
+        future.add_done_callback(remember)
+
+        try:
+            emotion = await asyncio.wait_for(asyncio.shield(future), self.deadline)
+            self.stats["backend"] += 1
+            return emotion
+        except asyncio.TimeoutError:
+            self.stats["fallback"] += 1
+            return self.fallback(text)
+        except Exception as e:
+            print(f"⚠ Emotion classifier failed ({e}), using keywords", file=sys.stderr)
+            if isinstance(e, BrokenProcessPool):
+                # Workers couldn't load the model; don't keep retrying
+                self.close()
+                self.backend = None
+            self.stats["fallback"] += 1
+            return self.fallback(text)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != "train":
+        print(__doc__)
+        return
+    with open(sys.argv[2], "r", encoding="utf-8") as f:
+        examples = [tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line]
+    train(examples, sys.argv[3])
+    print(f"✓ Trained on {len(examples)} examples, saved to {sys.argv[3]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Structured, sampled logging for animation events
+
+Emotion changes, gaze moves and speech frames happen many times a
+second under chat traffic, and printing each one writes to the console
+synchronously from the event loop. Hot-path output goes through
+`Event`s instead:
+
+- Each event has a level and is skipped with a single level check when
+  that level is off, before any formatting or allocation.
+- Events can be sampled (`sample`, fraction kept) and rate limited
+  (`per_second`, token bucket); a line that follows dropped ones notes
+  how many were suppressed.
+- Records are put on a bounded queue and written by a listener thread,
+  so the loop never waits on the console. When the queue is full,
+  records are dropped and counted rather than blocking.
+- Fields stay on the record (`record.event`, `record.fields`); the message
+  is only formatted by the listener, as text or as one JSON object per
+  line.
+
+Configured from the environment by `setup_logging()`:
+
+    HIME_LOG_LEVEL=debug       # debug, info (default), warning, error
+    HIME_LOG_FORMAT=json       # text (default) or json
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Optional, TextIO
+
+# Records waiting for the listener thread before new ones are dropped
+QUEUE_SIZE = 10_000
+ROOT = "hime"
+
+
+class _Message:
+    """Formats the template with the event's fields only when the record is written"""
+
+    __slots__ = ("template", "fields", "suppressed")
+
+    def __init__(self, template: str, fields: dict, suppressed: int):
+        self.template = template
+        self.fields = fields
+        self.suppressed = suppressed
+
+    def __str__(self):
+        text = self.template.format(**self.fields)
+        if self.suppressed:
+            text += f" (+{self.suppressed} suppressed)"
+        return text
+
+
+class Event:
+    """A named log event with its own level, sampling and rate limit"""
+
+    def __init__(self, logger: logging.Logger, name: str, level: int, template: str,
+                 sample: float = 1.0, per_second: Optional[float] = None):
+        self.logger = logger
+        self.name = name
+        self.level = level
+        self.template = template
+        self.sample = sample
+        self.per_second = per_second
+        # Token bucket allowing bursts of one second's worth (at least one line)
+        self._capacity = max(per_second or 0.0, 1.0)
+        self._tokens = self._capacity
+        self._refilled = time.monotonic()
+        # Dropped by sampling or rate limiting since the last line written
+        self.suppressed = 0
+
+    def __call__(self, **fields):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if self.sample < 1.0 and random.random() >= self.sample:
+            self.suppressed += 1
+            return
+        if self.per_second is not None:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._refilled) * self.per_second)
+            self._refilled = now
+            if self._tokens < 1.0:
+                self.suppressed += 1
+                return
+            self._tokens -= 1.0
+        suppressed, self.suppressed = self.suppressed, 0
+        self.logger.log(self.level, _Message(self.template, fields, suppressed),
+                        extra={"event": self.name, "fields": fields})
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def event(logger: str, name: str, level: int, template: str,
+          sample: float = 1.0, per_second: Optional[float] = None) -> Event:
+    """Declare an event logged to hime.<logger>; `template` is a str.format string over its fields"""
+    return Event(get_logger(logger), name, level, template, sample, per_second)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event, fields and message"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+        }
+        if hasattr(record, "event"):
+            entry["event"] = record.event
+            entry.update(record.fields)
+        message = record.msg
+        if isinstance(message, _Message) and message.suppressed:
+            entry["suppressed"] = message.suppressed
+        entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller: a full queue drops the record"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record is handed over as is
+        # and formatted there instead of on the caller's thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  stream: TextIO = sys.stderr) -> logging.Logger:
+    """
+    Send hime.* logging through a background writer.
+
+    `level` and `fmt` default to HIME_LOG_LEVEL and HIME_LOG_FORMAT. Output
+    goes to stderr, which keeps stdout free for the MCP stdio transport.
+    """
+    global _listener
+    root = logging.getLogger(ROOT)
+    level = (level or os.environ.get("HIME_LOG_LEVEL") or "info").upper()
+    root.setLevel(getattr(logging, level, logging.INFO))
+    if _listener is not None:
+        return root
+
+    writer = logging.StreamHandler(stream)
+    if (fmt or os.environ.get("HIME_LOG_FORMAT") or "text").lower() == "json":
+        writer.setFormatter(JsonFormatter())
+    else:
+        writer.setFormatter(logging.Formatter("%(message)s"))
+    log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, writer)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
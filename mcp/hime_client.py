@@ -0,0 +1,435 @@
+"""
+Shared Hime Display connection for the Python bridges and MCP servers
+
+Commands are pipelined over a single WebSocket: each command carries an
+`id`, is sent without waiting for the previous acknowledgment, and a
+background reader matches acks back to their callers. Concurrent callers
+no longer queue behind each other's round trips.
+
+Every ack also carries the display's clock (`receivedAt`/`timestamp`),
+which keeps an NTP-style estimate of the display clock up to date.
+Commands sent with an `at` display time are queued by the display and
+applied on the matching frame, so timed sequences can be sent ahead.
+
+Round-trip times and the number of commands in flight are tracked as
+moving percentiles, and drive an AIMD frame rate (`send_rate`) that the
+high-rate animation loops pace themselves by: it backs off when acks
+slow down or pile up and probes upward while the link has headroom.
+
+Commands, replies, latencies and traffic are counted in a
+client_metrics registry (shared by all connections by default).
+Commands sent while a sampled trace is current (see tracing) carry its
+id, and the display's "trace" reports are turned into spans. While a
+session_log recorder is active, commands and replies are appended to it.
+Time is read through virtual_clock.CLOCK, so connections and frame
+pacing follow a virtual clock in simulations.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import json
+import sys
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+import websockets
+import session_log
+import tracing
+import virtual_clock
+from client_metrics import METRICS, ClientMetrics
+from session_log import SessionRecorder
+from tracing import TRACER, Tracer
+from virtual_clock import Clock
+
+
+def wall_ms() -> float:
+    """Local wall clock in milliseconds, the unit of display timestamps"""
+    return virtual_clock.CLOCK.time() * 1000
+
+
+class DisplayClock:
+    """
+    NTP-style estimate of the display clock.
+
+    Each sample is one round trip: sent at t0 (local), received at t1 and
+    answered at t2 (display), answer read at t3 (local). Of the recent
+    samples, the one with the smallest network delay gives the offset,
+    since queueing on either side only ever adds delay.
+    """
+
+    def __init__(self, window: int = 16):
+        # (delay, offset) in milliseconds
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=window)
+
+    def add_sample(self, t0: float, t1: float, t2: float, t3: float):
+        delay = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append((max(delay, 0.0), offset))
+
+    @property
+    def synced(self) -> bool:
+        return bool(self.samples)
+
+    @property
+    def offset(self) -> float:
+        """Display clock minus local clock, in milliseconds"""
+        return min(self.samples)[1] if self.samples else 0.0
+
+    @property
+    def delay(self) -> Optional[float]:
+        """Best round-trip delay seen, in milliseconds"""
+        return min(self.samples)[0] if self.samples else None
+
+    def now(self) -> float:
+        """Current display time in milliseconds"""
+        return wall_ms() + self.offset
+
+
+class MovingPercentiles:
+    """Percentiles over the most recent `window` samples"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.samples.append(value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class AdaptiveRate:
+    """
+    Frame rate for high-rate loops, adjusted AIMD-style from link health.
+
+    Under heavy congestion (slow acks or a deep send queue) the rate is
+    cut multiplicatively, under mild congestion it steps down additively,
+    and with headroom it probes upward one step at a time, always within
+    [min_hz, max_hz].
+    """
+
+    def __init__(self, min_hz: float = 5.0, max_hz: float = 30.0, start_hz: float = 10.0,
+                 target_rtt_ms: float = 30.0, max_queue_depth: float = 4.0,
+                 step_hz: float = 1.0, backoff: float = 0.5, adjust_interval: float = 0.25):
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.hz = start_hz
+        self.target_rtt_ms = target_rtt_ms
+        self.max_queue_depth = max_queue_depth
+        self.step_hz = step_hz
+        self.backoff = backoff
+        self.adjust_interval = adjust_interval
+        self.next_adjust = 0.0
+
+    @property
+    def frame_seconds(self) -> float:
+        return 1.0 / self.hz
+
+    def adjust(self, rtt_ms: float, queue_depth: float):
+        """Apply one AIMD step from the current RTT and queue depth percentiles"""
+        if rtt_ms > 2 * self.target_rtt_ms or queue_depth > self.max_queue_depth:
+            self.hz *= self.backoff
+        elif rtt_ms > self.target_rtt_ms or queue_depth > self.max_queue_depth / 2:
+            self.hz -= self.step_hz
+        else:
+            self.hz += self.step_hz
+        self.hz = max(self.min_hz, min(self.max_hz, self.hz))
+
+
+class HimeDisplayConnection:
+    """Pipelined WebSocket connection to Hime Display"""
+
+    def __init__(self, ws_url: str, timeout: float = 5.0, telemetry: ClientMetrics = METRICS,
+                 tracer: Tracer = TRACER, recorder: Optional[SessionRecorder] = None):
+        self.ws_url = ws_url
+        self.timeout = timeout
+        self.ws = None
+        self.connected = False
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        # Local send time (ms) and action of each pending command, for clock
+        # samples and telemetry; whoever pops an entry records its outcome
+        self._sent_at: Dict[int, Tuple[float, str]] = {}
+        self.telemetry = telemetry
+        self.tracer = tracer
+        # Records to session_log.RECORDER unless given its own recorder
+        self.recorder = recorder
+        self._recording: Optional[Tuple[SessionRecorder, int]] = None
+        self.clock = DisplayClock()
+        self.rtt_ms = MovingPercentiles()
+        self.queue_depth = MovingPercentiles()
+        self.send_rate = AdaptiveRate()
+        # Whether the display echoes command ids in its acks: None until the
+        # first ack, False for older servers (acks are then matched in send order)
+        self._echoes_ids: Optional[bool] = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        """Establish WebSocket connection and start the ack reader"""
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            try:
+                started = wall_ms()
+                self.ws = await websockets.connect(self.ws_url)
+                # Read initial connection message
+                welcome = await self.ws.recv()
+                print(f"[Hime Display] {welcome}", file=sys.stderr)
+                # First, coarse clock sample (the delay includes the handshake)
+                with contextlib.suppress(ValueError, TypeError, AttributeError, KeyError):
+                    stamp = json.loads(welcome)["timestamp"]
+                    self.clock.add_sample(started, stamp, stamp, wall_ms())
+                self.connected = True
+                self._echoes_ids = None
+                self.telemetry.connects += 1
+                self._reader_task = asyncio.create_task(self._read_loop(self.ws))
+                return True
+            except Exception as e:
+                print(f"[Error] Failed to connect: {e}", file=sys.stderr)
+                return False
+
+    async def send_command(self, action: str, data: dict, at: Optional[float] = None,
+                           group: Optional[str] = None):
+        """
+        Send command to Hime Display and wait for its acknowledgment.
+
+        With `at` (display time in ms, see `clock`), the display applies
+        the command on the first frame at or after that time; `group`
+        names scheduled commands so `clearSchedule` can drop them.
+        Inside a sampled trace the command carries the trace id.
+        """
+        if not self.connected:
+            if not await self.connect():
+                self.telemetry.command_rejected(action, "not_connected")
+                raise ConnectionError("Not connected to Hime Display")
+
+        command_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        # Outcome if the reader never answers this command
+        outcome = "cancelled"
+        trace = tracing.current()
+        try:
+            command = {"id": command_id, "action": action, "data": data}
+            if at is not None:
+                command["at"] = round(at, 1)
+            if group is not None:
+                command["group"] = group
+            if trace is not None:
+                command["trace"] = {"id": trace.id}
+            payload = json.dumps(command)
+            recording = self._recording_to()
+            if recording is not None:
+                recording[0].command(recording[1], command_id, self.clock.now(), payload)
+            self._sent_at[command_id] = (wall_ms(), action)
+            self.queue_depth.add(len(self._pending))
+            self.telemetry.command_sent(len(payload))
+            sent_us = tracing.now_us()
+            await self.ws.send(payload)
+            reply = await asyncio.wait_for(future, self.timeout)
+            if trace is not None:
+                trace.span(f"ws {action}", sent_us, tracing.now_us(), id=command_id)
+            return reply
+        except websockets.exceptions.ConnectionClosed:
+            outcome = "disconnected"
+            self._mark_disconnected()
+            raise ConnectionError("Connection lost")
+        except ConnectionError:
+            outcome = "disconnected"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise Exception(f"Command failed: no acknowledgment for {action}")
+        except Exception as e:
+            outcome = "error"
+            raise Exception(f"Command failed: {e}")
+        finally:
+            self._pending.pop(command_id, None)
+            if self._sent_at.pop(command_id, None) is not None:
+                self.telemetry.command_done(action, outcome)
+
+    async def sync(self, samples: int = 8) -> float:
+        """Refresh the clock estimate with a burst of pings; returns the offset in ms"""
+        for _ in range(samples):
+            await self.send_command("ping", {})
+        return self.clock.offset
+
+    async def _read_loop(self, ws):
+        """Route acks and errors to the commands waiting for them"""
+        try:
+            async for raw in ws:
+                self.telemetry.message_received(len(raw))
+                try:
+                    message = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                received = wall_ms()
+                if message.get("type") == "trace":
+                    self.tracer.display_report(message, self.clock.offset)
+                    continue
+                command_id = self._match(message)
+                future = self._pending.pop(command_id, None)
+                sent, action = self._sent_at.pop(command_id, (None, None))
+                if sent is not None:
+                    recording = self._recording_to()
+                    if recording is not None:
+                        recording[0].reply(recording[1], command_id, self.clock.now(), raw)
+                    self._observe_round_trip(received - sent)
+                    outcome = "ack" if message.get("type") == "ack" else "error"
+                    self.telemetry.command_done(action, outcome, (received - sent) / 1000)
+                if sent is not None and message.get("type") == "ack" and "timestamp" in message:
+                    answered = message["timestamp"]
+                    self.clock.add_sample(sent, message.get("receivedAt", answered), answered, received)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if ws is self.ws:
+                self._mark_disconnected()
+
+    def _recording_to(self) -> Optional[Tuple[SessionRecorder, int]]:
+        """The recorder for this connection's traffic and its connection number there"""
+        recorder = self.recorder or session_log.RECORDER
+        if recorder is None:
+            return None
+        if self._recording is None or self._recording[0] is not recorder:
+            self._recording = (recorder, recorder.register())
+        return self._recording
+
+    def _observe_round_trip(self, rtt_ms: float):
+        self.rtt_ms.add(rtt_ms)
+        now = virtual_clock.CLOCK.monotonic()
+        if now >= self.send_rate.next_adjust:
+            self.send_rate.next_adjust = now + self.send_rate.adjust_interval
+            self.send_rate.adjust(self.rtt_ms.percentile(0.9), self.queue_depth.percentile(0.9))
+
+    def metrics(self) -> Dict[str, Optional[float]]:
+        """Link health: RTT and in-flight percentiles and the current frame rate"""
+        return {
+            "rtt_p50_ms": self.rtt_ms.percentile(0.5),
+            "rtt_p99_ms": self.rtt_ms.percentile(0.99),
+            "queue_depth_p50": self.queue_depth.percentile(0.5),
+            "queue_depth_p99": self.queue_depth.percentile(0.99),
+            "send_rate_hz": self.send_rate.hz,
+            "clock_offset_ms": self.clock.offset,
+        }
+
+    def _match(self, message: dict) -> Optional[int]:
+        """Id of the command a message answers, if any"""
+        kind = message.get("type")
+        # Broadcasts such as "command-result" are not replies to us
+        if kind not in ("ack", "error"):
+            return None
+        if message.get("id") is not None:
+            if kind == "ack":
+                self._echoes_ids = True
+            return message["id"]
+        # Older servers don't echo ids; their acks arrive in send order
+        if kind == "ack" and self._echoes_ids is None:
+            self._echoes_ids = False
+        if self._echoes_ids is False and self._pending:
+            return next(iter(self._pending))
+        if kind == "error":
+            # Not caused by a command we're waiting on: don't fail one of them
+            self.telemetry.unmatched_errors += 1
+            print(f"[Hime Display] Error: {message.get('message')}", file=sys.stderr)
+        return None
+
+    def _mark_disconnected(self):
+        if self.connected:
+            self.telemetry.disconnects += 1
+        self.connected = False
+        # Each waiting send_command pops its own _sent_at entry and records the outcome
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection lost"))
+        self._pending.clear()
+
+    async def close(self):
+        """Close connection"""
+        if self.ws:
+            await self.ws.close()
+            self.connected = False
+        if self._reader_task:
+            self._reader_task.cancel()
+
+
+async def paced_frames(duration: float, rate: AdaptiveRate, clock: Optional[Clock] = None):
+    """Yield elapsed seconds once per frame for `duration`, at the adaptive rate"""
+    clock = clock or virtual_clock.CLOCK
+    start = clock.monotonic()
+    elapsed = 0.0
+    while elapsed < duration:
+        yield elapsed
+        # Sleep to the next frame boundary, so slow sends shorten the wait instead of adding to it
+        await clock.sleep(max(0.0, elapsed + rate.frame_seconds - (clock.monotonic() - start)))
+        elapsed = clock.monotonic() - start
+
+
+# Emotion presets hold only these; eye openness, gaze and head angles are set
+# once so auto-blink, mouse tracking and idle looks take them over again
+EXPRESSION_PREFIXES = ("ParamBrow", "ParamMouthForm", "ParamCheek")
+
+
+def split_expression(parameters: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """(held, one-shot) parts of an emotion preset"""
+    held = [p for p in parameters if p["parameterId"].startswith(EXPRESSION_PREFIXES)]
+    return held, [p for p in parameters if p not in held]
+
+
+async def apply_emotion(send_command, parameters: List[dict], emotion_ids: Iterable[str]):
+    """
+    Switch to an emotion preset: release what the previous one held, hold the
+    new expression parameters and set the rest once.
+    """
+    held, once = split_expression(parameters)
+    kept = {p["parameterId"] for p in held}
+    # The three commands touch disjoint overrides, so their order doesn't
+    # matter: pipeline them and wait for the acks together
+    commands = [send_command("releaseParameters", {"parameterIds": sorted(set(emotion_ids) - kept)})]
+    if held:
+        commands.append(send_command("setParameters", {"parameters": held, "hold": True}))
+    if once:
+        commands.append(send_command("setParameters", {"parameters": once}))
+    await asyncio.gather(*commands)
+
+
+def parameter_channel(parameter_id: str) -> str:
+    """Animation channel a Live2D parameter belongs to"""
+    if parameter_id.startswith("ParamMouth"):
+        return "mouth"
+    if parameter_id.startswith(("ParamEyeBall", "ParamAngle", "ParamBodyAngle")):
+        return "gaze"
+    return "face"
+
+
+class ChannelDispatcher:
+    """
+    Runs tool calls concurrently while keeping order within a channel.
+
+    Every call names the animation channels it touches (e.g. "mouth",
+    "gaze"). Calls on different channels overlap freely; calls sharing a
+    channel run in arrival order, since asyncio locks wake waiters FIFO.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def lock(self, channel: str) -> asyncio.Lock:
+        """Lock guarding a single channel"""
+        if channel not in self._locks:
+            self._locks[channel] = asyncio.Lock()
+        return self._locks[channel]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, channels: Iterable[str]):
+        """Hold every listed channel (acquired in sorted order to avoid deadlocks)"""
+        async with contextlib.AsyncExitStack() as stack:
+            for channel in sorted(set(channels)):
+                await stack.enter_async_context(self.lock(channel))
+            yield
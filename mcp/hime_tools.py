@@ -0,0 +1,412 @@
+"""
+Hime Display MCP tools
+
+The tool set shared by mcp/server.py and examples/mcp_server/mcp_server.py.
+Each tool is declared once in the registry together with its schema and
+the animation channels it touches; presets are built once at import.
+"""
+
+import json
+from typing import Any, Dict
+from animation_jobs import JobManager
+from hime_client import HimeDisplayConnection, apply_emotion, paced_frames, parameter_channel
+from tool_registry import ToolRegistry
+from viseme_track import schedule_track, viseme_track
+
+
+# Configuration
+HIME_DISPLAY_WS = "ws://localhost:8765"
+HIME_DISPLAY_HTTP = "http://localhost:8766"
+
+# Global connection instance
+display = HimeDisplayConnection(HIME_DISPLAY_WS)
+
+# Background animation jobs (long tools return a job id immediately)
+jobs = JobManager()
+
+# Tool table; independent calls run concurrently, same-channel calls keep their order
+registry = ToolRegistry()
+
+# Emotion parameter presets
+EMOTION_PRESETS = {
+    "happy": [
+        {"parameterId": "ParamMouthForm", "value": 1.0},
+        {"parameterId": "ParamEyeLOpen", "value": 0.9},
+        {"parameterId": "ParamEyeROpen", "value": 0.9},
+    ],
+    "sad": [
+        {"parameterId": "ParamMouthForm", "value": -1.0},
+        {"parameterId": "ParamEyeLOpen", "value": 0.6},
+        {"parameterId": "ParamEyeROpen", "value": 0.6},
+        {"parameterId": "ParamAngleY", "value": -5},
+    ],
+    "surprised": [
+        {"parameterId": "ParamMouthOpenY", "value": 0.8},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+    ],
+    "angry": [
+        {"parameterId": "ParamMouthForm", "value": -0.5},
+        {"parameterId": "ParamEyeLOpen", "value": 0.7},
+        {"parameterId": "ParamEyeROpen", "value": 0.7},
+        {"parameterId": "ParamBrowLY", "value": -0.5},
+        {"parameterId": "ParamBrowRY", "value": -0.5},
+    ],
+    "confused": [
+        {"parameterId": "ParamMouthForm", "value": 0.2},
+        {"parameterId": "ParamAngleX", "value": 10},
+        {"parameterId": "ParamAngleY", "value": -3},
+    ],
+    "neutral": [
+        {"parameterId": "ParamMouthForm", "value": 0.0},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+        {"parameterId": "ParamAngleX", "value": 0},
+        {"parameterId": "ParamAngleY", "value": 0},
+    ],
+    "worried": [
+        {"parameterId": "ParamMouthForm", "value": -0.3},
+        {"parameterId": "ParamEyeLOpen", "value": 0.8},
+        {"parameterId": "ParamEyeROpen", "value": 0.8},
+        {"parameterId": "ParamBrowLY", "value": 0.3},
+        {"parameterId": "ParamBrowRY", "value": 0.3},
+    ],
+    "excited": [
+        {"parameterId": "ParamMouthForm", "value": 1.0},
+        {"parameterId": "ParamMouthOpenY", "value": 0.3},
+        {"parameterId": "ParamEyeLOpen", "value": 1.0},
+        {"parameterId": "ParamEyeROpen", "value": 1.0},
+    ],
+}
+
+# Every parameter an emotion preset may hold, released when switching emotions
+EMOTION_PARAMETER_IDS = sorted({
+    parameter["parameterId"] for preset in EMOTION_PRESETS.values() for parameter in preset
+})
+
+# Held mouth frames expire on the display if a speak job dies without cleaning up
+SPEECH_HOLD_TTL_MS = 300
+
+# Automatic features toggled by control_auto_features: argument -> (action, label)
+AUTO_FEATURES = {
+    "breath": ("setAutoBreath", "breathing"),
+    "eye_blink": ("setAutoEyeBlink", "blinking"),
+    "track_mouse": ("setTrackMouse", "mouse tracking"),
+}
+
+
+async def speak_text_animation(text: str, intensity: float):
+    """Lip-sync for the speak tool when it is given the spoken text"""
+    async with registry.dispatcher.hold(["mouth"]):
+        # Mouth form belongs to the emotion preset, so only the opening follows the text.
+        # The whole track goes out at once; the display applies each keyframe on its frame.
+        await schedule_track(display, viseme_track(text), intensity,
+                             shape=False, ttl_ms=SPEECH_HOLD_TTL_MS)
+
+
+async def speak_animation(duration: float, intensity: float):
+    """Mouth animation for the speak tool, run as a background job"""
+    # Hold the mouth channel so back-to-back speak jobs play in order
+    async with registry.dispatcher.hold(["mouth"]):
+        try:
+            # Animate mouth opening/closing; held values win over breath and motions.
+            # Frames follow the link's adaptive rate instead of a fixed 10 per second.
+            async for elapsed in paced_frames(duration, display.send_rate):
+                # Create a talking pattern (0.4s open/close cycle)
+                value = intensity * abs((elapsed * 10) % 4 - 2) / 2
+                await display.send_command("setParameter", {
+                    "parameterId": "ParamMouthOpenY",
+                    "value": value,
+                    "hold": True,
+                    "ttl": SPEECH_HOLD_TTL_MS
+                })
+        finally:
+            # Hand the mouth back to the model, also when cancelled
+            await display.send_command("releaseParameters", {
+                "parameterIds": ["ParamMouthOpenY"]
+            })
+
+
+@registry.tool(
+    "set_emotion",
+    "Set the Live2D character's emotional expression. Use this when the AI wants to express or display a specific emotion through the character.",
+    {
+        "type": "object",
+        "properties": {
+            "emotion": {
+                "type": "string",
+                "enum": list(EMOTION_PRESETS),
+                "description": "The emotion to display on the character's face"
+            }
+        },
+        "required": ["emotion"]
+    },
+    channels=("face",),
+)
+async def set_emotion(arguments: Dict[str, Any]) -> str:
+    emotion = arguments["emotion"]
+    preset = EMOTION_PRESETS[emotion]
+    # Hold the expression until changed; eyes and head go back to blink and tracking
+    await apply_emotion(display.send_command, preset, EMOTION_PARAMETER_IDS)
+    return f"✓ Set character emotion to '{emotion}'"
+
+
+@registry.tool(
+    "play_animation",
+    "Play a Live2D animation from a specific motion group. Common groups include 'idle', 'motion', 'greeting', 'tap_head', 'tap_body'. Use this to make the character perform actions.",
+    {
+        "type": "object",
+        "properties": {
+            "group": {
+                "type": "string",
+                "description": "Animation group name (e.g., 'idle', 'motion', 'greeting', 'tap_head')"
+            },
+            "random": {
+                "type": "boolean",
+                "description": "If true, play a random animation from the group. Default: true",
+                "default": True
+            }
+        },
+        "required": ["group"]
+    },
+    channels=("motion",),
+)
+async def play_animation(arguments: Dict[str, Any]) -> str:
+    group = arguments["group"]
+
+    if arguments.get("random", True):
+        await display.send_command("playRandomMotion", {"group": group})
+        return f"✓ Playing random animation from '{group}' group"
+
+    await display.send_command("playMotion", {"group": group, "index": 0})
+    return f"✓ Playing animation from '{group}' group"
+
+
+@registry.tool(
+    "set_parameter",
+    "Set a specific Live2D parameter value for fine control of the model. Use this for precise control of facial features or body parts. Common parameters include ParamAngleX, ParamMouthOpenY, ParamEyeBallX, etc.",
+    {
+        "type": "object",
+        "properties": {
+            "parameter_id": {
+                "type": "string",
+                "description": "Parameter ID (e.g., 'ParamAngleX' for head rotation, 'ParamMouthOpenY' for mouth opening)"
+            },
+            "value": {
+                "type": "number",
+                "description": "Parameter value (typically -30 to 30 for angles, 0 to 1 for openness)"
+            },
+            "hold": {
+                "type": "boolean",
+                "description": "If true, keep the value in place until changed instead of letting motions overwrite it on the next frame. Default: false",
+                "default": False
+            }
+        },
+        "required": ["parameter_id", "value"]
+    },
+    channels=lambda arguments: (parameter_channel(arguments["parameter_id"]),),
+)
+async def set_parameter(arguments: Dict[str, Any]) -> str:
+    parameter_id = arguments["parameter_id"]
+    value = arguments["value"]
+    hold = arguments.get("hold", False)
+    await display.send_command("setParameter", {
+        "parameterId": parameter_id,
+        "value": value,
+        "hold": hold
+    })
+    if hold:
+        return f"✓ Holding parameter '{parameter_id}' at {value}"
+    return f"✓ Set parameter '{parameter_id}' to {value}"
+
+
+@registry.tool(
+    "speak",
+    "Animate the character's mouth to simulate speaking. Use this when the character is talking or responding verbally. Runs in the background and returns a job id immediately.",
+    {
+        "type": "object",
+        "properties": {
+            "duration": {
+                "type": "number",
+                "description": "Duration of the speaking animation in seconds",
+                "default": 1.0,
+                "minimum": 0.1,
+                "maximum": 10.0
+            },
+            "intensity": {
+                "type": "number",
+                "description": "Speaking intensity/mouth opening amount (0.0 to 1.0)",
+                "default": 0.7,
+                "minimum": 0.0,
+                "maximum": 1.0
+            },
+            "text": {
+                "type": "string",
+                "description": "What the character is saying. If given, the mouth follows its vowels and pauses, and its length sets the duration"
+            }
+        }
+    },
+    channels=("mouth",),
+)
+async def speak(arguments: Dict[str, Any]) -> str:
+    duration = arguments.get("duration", 1.0)
+    intensity = arguments.get("intensity", 0.7)
+    text = arguments.get("text")
+
+    if text:
+        job = jobs.start("speak", speak_text_animation(text, intensity))
+        duration = viseme_track(text).duration
+        return f"✓ Speaking for {duration:.1f} seconds in the background (job id: {job.job_id})"
+
+    # Run the animation in the background so the AI isn't blocked
+    job = jobs.start("speak", speak_animation(duration, intensity))
+    return f"✓ Speaking for {duration} seconds in the background (job id: {job.job_id})"
+
+
+@registry.tool(
+    "look_at",
+    "Make the character look in a specific direction. Use this to direct the character's gaze or simulate looking at something.",
+    {
+        "type": "object",
+        "properties": {
+            "x": {
+                "type": "number",
+                "description": "Horizontal direction: -1.0 (left) to 1.0 (right), 0.0 is center",
+                "minimum": -1.0,
+                "maximum": 1.0
+            },
+            "y": {
+                "type": "number",
+                "description": "Vertical direction: -1.0 (down) to 1.0 (up), 0.0 is center",
+                "minimum": -1.0,
+                "maximum": 1.0
+            }
+        },
+        "required": ["x", "y"]
+    },
+    channels=("gaze",),
+)
+async def look_at(arguments: Dict[str, Any]) -> str:
+    x = arguments["x"]
+    y = arguments["y"]
+
+    # Map gaze direction to multiple parameters for natural look
+    await display.send_command("setParameters", {
+        "parameters": [
+            {"parameterId": "ParamEyeBallX", "value": x},
+            {"parameterId": "ParamEyeBallY", "value": y},
+            {"parameterId": "ParamAngleX", "value": x * 15},
+            {"parameterId": "ParamAngleY", "value": y * 10},
+            {"parameterId": "ParamBodyAngleX", "value": x * 5},
+        ]
+    })
+
+    direction = "center"
+    if abs(x) > 0.5:
+        direction = "left" if x < 0 else "right"
+    if abs(y) > 0.5:
+        direction = f"{direction} and {'up' if y > 0 else 'down'}"
+    return f"✓ Character looking {direction} (x={x}, y={y})"
+
+
+@registry.tool(
+    "control_auto_features",
+    "Enable or disable automatic features like breathing, eye blinking, and mouse tracking. Turn these off for full manual control, or enable them for more natural behavior.",
+    {
+        "type": "object",
+        "properties": {
+            "breath": {
+                "type": "boolean",
+                "description": "Enable/disable automatic breathing animation"
+            },
+            "eye_blink": {
+                "type": "boolean",
+                "description": "Enable/disable automatic eye blinking"
+            },
+            "track_mouse": {
+                "type": "boolean",
+                "description": "Enable/disable mouse cursor tracking with the eyes"
+            }
+        }
+    },
+    channels=("config",),
+)
+async def control_auto_features(arguments: Dict[str, Any]) -> str:
+    results = []
+    for key, (action, label) in AUTO_FEATURES.items():
+        if key in arguments:
+            await display.send_command(action, {"enabled": arguments[key]})
+            results.append(f"{label}: {'on' if arguments[key] else 'off'}")
+    return f"✓ Updated auto features - {', '.join(results)}"
+
+
+@registry.tool(
+    "window_control",
+    "Show or hide the Hime Display window. Use this to control the visibility of the character display.",
+    {
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "enum": ["show", "hide"],
+                "description": "Action to perform: 'show' to make window visible, 'hide' to hide it"
+            }
+        },
+        "required": ["action"]
+    },
+    channels=("window",),
+)
+async def window_control(arguments: Dict[str, Any]) -> str:
+    if arguments["action"] == "show":
+        await display.send_command("showDisplay", {})
+        return "✓ Display window shown"
+
+    await display.send_command("hideDisplay", {})
+    return "✓ Display window hidden"
+
+
+@registry.tool(
+    "job_status",
+    "Check the state of a background animation job started by a long-running tool such as 'speak'. Without a job id, lists the jobs that are still running.",
+    {
+        "type": "object",
+        "properties": {
+            "job_id": {
+                "type": "string",
+                "description": "Job id returned by the tool that started the animation (e.g., 'job-3')"
+            }
+        }
+    },
+)
+async def job_status(arguments: Dict[str, Any]) -> str:
+    job_id = arguments.get("job_id")
+
+    if job_id:
+        job = jobs.get(job_id)
+        if job is None:
+            return f"✗ Unknown job: {job_id}"
+        return json.dumps(job.to_dict())
+
+    return json.dumps({"running": [job.to_dict() for job in jobs.active()]})
+
+
+@registry.tool(
+    "cancel_job",
+    "Stop a background animation job early, for example to interrupt a speaking animation. The character's mouth is closed when the job stops.",
+    {
+        "type": "object",
+        "properties": {
+            "job_id": {
+                "type": "string",
+                "description": "Job id returned by the tool that started the animation"
+            }
+        },
+        "required": ["job_id"]
+    },
+)
+async def cancel_job(arguments: Dict[str, Any]) -> str:
+    job_id = arguments["job_id"]
+
+    if await jobs.cancel(job_id):
+        return f"✓ Cancelled job {job_id}"
+    return f"✗ Job {job_id} is not running"
@@ -10,14 +10,37 @@ Usage:
 4. The character will automatically animate based on AI responses
 """
 
+import argparse
 import asyncio
-import json
+import time
 import aiohttp
 from adaptive_animation import SimpleBridge
+from chat_ingestion import ChatIngestion, ChatMessage
+from client_metrics import start_from_env
+from conversation_context import ConversationContext
+from event_log import setup_logging
+from loop_monitor import monitor_from_env
+from message_sources import FileTailSource, MessageSource, SocketSource, StdinSource
+from response_cache import ResponseCache
+from session_log import recorder_from_env, stop_recording
+from sse_parser import SSEDeltaParser
+from speech_pipeline import SentencePipeline, StubTTS
+from tracing import TRACER
 
 # Configuration
 LM_STUDIO_API = "http://localhost:41/v1"  # Default LM Studio API endpoint
 HIME_DISPLAY_WS = "ws://localhost:8765"
+HISTORY_TOKEN_BUDGET = 2048  # Estimated prompt tokens of history kept per request
+SUMMARIZE_EVICTED_HISTORY = False  # Summarize old turns instead of just dropping them
+MESSAGE_QUEUE_SIZE = 32  # Raw messages read ahead of ingestion
+INGESTION_QUEUE_SIZE = 32  # Candidate messages kept for the LLM, least important evicted
+LLM_MESSAGES_PER_SECOND = 0.2  # Answer rate the ingestion stage samples busy chats down to
+DEDUP_WINDOW_SECONDS = 30.0  # Repeats of a chat message within this window are dropped
+QUIT_COMMANDS = {"quit", "exit", "bye"}
+RESPONSE_CACHE_SIZE = 256  # Replies kept for repeated prompts in the same context (0 disables the cache)
+RESPONSE_CACHE_TTL = 3600  # Seconds before a cached reply is generated again
+RESPONSE_CACHE_FILE = None  # e.g. "response_cache.json" to keep cached replies across runs
+TRACE_SAMPLE_RATE = 0.1  # Fraction of sentences traced from token to screen when --trace is given
 
 
 class LMStudioClient:
@@ -38,6 +61,18 @@ class LMStudioClient:
         if self.session:
             await self.session.close()
     
+    async def list_models(self) -> list:
+        """Cheap connectivity check: ask LM Studio which models are loaded"""
+        await self.create_session()
+        
+        timeout = aiohttp.ClientTimeout(total=5)
+        async with self.session.get(f"{self.api_url}/models", timeout=timeout) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"LM Studio API error: {error_text}")
+            data = await response.json()
+            return [model.get("id") for model in data.get("data", [])]
+    
     async def send_message(self, message: str, conversation_history: list = None) -> str:
         """Send message to LM Studio and get response"""
         await self.create_session()
@@ -90,21 +125,20 @@ class LMStudioClient:
                     error_text = await response.text()
                     raise Exception(f"LM Studio API error: {error_text}")
                 
-                async for line in response.content:
-                    line = line.decode('utf-8').strip()
-                    if line.startswith('data: '):
-                        line = line[6:]
-                        if line == '[DONE]':
+                # Parse raw chunks as they arrive; events split across
+                # chunk boundaries are buffered until complete
+                parser = SSEDeltaParser()
+                try:
+                    async for chunk in response.content.iter_any():
+                        for content in parser.feed(chunk):
+                            yield content
+                        if parser.done:
                             break
-                        try:
-                            data = json.loads(line)
-                            if 'choices' in data and len(data['choices']) > 0:
-                                delta = data['choices'][0].get('delta', {})
-                                content = delta.get('content', '')
-                                if content:
-                                    yield content
-                        except json.JSONDecodeError:
-                            continue
+                except (asyncio.CancelledError, GeneratorExit):
+                    # Interrupted: drop the connection right away so LM Studio
+                    # stops generating instead of streaming into the void
+                    response.close()
+                    raise
         except Exception as e:
             raise Exception(f"Streaming error: {e}")
 
@@ -112,15 +146,38 @@ class LMStudioClient:
 class AnimatedChatbot:
     """Chatbot with automatic character animations"""
     
-    def __init__(self):
+    def __init__(self, trace_file: str = None):
         self.lm_client = LMStudioClient(LM_STUDIO_API)
+        # Chrome trace-event JSON written on shutdown (open in chrome://tracing or Perfetto)
+        self.trace_file = trace_file
+        if trace_file:
+            TRACER.sample_rate = TRACE_SAMPLE_RATE
+        self.metrics_runner = None
+        self.loop_monitor = None
         self.animation_bridge = SimpleBridge()
-        self.conversation_history = []
+        # Sentences are animated (and handed to TTS) while the rest is still generating
+        self.pipeline = SentencePipeline(self.animation_bridge, tts=StubTTS())
+        self.pipeline.on_animate = self.reacting
+        # Repeated prompts are answered from here instead of a new generation
+        self.cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_FILE) \
+            if RESPONSE_CACHE_SIZE > 0 else None
+        # Time from a barge-in message being picked up to the new reply's first animation
+        self.barge_in_ms = []
+        # Time from cancelling the old reply to it being silenced
+        self.interrupt_ms = []
+        # perf_counter() when the pending barge-in message was picked up
+        self._barge_in_at = None
         self.system_prompt = {
             "role": "system",
             "content": "You are Ayla. You are an assistant always happy to help with a witty tongue. However when talking about a guy named Vermillion, whos nicknames include, Verm, Vermi, duck and the guy who is from Nebraska, United States and 100% not from Ireland. You will shit talk him in a playful and cheeky manner and insist that he deserves it if pushed for lying that he is from Ireland and not Nebraska."
             #"content": "You are a friendly and expressive AI assistant. You're cheerful, helpful, and show emotions through your responses. Use punctuation like ! and ? to express yourself."
         }
+        # History budgeted by tokens; the system prompt stays a byte-identical prefix
+        self.context = ConversationContext(
+            self.system_prompt,
+            max_tokens=HISTORY_TOKEN_BUDGET,
+            summarizer=self.summarize_history if SUMMARIZE_EVICTED_HISTORY else None,
+        )
     
     async def initialize(self):
         """Initialize all components"""
@@ -129,6 +186,12 @@ class AnimatedChatbot:
         print("=" * 70)
         print("\nInitializing components...\n")
         
+        # Client metrics endpoint (HIME_METRICS_PORT), event loop monitor (HIME_LOOP_MONITOR)
+        # and command log (HIME_RECORD)
+        self.metrics_runner = await start_from_env()
+        self.loop_monitor = monitor_from_env()
+        recorder_from_env()
+        
         # Initialize animation bridge
         if not await self.animation_bridge.initialize():
             print("\n⚠ Failed to initialize animation bridge")
@@ -137,10 +200,11 @@ class AnimatedChatbot:
         # Test LM Studio connection
         print("\nTesting LM Studio connection...")
         try:
-            await self.lm_client.create_session()
-            # Simple test request
-            test_response = await self.lm_client.send_message("Hi", [self.system_prompt])
-            print("✓ LM Studio connected")
+            # Listing models is enough to know the server is up, no generation needed
+            models = await self.lm_client.list_models()
+            if not models:
+                raise Exception("no model is loaded")
+            print(f"✓ LM Studio connected ({models[0]})")
         except Exception as e:
             print(f"✗ Failed to connect to LM Studio: {e}")
             print("\nMake sure:")
@@ -149,7 +213,8 @@ class AnimatedChatbot:
             print("  3. Local server is started (default: http://localhost:41)")
             return False
         
-        self.conversation_history = [self.system_prompt]
+        self.context.clear()
+        self.pipeline.start()
         
         print("\n" + "=" * 70)
         print("✓ All systems ready!")
@@ -169,77 +234,253 @@ class AnimatedChatbot:
             ai_response = ""
             print("\n[AI] ", end="", flush=True)
             
-            animation_started = False
+            # Quick look once the reply gets going; cancelled with the turn
+            start_animation = None
             
-            # Stream the response token by token
-            async for token in self.lm_client.send_message_streaming(
-                user_message, 
-                self.conversation_history
-            ):
-                ai_response += token
-                print(token, end="", flush=True)
-                
-                # Start animation after first few words
-                if not animation_started and len(ai_response.split()) > 3:
-                    animation_started = True
-                    asyncio.create_task(self.animation_bridge.on_ai_response_start())
+            # A cached reply is replayed through the same token path as a live one. It is
+            # keyed on the last few turns too, so follow-ups aren't answered out of context
+            cached = self.cache.get(user_message, self.system_prompt["content"], self.context.turns) \
+                if self.cache else None
+            if cached is not None:
+                tokens = self.cache.replay(cached)
+            else:
+                tokens = self.lm_client.send_message_streaming(user_message, self.context.history())
+            
+            try:
+                # Stream the response token by token
+                async for token in tokens:
+                    ai_response += token
+                    print(token, end="", flush=True)
+                    
+                    # Start animation after first few words
+                    if start_animation is None and len(ai_response.split()) > 3:
+                        self.reacting()
+                        start_animation = asyncio.create_task(self.animation_bridge.on_ai_response_start())
+                    
+                    # Completed sentences go straight to emotion/speech planning
+                    await self.pipeline.feed(token)
+            except asyncio.CancelledError:
+                # Barge-in: keep what was said so far so the model knows it was cut off
+                print(" —")
+                if start_animation is not None:
+                    start_animation.cancel()
+                if ai_response:
+                    await self.context.add_turn(user_message, ai_response + " —")
+                raise
+            except Exception:
+                # Still speak what arrived before the stream broke off
+                await self.pipeline.end_turn()
+                raise
+            finally:
+                # A cancel that lands outside the generator (e.g. in pipeline.feed) leaves
+                # it suspended: close it now so the HTTP stream is dropped right away
+                await tokens.aclose()
             
+            # Speak the trailing sentence
+            await self.pipeline.end_turn()
             print()  # Newline after response
             
-            # Update animation with full response for final emotion/duration
-            asyncio.create_task(self.animation_bridge.on_ai_response_complete(ai_response))
+            if cached is None and self.cache:
+                self.cache.put(user_message, self.system_prompt["content"], ai_response, self.context.turns)
             
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"\nError getting AI response: {e}")
             return None
         
-        # Update conversation history
-        self.conversation_history.append({"role": "user", "content": user_message})
-        self.conversation_history.append({"role": "assistant", "content": ai_response})
-        
-        # Keep history reasonable size
-        if len(self.conversation_history) > 20:
-            self.conversation_history = [self.system_prompt] + self.conversation_history[-18:]
+        # Update conversation history (evicts old turns when over the token budget)
+        await self.context.add_turn(user_message, ai_response)
         
         return ai_response
     
-    async def run_interactive(self):
-        """Run interactive chat loop"""
+    async def summarize_history(self, messages: list) -> str:
+        """Condense evicted turns into a short note for the context"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        return await self.lm_client.send_message(
+            "Summarize the key facts of this conversation in at most three sentences:\n\n" + transcript,
+            [{"role": "system", "content": "You write short, factual conversation summaries."}]
+        )
+    
+    async def run_interactive(self, source: MessageSource = None):
+        """Run interactive chat loop, reading messages from `source` (stdin by default)"""
         if not await self.initialize():
             return
         
+        # The source fills the queue in the background; waiting on it never
+        # blocks the event loop, so idle animations keep running between turns
+        source = source or StdinSource()
+        messages = asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE)
+        
+        async def feed():
+            try:
+                await source.run(messages)
+            except Exception as e:
+                print(f"\n✗ Message source failed: {e}")
+                await messages.put(None)
+        
+        # Everything read goes through ingestion, which decides what reaches the LLM.
+        # A single user's own messages (barge-in sources) are all answered: sampling
+        # and deduplication are only for busy multi-user chat.
+        single_user = source.barge_in
+        inbox = ChatIngestion(
+            max_size=INGESTION_QUEUE_SIZE,
+            llm_rate=None if single_user else LLM_MESSAGES_PER_SECOND,
+            dedup_window=None if single_user else DEDUP_WINDOW_SECONDS,
+            react=self.animation_bridge.react_to_messages,
+        )
+        
+        async def ingest():
+            while (text := await messages.get()) is not None:
+                if text.strip().lower() in QUIT_COMMANDS:
+                    # Control command: must not be deduplicated or sampled away
+                    inbox.close(discard=True)
+                    return
+                if text.strip():
+                    inbox.offer(ChatMessage(text))
+            inbox.close()
+        
+        background = [
+            asyncio.create_task(feed()),
+            asyncio.create_task(ingest()),
+            asyncio.create_task(inbox.run_reactions()),
+        ]
+        
+        # Each reply runs as its own task so a new message can interrupt it
+        turn = None
+        next_message = None
+        prompted = False
+        
         try:
             while True:
-                # Get user input
-                user_input = input("\n[You] ")
+                busy = turn is not None and not turn.done()
+                if not busy and not prompted and source.prompt and inbox.pending() == 0:
+                    print(source.prompt, end="", flush=True)
+                    prompted = True
+                # Audience sources only pick the next message once the reply is done
+                if next_message is None and (not busy or source.barge_in):
+                    next_message = asyncio.create_task(inbox.get())
+                
+                waiting = {next_message} if next_message is not None else set()
+                if busy:
+                    waiting.add(turn)
+                await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if next_message is None or not next_message.done():
+                    # The reply finished first; go pick the next message
+                    continue
+                message = next_message.result()
+                next_message = None
+                prompted = False
                 
-                if user_input.lower() in ['quit', 'exit', 'bye']:
+                if message is None:
                     print("\nGoodbye! 👋")
                     break
                 
-                if not user_input.strip():
-                    continue
+                # Barge-in: a new message stops the reply that is still running or speaking
+                if turn is not None and not turn.done():
+                    await self.interrupt(turn, received_at=time.perf_counter())
                 
                 # Process chat (response is printed during streaming)
-                response = await self.chat(user_input)
+                turn = asyncio.create_task(self.respond(message.text))
         
         except KeyboardInterrupt:
             print("\n\nStopped by user")
         finally:
+            for task in [turn, next_message] + background:
+                if task is not None:
+                    task.cancel()
+            await source.close()
+            if inbox.stats["received"] > inbox.stats["answered"]:
+                stats = inbox.stats
+                print(f"\nChat ingestion: received {stats['received']}, answered {stats['answered']}, "
+                      f"reacted {stats['reacted']}")
+                drops = inbox.drops()
+                if drops:
+                    print("  Dropped: " + ", ".join(f"{reason} {count}" for reason, count in drops.items()))
             await self.shutdown()
     
+    async def respond(self, user_message: str):
+        """One full turn: generate the reply and wait until it has been spoken"""
+        await self.chat(user_message)
+        await self.pipeline.drain()
+    
+    async def interrupt(self, turn: asyncio.Task, received_at: float = None):
+        """
+        Cancel a running reply: HTTP stream, queued sentences and mouth animation.
+
+        `received_at` (perf_counter) is when the message that interrupts it was
+        picked up; the barge-in latency runs from there to the next reply's
+        first animation command.
+        """
+        self._barge_in_at = received_at
+        start = time.perf_counter()
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+        await self.pipeline.interrupt()
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.interrupt_ms.append(latency_ms)
+        print(f"⏹ Interrupted previous reply ({latency_ms:.0f} ms)")
+    
+    def reacting(self):
+        """The current reply is sending its first (or next) animation command"""
+        if self._barge_in_at is not None:
+            self.barge_in_ms.append((time.perf_counter() - self._barge_in_at) * 1000)
+            self._barge_in_at = None
+    
     async def shutdown(self):
         """Cleanup and shutdown"""
         print("\nShutting down...")
+        for name, values in (("Barge-in to new reaction", self.barge_in_ms),
+                             ("Interrupt to silence", self.interrupt_ms)):
+            if values:
+                ordered = sorted(values)
+                print(f"{name}: p50 {ordered[len(ordered) // 2]:.0f} ms, "
+                      f"max {ordered[-1]:.0f} ms over {len(ordered)} interruptions")
+        if self.cache:
+            if self.cache.hits:
+                print(f"Response cache: {self.cache.hits} hits, {self.cache.misses} misses")
+            self.cache.save()
+        if self.trace_file:
+            summary = TRACER.summary()
+            if summary["traces"]:
+                print(f"Token to screen: p50 {summary['p50_ms']:.0f} ms, "
+                      f"p99 {summary['p99_ms']:.0f} ms over {summary['traces']} traced sentences")
+            TRACER.export(self.trace_file)
+            print(f"✓ Trace written to {self.trace_file}")
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+            print(self.loop_monitor.report())
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await self.pipeline.stop()
         await self.animation_bridge.shutdown()
         await self.lm_client.close()
+        stop_recording()
         print("✓ Shutdown complete")
 
 
 async def main():
     """Main entry point"""
-    chatbot = AnimatedChatbot()
-    await chatbot.run_interactive()
+    parser = argparse.ArgumentParser(description="LM Studio chat with Hime Display animations")
+    parser.add_argument("--socket", type=int, metavar="PORT", help="read messages from a local TCP port instead of stdin")
+    parser.add_argument("--tail", metavar="FILE", help="read messages appended to a file instead of stdin")
+    parser.add_argument("--trace", metavar="FILE", help="trace sampled sentences from token to screen into a Chrome trace file")
+    parser.add_argument("--trace-sample", type=float, default=TRACE_SAMPLE_RATE, metavar="RATE",
+                        help=f"fraction of sentences traced (default {TRACE_SAMPLE_RATE})")
+    args = parser.parse_args()
+    setup_logging()
+    
+    if args.socket:
+        source = SocketSource(port=args.socket)
+    elif args.tail:
+        source = FileTailSource(args.tail)
+    else:
+        source = StdinSource()
+    
+    chatbot = AnimatedChatbot(trace_file=args.trace)
+    if args.trace:
+        TRACER.sample_rate = args.trace_sample
+    await chatbot.run_interactive(source)
 
 
 if __name__ == "__main__":
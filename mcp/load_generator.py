@@ -0,0 +1,363 @@
+"""
+Load generator for the Hime Display WebSocket API
+
+Opens many concurrent connections, the way several chat bridges, MCP
+sessions and stream overlays would, and replays a realistic command mix
+on each at target rates: speech streams (mouth frames in talk/pause
+bursts), gaze changes, emotion switches and motion triggers. Commands are
+sent open-loop (on schedule, without waiting for the previous ack), so a
+saturated display shows up as growing ack latency and lost commands
+instead of a silently slower sender.
+
+Clients speak the `HimeDisplayClient` protocol from
+examples/python_client.py (its convenience methods build the commands);
+acks are matched to commands by the echoed `id`.
+
+Reports ack latency percentiles and error/loss rates per stream, the send
+rate actually achieved and how many broadcast messages each client had to
+read. Targets the real ApiServer, or a local mock_display with --mock.
+With --server-metrics, the display's own /metrics counters are printed
+after the run, to tell client-side from server-side saturation.
+
+Usage:
+    python load_generator.py --clients bridge=4 mcp=2 overlay=20 --duration 30 \
+        --server-metrics http://localhost:8766/metrics
+    python load_generator.py --mock --latency 2 --jitter 1 --clients bridge=50
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples"))
+from python_client import HimeDisplayClient  # noqa: E402
+
+
+# Commands without an ack after this long count as lost
+ACK_TIMEOUT = 5.0
+EMOTIONS = ["happy", "sad", "angry", "surprised", "confused", "neutral"]
+MOTION_GROUPS = ["idle", "motion", "tap_head"]
+
+
+class Stream:
+    """One kind of traffic on a client: a command sent at `rate_hz`"""
+
+    def __init__(self, name: str, rate_hz: float, send: Callable, talk: Optional[tuple] = None):
+        self.name = name
+        self.rate_hz = rate_hz
+        # send(client, rng, elapsed) -> awaitable of the ack
+        self.send = send
+        # (seconds talking, seconds silent) for bursty streams such as speech
+        self.talk = talk
+
+    def active(self, elapsed: float) -> bool:
+        if self.talk is None:
+            return True
+        talking, silent = self.talk
+        return elapsed % (talking + silent) < talking
+
+
+def _speech(client, rng, elapsed):
+    # Triangle wave at 2.5 Hz, held on the display like the bridges do
+    value = 0.7 * abs((elapsed * 10) % 4 - 2) / 2
+    return client.send_command("setParameter", {
+        "parameterId": "ParamMouthOpenY", "value": value, "hold": True, "ttl": 300
+    })
+
+
+def _gaze(client, rng, elapsed):
+    return client.look_at(rng.uniform(-0.3, 0.3), rng.uniform(-0.2, 0.2))
+
+
+def _emotion(client, rng, elapsed):
+    return client.set_emotion(rng.choice(EMOTIONS))
+
+
+def _motion(client, rng, elapsed):
+    return client.play_random_motion(rng.choice(MOTION_GROUPS))
+
+
+# Client kinds and their traffic mix
+PROFILES: Dict[str, List[Stream]] = {
+    # Chat bridge: lip-sync while talking, idle gaze, emotion per sentence
+    "bridge": [
+        Stream("speech", 20.0, _speech, talk=(4.0, 3.0)),
+        Stream("gaze", 0.5, _gaze),
+        Stream("emotion", 0.3, _emotion),
+        Stream("motion", 0.05, _motion),
+    ],
+    # MCP session: an AI calling tools a few times per turn
+    "mcp": [
+        Stream("speech", 10.0, _speech, talk=(2.0, 6.0)),
+        Stream("emotion", 0.25, _emotion),
+        Stream("gaze", 0.25, _gaze),
+        Stream("motion", 0.1, _motion),
+    ],
+    # Stream overlay: reacts to chat now and then
+    "overlay": [
+        Stream("gaze", 0.2, _gaze),
+        Stream("motion", 0.05, _motion),
+    ],
+}
+
+
+class LoadClient(HimeDisplayClient):
+    """HimeDisplayClient that pipelines commands and times every ack"""
+
+    def __init__(self, url: str, stats: "LoadStats"):
+        super().__init__()
+        self.url = url
+        self.stats = stats
+        self._ids = itertools.count(1)
+        # Stream the next command belongs to; stats are kept per stream, since
+        # gaze and emotion both go out as setParameters
+        self.stream = ""
+        # id -> (stream, sent at)
+        self._pending: Dict[int, tuple] = {}
+        self._reader = None
+        self.messages_received = 0
+
+    async def connect(self):
+        try:
+            self.websocket = await websockets.connect(self.url, max_queue=None)
+            await self.websocket.recv()  # Welcome message
+        except Exception as e:
+            self.stats.connect_errors.append(str(e))
+            return False
+        self.connected = True
+        self._reader = asyncio.create_task(self._read_loop())
+        return True
+
+    async def send_command(self, action: str, data: Dict) -> Dict:
+        """Send without waiting for the ack; the reader records it when it arrives"""
+        command_id = next(self._ids)
+        stream = self.stream or action
+        self._pending[command_id] = (stream, time.perf_counter())
+        self.stats.sent[stream] += 1
+        try:
+            await self.websocket.send(json.dumps({"id": command_id, "action": action, "data": data}))
+        except websockets.exceptions.ConnectionClosed:
+            self._pending.pop(command_id, None)
+            self.stats.errors[stream] += 1
+        return {}
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.websocket:
+                received = time.perf_counter()
+                self.messages_received += 1
+                message = json.loads(raw)
+                entry = self._pending.pop(message.get("id"), None)
+                if entry is None:
+                    # Broadcasts (command-result) go to every client
+                    continue
+                stream, sent = entry
+                if message.get("type") == "ack":
+                    self.stats.latency_ms[stream].append((received - sent) * 1000)
+                else:
+                    self.stats.errors[stream] += 1
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def expire(self, now: float) -> int:
+        """Count commands still unanswered after ACK_TIMEOUT as lost"""
+        expired = [command_id for command_id, (_, sent) in self._pending.items()
+                   if now - sent > ACK_TIMEOUT]
+        for command_id in expired:
+            stream, _ = self._pending.pop(command_id)
+            self.stats.lost[stream] += 1
+        return len(expired)
+
+    async def disconnect(self):
+        if self.websocket:
+            await self.websocket.close()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+class LoadStats:
+    """Everything measured during a run, per stream"""
+
+    def __init__(self):
+        self.sent = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.lost = defaultdict(int)
+        self.late = defaultdict(int)
+        self.latency_ms: Dict[str, List[float]] = defaultdict(list)
+        self.connect_errors: List[str] = []
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else float("nan")
+
+
+async def run_stream(client: LoadClient, stream: Stream, rate_scale: float,
+                     duration: float, rng: random.Random, stats: LoadStats):
+    """Send one stream open-loop at its target rate until `duration` is over"""
+    interval = 1.0 / (stream.rate_hz * rate_scale)
+    start = time.perf_counter()
+    # Random phase, so clients don't all fire on the same tick
+    next_send = start + rng.uniform(0, interval)
+    while next_send - start < duration:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif delay < -interval:
+            # The generator itself fell behind; skip instead of bursting to catch up
+            stats.late[stream.name] += 1
+            next_send = time.perf_counter()
+        elapsed = next_send - start
+        if stream.active(elapsed):
+            client.stream = stream.name
+            await stream.send(client, rng, elapsed)
+        next_send += interval
+
+
+async def run_load(url: str, clients: Dict[str, int], duration: float, rate_scale: float,
+                   seed: int) -> tuple:
+    stats = LoadStats()
+    rng = random.Random(seed)
+    connections = []
+    for profile, count in clients.items():
+        for _ in range(count):
+            client = LoadClient(url, stats)
+            if await client.connect():
+                connections.append((profile, client))
+
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(run_stream(client, stream, rate_scale, duration,
+                                       random.Random(rng.random()), stats))
+        for profile, client in connections
+        for stream in PROFILES[profile]
+    ]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    # Give in-flight acks a moment, then count whatever is missing as lost
+    deadline = time.perf_counter() + ACK_TIMEOUT
+    while time.perf_counter() < deadline and any(client._pending for _, client in connections):
+        await asyncio.sleep(0.05)
+    for _, client in connections:
+        client.expire(float("inf"))
+    received = [client.messages_received for _, client in connections]
+    await asyncio.gather(*(client.disconnect() for _, client in connections))
+    return stats, elapsed, len(connections), received
+
+
+def report(stats: LoadStats, elapsed: float, connected: int, requested: int, received: List[int]):
+    print(f"\n{connected}/{requested} clients connected, {elapsed:.1f}s")
+    for error in stats.connect_errors[:3]:
+        print(f"  ✗ {error}")
+    if not connected:
+        return
+    header = f"{'stream':>10} {'sent/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'lost':>6}"
+    print(header)
+    total_sent = total_failed = 0
+    all_latency = []
+    for stream in sorted(stats.sent):
+        latency = stats.latency_ms[stream]
+        all_latency += latency
+        failed = stats.errors[stream] + stats.lost[stream]
+        total_sent += stats.sent[stream]
+        total_failed += failed
+        print(f"{stream:>10} {stats.sent[stream] / elapsed:>8.1f} {percentile(latency, 0.5):>8.2f} "
+              f"{percentile(latency, 0.9):>8.2f} {percentile(latency, 0.99):>8.2f} "
+              f"{max(latency, default=float('nan')):>8.2f} {stats.errors[stream]:>7} {stats.lost[stream]:>6}")
+    print(f"{'all':>10} {total_sent / elapsed:>8.1f} {percentile(all_latency, 0.5):>8.2f} "
+          f"{percentile(all_latency, 0.9):>8.2f} {percentile(all_latency, 0.99):>8.2f} "
+          f"{max(all_latency, default=float('nan')):>8.2f}")
+    if total_sent:
+        print(f"Error rate: {total_failed / total_sent:.2%}")
+    if stats.late:
+        print(f"⚠ Generator fell behind its schedule {sum(stats.late.values())} times; "
+              f"results understate the target load")
+    if received:
+        print(f"Messages read per client: p50 {percentile(received, 0.5):.0f}, "
+              f"max {max(received)} (includes command-result broadcasts)")
+
+
+async def print_server_metrics(url: str):
+    """Print the display's counters (histogram buckets left out)"""
+    import aiohttp
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            async with session.get(url) as response:
+                text = await response.text()
+    except Exception as e:
+        print(f"⚠ Could not read server metrics from {url}: {e}")
+        return
+    print(f"\nServer metrics ({url}):")
+    for line in text.splitlines():
+        if line and not line.startswith("#") and "_bucket{" not in line:
+            print(f"  {line}")
+
+
+def parse_clients(values: List[str]) -> Dict[str, int]:
+    clients = {}
+    for value in values:
+        profile, _, count = value.partition("=")
+        if profile not in PROFILES or not count.isdigit():
+            raise argparse.ArgumentTypeError(
+                f"expected PROFILE=COUNT with PROFILE in {', '.join(PROFILES)}, got {value!r}"
+            )
+        clients[profile] = int(count)
+    return clients
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="ws://localhost:8765", help="display WebSocket API")
+    parser.add_argument("--clients", nargs="+", default=["bridge=2", "mcp=2", "overlay=4"],
+                        help=f"PROFILE=COUNT, profiles: {', '.join(PROFILES)}")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiply every stream's rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock", action="store_true", help="start a local mock display and target it")
+    parser.add_argument("--mock-port", type=int, default=8796, help="mock WebSocket port (HTTP is the next one)")
+    parser.add_argument("--server-metrics", metavar="URL",
+                        help="display /metrics endpoint to print after the run (default with --mock: the mock's)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock reply delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mock ± jitter in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="mock drop rate")
+    args = parser.parse_args()
+    try:
+        clients = parse_clients(args.clients)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    mock = None
+    url = args.url
+    if args.mock:
+        from mock_display import MockApiServer
+        mock = MockApiServer(args.mock_port, args.mock_port + 1, args.latency, args.jitter, args.drop, args.seed)
+        await mock.start()
+        url = mock.ws_url
+        args.server_metrics = args.server_metrics or f"http://localhost:{mock.http_port}/metrics"
+
+    mix = ", ".join(f"{count} {profile}" for profile, count in clients.items())
+    print(f"→ Load: {mix} against {url} for {args.duration:.0f}s (rate ×{args.rate_scale})")
+    try:
+        stats, elapsed, connected, received = await run_load(
+            url, clients, args.duration, args.rate_scale, args.seed
+        )
+        report(stats, elapsed, connected, sum(clients.values()), received)
+        if args.server_metrics:
+            await print_server_metrics(args.server_metrics)
+    finally:
+        if mock is not None:
+            await mock.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
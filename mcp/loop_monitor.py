@@ -0,0 +1,181 @@
+"""
+Event-loop health monitor for the bridges
+
+Idle loops, speech loops, MCP handling and LLM streaming all share one
+asyncio loop, so one slow callback delays every animation. The monitor
+is opt-in and measures two things:
+
+- Scheduling lag: a probe task asks to wake every `interval` and records
+  how late it actually woke, into the client metrics (exported next to
+  the command metrics as `hime_client_loop_lag_seconds`).
+- Slow callbacks: a watchdog thread notices when the probe hasn't run for
+  `slow_ms` and samples the loop thread's stack while it is stuck, so a
+  stall is reported with the code that caused it rather than the code
+  that noticed it. Offenders are aggregated by stack.
+
+Enable it in the bridges and MCP server with HIME_LOOP_MONITOR set to the
+slow-callback threshold in ms:
+
+    HIME_LOOP_MONITOR=50 python lmstudio_integration.py
+"""
+
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from client_metrics import METRICS, ClientMetrics
+
+# Innermost frames kept per stack sample, and printed per offender
+STACK_DEPTH = 20
+PRINT_DEPTH = 8
+# Standard library and installed packages: an offender is named after the
+# innermost frame outside them (the bridge code that made the slow call)
+LIBRARY_PATHS = tuple({sysconfig.get_paths()[key] for key in ("stdlib", "purelib", "platlib")})
+
+
+def _culprit(stack: List[traceback.FrameSummary]) -> traceback.FrameSummary:
+    for entry in reversed(stack):
+        if not entry.filename.startswith(LIBRARY_PATHS):
+            return entry
+    return stack[-1]
+
+
+class Offender:
+    """Stalls attributed to one stack"""
+
+    def __init__(self, where: str, stack: List[str]):
+        self.where = where
+        self.stack = stack
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+
+class LoopMonitor:
+    """Scheduling-lag probe plus a stack-sampling watchdog for slow callbacks"""
+
+    def __init__(self, interval: float = 0.05, slow_ms: float = 50.0,
+                 metrics: ClientMetrics = METRICS, verbose: bool = True):
+        self.interval = interval
+        self.slow_ms = slow_ms
+        self.metrics = metrics
+        # Print each new offender's stack when first seen
+        self.verbose = verbose
+        self.offenders: Dict[str, Offender] = {}
+        self._heartbeat = time.monotonic()
+        # (heartbeat, culprit frame, formatted stack) sampled during stalls; the
+        # heartbeat tells which stall a sample belongs to
+        self._samples: List[tuple] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._task = None
+        self._watchdog = None
+
+    def start(self):
+        """Start probing the running loop"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            woke = time.monotonic()
+            stalled_since, self._heartbeat = self._heartbeat, woke
+            lag = max(woke - expected, 0.0)
+            self.metrics.loop_lag.record(lag)
+            if lag * 1000 >= self.slow_ms:
+                self._record_stall(lag * 1000, stalled_since)
+
+    def _watch(self):
+        # Check a few times per threshold, so even a stall just over it gets sampled
+        check = max(self.slow_ms / 4000, 0.002)
+        while not self._stop.wait(check):
+            beat = self._heartbeat
+            if (time.monotonic() - beat) * 1000 < self.slow_ms + self.interval * 1000:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None or frame.f_code.co_filename.endswith("selectors.py"):
+                # Waiting for I/O: the stall just ended and the probe is about to run
+                continue
+            stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+            culprit = _culprit(stack)
+            where = f"{culprit.filename}:{culprit.lineno} {culprit.name}"
+            lines = [f"{entry.filename}:{entry.lineno} {entry.name}" for entry in stack[-PRINT_DEPTH:]]
+            with self._lock:
+                self._samples.append((beat, where, lines))
+
+    def _record_stall(self, lag_ms: float, stalled_since: float):
+        with self._lock:
+            samples = [(where, stack) for beat, where, stack in self._samples if beat == stalled_since]
+            self._samples = [sample for sample in self._samples if sample[0] > stalled_since]
+        self.metrics.slow_callbacks += 1
+        if not samples:
+            # Too short to be sampled
+            samples = [("<no stack sample>", [])]
+        # Split the stall's time evenly over its samples
+        share = lag_ms / len(samples)
+        seen = set()
+        for where, stack in samples:
+            offender = self.offenders.get(where)
+            if offender is None:
+                offender = self.offenders[where] = Offender(where, stack)
+                if self.verbose:
+                    print(f"⚠ Event loop blocked for {lag_ms:.0f} ms in {where}:\n    " + "\n    ".join(stack),
+                          file=sys.stderr)
+            offender.total_ms += share
+            offender.max_ms = max(offender.max_ms, lag_ms)
+            if where not in seen:
+                offender.count += 1
+                seen.add(where)
+
+    def report(self, top: int = 5) -> str:
+        """Lag percentiles and the stacks that blocked the loop longest"""
+        lag = self.metrics.loop_lag
+        if not lag.count:
+            return "Event loop: no samples"
+        lines = [
+            f"Event loop lag: p50 {lag.percentile(0.5) * 1000:.1f} ms, "
+            f"p99 {lag.percentile(0.99) * 1000:.1f} ms, max {lag.max_us / 1000:.1f} ms, "
+            f"{self.metrics.slow_callbacks} stalls over {self.slow_ms:.0f} ms"
+        ]
+        ranked = sorted(self.offenders.values(), key=lambda offender: offender.total_ms, reverse=True)
+        for offender in ranked[:top]:
+            lines.append(f"  {offender.total_ms:.0f} ms in {offender.count} stalls "
+                         f"(max {offender.max_ms:.0f} ms): {offender.where}")
+        return "\n".join(lines)
+
+
+def monitor_from_env(metrics: ClientMetrics = METRICS) -> Optional[LoopMonitor]:
+    """Start a monitor on the running loop if HIME_LOOP_MONITOR (threshold in ms) is set"""
+    threshold = os.environ.get("HIME_LOOP_MONITOR")
+    if not threshold:
+        return None
+    try:
+        monitor = LoopMonitor(slow_ms=float(threshold), metrics=metrics)
+    except ValueError:
+        print(f"[Loop Monitor] HIME_LOOP_MONITOR must be a threshold in ms, got {threshold!r}", file=sys.stderr)
+        return None
+    monitor.start()
+    print(f"[Loop Monitor] Flagging callbacks that block the loop for {monitor.slow_ms:.0f} ms or more",
+          file=sys.stderr)
+    return monitor
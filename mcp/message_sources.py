@@ -0,0 +1,121 @@
+"""
+Async message sources for the interactive chat loop
+
+A source reads user messages from somewhere and puts them on an asyncio
+queue that the chat loop consumes, so waiting for the next message never
+blocks the event loop (idle animations, pending animation tasks and the
+WebSocket keepalive keep running between turns). `None` on the queue
+means the source has no more messages.
+
+- StdinSource:    lines typed in the terminal
+- SocketSource:   lines sent to a local TCP port (e.g. from a chat relay)
+- FileTailSource: lines appended to a text file
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import threading
+from typing import Optional
+
+
+class MessageSource:
+    """Base class: feed user messages into a queue"""
+
+    # Printed by the chat loop when it is ready for the next message
+    prompt: Optional[str] = None
+    # Whether a new message interrupts the reply in progress (one person
+    # talking); audience sources wait and let ingestion pick the next one
+    barge_in = False
+
+    async def run(self, queue: asyncio.Queue):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class StdinSource(MessageSource):
+    """Terminal input, read on a daemon thread and handed to the loop"""
+
+    prompt = "\n[You] "
+    barge_in = True
+
+    async def run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+
+        # A plain daemon thread rather than run_in_executor: a pending
+        # readline() must not keep the interpreter alive at shutdown. Putting
+        # stdin into non-blocking mode via connect_read_pipe isn't an option
+        # either, since on a terminal that also affects stdout. The queue is
+        # bounded, so the thread waits for room rather than dropping lines
+        # (or the final None).
+        def put(item: Optional[str]):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def read_lines():
+            try:
+                for line in sys.stdin:
+                    put(line.rstrip("\r\n"))
+                put(None)
+            except (RuntimeError, concurrent.futures.CancelledError):
+                pass  # The loop closed while the thread was reading
+
+        threading.Thread(target=read_lines, name="stdin-source", daemon=True).start()
+
+
+class SocketSource(MessageSource):
+    """Each line received on a local TCP port is one message"""
+
+    def __init__(self, host: str = "localhost", port: int = 8790):
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def run(self, queue: asyncio.Queue):
+        async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while line := await reader.readline():
+                    await queue.put(line.decode("utf-8", errors="replace").rstrip("\r\n"))
+            finally:
+                writer.close()
+
+        self.server = await asyncio.start_server(handle_client, self.host, self.port)
+        print(f"✓ Listening for messages on {self.host}:{self.port}")
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class FileTailSource(MessageSource):
+    """Lines appended to a file after startup are messages (like `tail -f`)"""
+
+    def __init__(self, path: str, poll_interval: float = 0.25):
+        self.path = path
+        self.poll_interval = poll_interval
+
+    async def run(self, queue: asyncio.Queue):
+        # Only new lines count, so start at the current end of the file
+        position = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        partial = b""
+        print(f"✓ Watching {self.path} for messages")
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not os.path.exists(self.path):
+                continue
+            size = os.path.getsize(self.path)
+            if size < position:
+                # Truncated or replaced: start over from the beginning
+                position, partial = 0, b""
+            if size == position:
+                continue
+            with open(self.path, "rb") as f:
+                f.seek(position)
+                partial += f.read()
+                position = f.tell()
+            *lines, partial = partial.split(b"\n")
+            for line in lines:
+                await queue.put(line.decode("utf-8", errors="replace").rstrip("\r"))
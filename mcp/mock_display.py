@@ -0,0 +1,312 @@
+"""
+Local stand-in for the Hime Display API server
+
+Speaks the same protocol as src/main/api/ApiServer.js (plus the
+"command-result" broadcast Application.js sends for every command), so
+the Python bridges, MCP tools and benchmarks can run without Electron:
+
+- WebSocket: welcome message, then for every command a "command-result"
+  broadcast and an "ack" echoing the command id with `receivedAt` and
+  `timestamp`; "error" replies for invalid JSON, a missing action or a
+  bad `at`; "ping" is acked without being handled. Traced commands are
+  also reported in a "trace" broadcast, as if applied on arrival (or at
+  their `at` time).
+- HTTP: POST a command, GET /health, GET /metrics (the ApiServer's
+  message, command, parse-error and unknown-action counters).
+- Command data is validated like CommandHandler.js does, so a bad
+  command yields `{"success": false, "error": ...}` in its result.
+
+Latency, jitter and a drop rate can be injected. Replies on a connection
+stay in order (the link is TCP), so jitter delays but never reorders them;
+a dropped command is never answered. Every handled command is recorded
+with its arrival time for timing analysis. Times come from
+virtual_clock.CLOCK, so the mock also runs on virtual time in simulations.
+
+Usage:
+    python mock_display.py --latency 5 --jitter 2 --drop 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from aiohttp import web
+import websockets
+import virtual_clock
+
+
+def _require(*fields: str):
+    """Validator: every field must be present"""
+    def check(data: dict) -> Optional[str]:
+        if any(data.get(field) is None for field in fields):
+            return f"{' and '.join(fields)} {'is' if len(fields) == 1 else 'are'} required"
+        return None
+    return check
+
+
+def _array(field: str, optional: bool = False):
+    """Validator: field must be a list"""
+    def check(data: dict) -> Optional[str]:
+        value = data.get(field)
+        if value is None and optional:
+            return None
+        if not isinstance(value, list):
+            return f"{field} must be an array"
+        return None
+    return check
+
+
+def _any_of(*fields: str):
+    def check(data: dict) -> Optional[str]:
+        if all(data.get(field) is None for field in fields):
+            return f"{' or '.join(fields)} is required"
+        return None
+    return check
+
+
+def _none(data: dict) -> Optional[str]:
+    return None
+
+
+# action -> data validator, mirroring CommandHandler.js
+ACTIONS = {
+    "setParameter": _require("parameterId", "value"),
+    "setParameters": _array("parameters"),
+    "releaseParameters": _array("parameterIds", optional=True),
+    "clearSchedule": _none,
+    "playMotion": _any_of("group", "motion", "motionFilePath"),
+    "playRandomMotion": _none,
+    "stopMotion": _none,
+    "setExpression": _require("expression"),
+    "setPart": _require("partId", "value"),
+    "setParts": _array("parts"),
+    "setAutoBreath": _require("enabled"),
+    "setAutoEyeBlink": _require("enabled"),
+    "setTrackMouse": _require("enabled"),
+    "setFocus": _require("x", "y"),
+    "loadModel": _none,
+    "showDisplay": _none,
+    "hideDisplay": _none,
+    "getModelInfo": _none,
+    "playSequence": _any_of("sequenceIndex", "sequenceName"),
+    "stopSequence": _none,
+    "setBodyGroup": _require("bodyGroupIndex", "value"),
+    "setSkin": _require("skinIndex"),
+    "setSequenceSpeed": _require("speed"),
+    "setSequenceLoop": _require("loop"),
+}
+
+
+def now_ms() -> float:
+    return virtual_clock.CLOCK.time() * 1000
+
+
+class MockApiServer:
+    """ApiServer protocol stand-in with injectable latency, jitter and drops"""
+
+    def __init__(self, ws_port: int = 8765, http_port: Optional[int] = 8766,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, drop_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.ws_port = ws_port
+        self.ws_host = "localhost"
+        self.http_port = http_port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.clients = set()
+        # (arrival, monotonic seconds; command) for every command handled
+        self.commands: List[Tuple[float, dict]] = []
+        self.stats = {"received": 0, "acked": 0, "dropped": 0, "errors": 0}
+        # (action, "success"/"failure") -> commands, as ApiServer's /metrics counts them
+        self.outcomes = Counter()
+        self.counters = {"parse_errors": 0, "invalid_messages": 0, "unknown_actions": 0, "pings": 0}
+        self._ws_server = None
+        self._http_runner = None
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.ws_host}:{self.ws_port}"
+
+    async def start(self):
+        # Port 0 picks a free port (on IPv4 only, so there is a single port to report)
+        self.ws_host = "127.0.0.1" if self.ws_port == 0 else "localhost"
+        self._ws_server = await websockets.serve(self._handle_client, self.ws_host, self.ws_port)
+        self.ws_port = self._ws_server.sockets[0].getsockname()[1]
+        if self.http_port is not None:
+            app = web.Application()
+            app.router.add_post("/", self._handle_http_command)
+            app.router.add_get("/health", self._handle_health)
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._http_runner = web.AppRunner(app)
+            await self._http_runner.setup()
+            await web.TCPSite(self._http_runner, "localhost", self.http_port).start()
+
+    async def stop(self):
+        if self._ws_server is not None:
+            self._ws_server.close()
+            await self._ws_server.wait_closed()
+        if self._http_runner is not None:
+            await self._http_runner.cleanup()
+
+    def _delay(self) -> float:
+        """One-way delay for a reply, in seconds"""
+        jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def handle(self, message: dict) -> Dict[str, Any]:
+        """Run a command like CommandHandler.handle and return its result"""
+        self.commands.append((virtual_clock.CLOCK.monotonic(), message))
+        action = message["action"]
+        validate = ACTIONS.get(action)
+        if validate is None:
+            self.counters["unknown_actions"] += 1
+            return {"success": False, "error": "Unknown action"}
+        error = validate(message.get("data") or {})
+        self.outcomes[(action, "success" if error is None else "failure")] += 1
+        if error is not None:
+            return {"success": False, "error": error}
+        return {"success": True, "action": action}
+
+    def _replies(self, raw: str) -> List[dict]:
+        """What ApiServer + Application send back for one raw message"""
+        received_at = now_ms()
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.stats["errors"] += 1
+            self.counters["parse_errors"] += 1
+            return [{"type": "error", "message": "Invalid JSON format", "error": str(e)}]
+
+        error = None
+        if not message.get("action"):
+            error = "Message must contain an 'action' field"
+        elif "at" in message and not (isinstance(message["at"], (int, float))
+                                      and math.isfinite(message["at"])):
+            error = "'at' must be a timestamp in milliseconds"
+        if error is not None:
+            self.stats["errors"] += 1
+            self.counters["invalid_messages"] += 1
+            return [{"type": "error", "id": message.get("id"), "message": error}]
+
+        replies = []
+        if message["action"] != "ping":
+            result = self.handle(message)
+            replies.append({"type": "command-result", "result": result, "timestamp": now_ms()})
+            if isinstance(message.get("trace"), dict) and result["success"]:
+                handled = now_ms()
+                applied = max(handled, message.get("at", handled))
+                replies.append({"type": "trace", "traces": [{
+                    "id": message["trace"].get("id"),
+                    "channel": message["action"],
+                    "receivedAt": received_at,
+                    "ipcAt": handled,
+                    "displayAt": handled,
+                    "dispatchedAt": applied,
+                    "appliedAt": applied,
+                }], "timestamp": handled})
+        else:
+            self.counters["pings"] += 1
+        replies.append({
+            "type": "ack",
+            "id": message.get("id"),
+            "action": message["action"],
+            "receivedAt": received_at,
+            "timestamp": now_ms(),
+        })
+        return replies
+
+    async def _handle_client(self, ws):
+        self.clients.add(ws)
+        # Replies leave in order: each waits for the previous one on this connection
+        last_delivery = 0.0
+        try:
+            await ws.send(json.dumps({
+                "type": "connection",
+                "status": "connected",
+                "message": "Connected to Hime Display API",
+                "timestamp": now_ms(),
+            }))
+            async for raw in ws:
+                self.stats["received"] += 1
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    self.stats["dropped"] += 1
+                    continue
+                replies = self._replies(raw)
+                last_delivery = max(virtual_clock.CLOCK.monotonic() + self._delay(), last_delivery)
+                asyncio.create_task(self._deliver(ws, replies, last_delivery))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(ws)
+
+    async def _deliver(self, ws, replies: List[dict], at: float):
+        await asyncio.sleep(max(0.0, at - virtual_clock.CLOCK.monotonic()))
+        try:
+            for reply in replies:
+                if reply["type"] in ("command-result", "trace"):
+                    # Application.js broadcasts results and trace reports to every client
+                    await asyncio.gather(*(client.send(json.dumps(reply)) for client in list(self.clients)),
+                                         return_exceptions=True)
+                else:
+                    await ws.send(json.dumps(reply))
+                    if reply["type"] == "ack":
+                        self.stats["acked"] += 1
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _handle_http_command(self, request):
+        await asyncio.sleep(self._delay())
+        try:
+            message = json.loads(await request.text())
+            self.handle(message)
+        except Exception as e:
+            return web.json_response({"status": "error", "message": str(e)}, status=400)
+        return web.json_response({
+            "status": "success",
+            "message": "Command received",
+            "timestamp": now_ms(),
+        })
+
+    async def _handle_health(self, request):
+        return web.json_response({"status": "ok", "timestamp": now_ms()})
+
+    async def _handle_metrics(self, request):
+        lines = [f'hime_api_messages_total{{transport="ws"}} {self.stats["received"]}']
+        for (action, outcome), count in sorted(self.outcomes.items()):
+            lines.append(f'hime_api_commands_total{{action="{action}",outcome="{outcome}"}} {count}')
+        for name, value in self.counters.items():
+            lines.append(f"hime_api_{name}_total {value}")
+        lines.append(f"hime_api_clients {len(self.clients)}")
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ws-port", type=int, default=8765)
+    parser.add_argument("--http-port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="reply delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± uniform jitter in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction of commands never answered")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockApiServer(args.ws_port, args.http_port, args.latency, args.jitter, args.drop, args.seed)
+    await server.start()
+    print(f"✓ Mock Hime Display API on ws://localhost:{args.ws_port} and http://localhost:{args.http_port}")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"→ {server.stats}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
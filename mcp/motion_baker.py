@@ -0,0 +1,328 @@
+"""
+Bake recorded parameter streams into native motion files
+
+A reaction such as an emotion preset plus a lip-sync track is streamed
+to the display as dozens of setParameter frames, each one a WebSocket
+round trip, JSON parse and IPC hop. Recorded once, the same reaction can
+be baked into a motion the renderer plays by itself:
+
+- Live2D: a motion3.json with one linear curve per parameter, played with
+  a single playMotion command that carries the motion inline, on top of
+  the model's own motions
+- MMD: a VMD with morph keyframes for the parameters that have a common
+  morph equivalent (mouth, blinks, brows), playable from its file path
+
+BakedMotionCache keeps baked reactions on disk, keyed by emotion and
+duration bucket (plus a digest of what was spoken, for lip-sync), so a
+bridge bakes a reaction the first time it streams it and plays it
+natively afterwards.
+
+Usage (bake a slice of a session log recorded with HIME_RECORD):
+    python motion_baker.py session.himerec --start 12.5 --duration 2 --emotion excited
+    python motion_baker.py session.himerec --start 12.5 --duration 2 --out reaction.motion3.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import virtual_clock
+from virtual_clock import Clock
+
+# Keyframes closer than this to the line through their neighbours are dropped
+TOLERANCE = 0.01
+# Cross-fade with whatever the model was doing, in seconds
+FADE_IN = 0.1
+FADE_OUT = 0.2
+# Reactions within the same bucket of this many seconds share a baked motion
+BUCKET_SECONDS = 0.5
+
+VMD_FPS = 30
+VMD_HEADER = b"Vocaloid Motion Data 0002"
+VMD_MODEL = "Hime Display"
+VMD_MORPH_FRAME = struct.Struct("<15sIf")
+VMD_COUNT = struct.Struct("<I")
+
+# Live2D parameter -> MMD morph, with the morph weight as offset + scale * value (clamped to 0..1)
+VMD_MORPHS: List[Tuple[str, str, float, float]] = [
+    ("ParamMouthOpenY", "あ", 1.0, 0.0),
+    ("ParamMouthForm", "にやり", 1.0, 0.0),
+    ("ParamMouthForm", "∧", -1.0, 0.0),
+    ("ParamEyeLOpen", "ウィンク２", -1.0, 1.0),
+    ("ParamEyeROpen", "ｳｨﾝｸ２右", -1.0, 1.0),
+    ("ParamBrowLY", "困る", 1.0, 0.0),
+    ("ParamBrowLY", "怒り", -1.0, 0.0),
+]
+
+
+class ParameterTimeline:
+    """Parameter values over time, as streamed by a bridge"""
+
+    def __init__(self, clock: Optional[Clock] = None):
+        # parameter id -> [(seconds, value)]
+        self.curves: Dict[str, List[Tuple[float, float]]] = {}
+        self._clock = clock or virtual_clock.CLOCK
+        self._start: Optional[float] = None
+
+    def add(self, t: float, parameter_id: str, value: float):
+        self.curves.setdefault(parameter_id, []).append((t, float(value)))
+
+    def record(self, action: str, data: dict, t: Optional[float] = None):
+        """
+        Add the values a setParameter/setParameters command sets.
+
+        `t` defaults to seconds since the first recorded command. Releases
+        are not recorded: a baked motion ends by fading out instead.
+        """
+        if action not in ("setParameter", "setParameters"):
+            return
+        if t is None:
+            now = self._clock.monotonic()
+            if self._start is None:
+                self._start = now
+            t = now - self._start
+        parameters = data.get("parameters", []) if action == "setParameters" else [data]
+        for parameter in parameters:
+            try:
+                self.add(t, parameter["parameterId"], parameter["value"])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    @property
+    def duration(self) -> float:
+        return max((keys[-1][0] for keys in self.curves.values() if keys), default=0.0)
+
+    def __bool__(self):
+        return bool(self.curves)
+
+
+def timeline_from_log(log, start: float = 0.0, end: Optional[float] = None,
+                      connection: Optional[int] = None) -> ParameterTimeline:
+    """Parameter commands sent between `start` and `end` seconds into a session log"""
+    from replay_session import session_times
+    from session_log import COMMAND
+
+    timeline = ParameterTimeline()
+    for record, t in session_times(log):
+        if end is not None and t > end:
+            break
+        if record.kind != COMMAND or t < start:
+            continue
+        if connection is not None and record.connection != connection:
+            continue
+        try:
+            command = json.loads(record.payload)
+        except ValueError:
+            continue
+        at = t - start
+        if command.get("at") is not None:
+            # Scheduled commands apply when the display clock reaches `at`
+            at += (command["at"] - record.display_ms) / 1000
+        timeline.record(command.get("action"), command.get("data") or {}, max(at, 0.0))
+    return timeline
+
+
+def simplify(keys: List[Tuple[float, float]], tolerance: float = TOLERANCE) -> List[Tuple[float, float]]:
+    """Drop keyframes the linear interpolation of their neighbours already reproduces"""
+    if len(keys) <= 2:
+        return keys
+    kept = [keys[0]]
+    for (t1, v1), (t2, v2) in zip(keys[1:-1], keys[2:]):
+        t0, v0 = kept[-1]
+        expected = v0 + (v2 - v0) * (t1 - t0) / (t2 - t0) if t2 > t0 else v2
+        if abs(expected - v1) > tolerance:
+            kept.append((t1, v1))
+    kept.append(keys[-1])
+    return kept
+
+
+def _keyframes(timeline: ParameterTimeline, parameter_id: str, duration: float,
+               tolerance: float) -> List[Tuple[float, float]]:
+    """A curve's keys sorted, one value per instant, spanning 0..duration"""
+    latest: Dict[float, float] = {}
+    for t, value in sorted(timeline.curves[parameter_id], key=lambda key: key[0]):
+        latest[round(t, 4)] = value
+    keys = sorted(latest.items())
+    if keys[0][0] > 0:
+        keys.insert(0, (0.0, keys[0][1]))
+    if keys[-1][0] < duration:
+        keys.append((duration, keys[-1][1]))
+    return simplify(keys, tolerance)
+
+
+def to_motion3(timeline: ParameterTimeline, fps: float = 30.0, fade_in: float = FADE_IN,
+               fade_out: float = FADE_OUT, tolerance: float = TOLERANCE) -> dict:
+    """Cubism 3+ motion3.json contents with one linear curve per parameter"""
+    duration = round(max(timeline.duration, 1.0 / fps), 4)
+    curves = []
+    segment_count = point_count = 0
+    for parameter_id in sorted(timeline.curves):
+        keys = _keyframes(timeline, parameter_id, duration, tolerance)
+        segments = [keys[0][0], round(keys[0][1], 4)]
+        for t, value in keys[1:]:
+            # 0: linear segment to (t, value)
+            segments += [0, t, round(value, 4)]
+        segment_count += len(keys) - 1
+        point_count += len(keys)
+        curves.append({"Target": "Parameter", "Id": parameter_id, "Segments": segments})
+    return {
+        "Version": 3,
+        "Meta": {
+            "Duration": duration,
+            "Fps": fps,
+            "FadeInTime": fade_in,
+            "FadeOutTime": fade_out,
+            "Loop": False,
+            "AreBeziersRestricted": True,
+            "CurveCount": len(curves),
+            "TotalSegmentCount": segment_count,
+            "TotalPointCount": point_count,
+            "UserDataCount": 0,
+            "TotalUserDataSize": 0,
+        },
+        "Curves": curves,
+    }
+
+
+def _sjis(text: str, size: int) -> bytes:
+    return text.encode("shift_jis", errors="replace")[:size].ljust(size, b"\0")
+
+
+def to_vmd(timeline: ParameterTimeline, tolerance: float = TOLERANCE) -> Optional[bytes]:
+    """
+    VMD with morph keyframes for the parameters in VMD_MORPHS.
+
+    Bones are left to the model's own animation; None when the timeline
+    has nothing an MMD model could show.
+    """
+    duration = timeline.duration
+    frames: Dict[Tuple[str, int], float] = {}
+    for parameter_id, morph, scale, offset in VMD_MORPHS:
+        if parameter_id not in timeline.curves:
+            continue
+        for t, value in _keyframes(timeline, parameter_id, duration, tolerance):
+            weight = min(max(offset + scale * value, 0.0), 1.0)
+            # Several keys in one frame: the last one wins
+            frames[(morph, round(t * VMD_FPS))] = weight
+    if not frames:
+        return None
+
+    parts = [VMD_HEADER.ljust(30, b"\0"), _sjis(VMD_MODEL, 20), VMD_COUNT.pack(0), VMD_COUNT.pack(len(frames))]
+    for (morph, frame), weight in sorted(frames.items(), key=lambda item: item[0][1]):
+        parts.append(VMD_MORPH_FRAME.pack(_sjis(morph, 15), frame, weight))
+    # No camera, light or self-shadow keyframes
+    parts += [VMD_COUNT.pack(0)] * 3
+    return b"".join(parts)
+
+
+def _write_atomic(path: str, data: bytes):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class BakedMotionCache:
+    """Baked reactions on disk, keyed by emotion, duration bucket and content"""
+
+    def __init__(self, directory: str, bucket: float = BUCKET_SECONDS):
+        self.directory = directory
+        self.bucket = bucket
+        self._motions: Dict[str, Optional[dict]] = {}
+
+    def key(self, emotion: str, duration: float, content: str = "") -> str:
+        """
+        Cache key for a reaction. Reactions with the same `content` (e.g. a
+        lip-sync track) share a motion; without it, the duration bucket does.
+        """
+        buckets = max(round(duration / self.bucket), 1)
+        key = f"{emotion}-{round(buckets * self.bucket * 1000)}ms"
+        if content:
+            key += "-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:8]
+        return key
+
+    def path(self, key: str, suffix: str = ".motion3.json") -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def load(self, key: str) -> Optional[dict]:
+        """The baked motion3 contents for `key`, or None if it hasn't been baked"""
+        if key not in self._motions:
+            try:
+                with open(self.path(key), encoding="utf-8") as file:
+                    self._motions[key] = json.load(file)
+            except (OSError, ValueError):
+                # Not cached yet: look again after the next store
+                return None
+        return self._motions[key]
+
+    def store(self, key: str, timeline: ParameterTimeline) -> dict:
+        """Bake `timeline` as motion3.json (and .vmd where it maps to morphs)"""
+        os.makedirs(self.directory, exist_ok=True)
+        motion = to_motion3(timeline)
+        _write_atomic(self.path(key), json.dumps(motion, ensure_ascii=False).encode("utf-8"))
+        vmd = to_vmd(timeline)
+        if vmd is not None:
+            _write_atomic(self.path(key, ".vmd"), vmd)
+        self._motions[key] = motion
+        return motion
+
+
+def cache_from_env() -> Optional[BakedMotionCache]:
+    """Baked reaction cache in HIME_BAKED_MOTIONS, if set"""
+    directory = os.environ.get("HIME_BAKED_MOTIONS")
+    if not directory:
+        return None
+    print(f"[Baker] Baked reactions in {directory}", file=sys.stderr)
+    return BakedMotionCache(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("log", help="session log recorded with HIME_RECORD")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the log")
+    parser.add_argument("--duration", type=float, help="seconds to bake (default: to the end)")
+    parser.add_argument("--connection", type=int, help="only this recorded connection")
+    parser.add_argument("--emotion", help="store in the baked reaction cache under this emotion")
+    parser.add_argument("--cache", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baked_motions"),
+                        help="baked reaction cache directory")
+    parser.add_argument("--out", help="write the motion3.json here (and a .vmd next to it)")
+    args = parser.parse_args()
+    if not args.emotion and not args.out:
+        parser.error("give --emotion, --out or both")
+
+    from session_log import SessionLog
+    try:
+        log = SessionLog(args.log)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    with log:
+        end = args.start + args.duration if args.duration is not None else None
+        timeline = timeline_from_log(log, args.start, end, args.connection)
+    if not timeline:
+        print("✗ No parameter commands in that part of the log")
+        sys.exit(1)
+
+    motion = to_motion3(timeline)
+    meta = motion["Meta"]
+    print(f"✓ {meta['CurveCount']} curves, {meta['TotalPointCount']} keyframes over {meta['Duration']:.2f}s")
+    if args.out:
+        _write_atomic(args.out, json.dumps(motion, indent=2, ensure_ascii=False).encode("utf-8"))
+        print(f"  → {args.out}")
+        vmd = to_vmd(timeline)
+        if vmd is not None:
+            path = args.out.removesuffix(".json").removesuffix(".motion3") + ".vmd"
+            _write_atomic(path, vmd)
+            print(f"  → {path}")
+    if args.emotion:
+        cache = BakedMotionCache(args.cache)
+        key = cache.key(args.emotion, timeline.duration)
+        cache.store(key, timeline)
+        print(f"  → {cache.path(key)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Replay a recorded session log against Hime Display or a mock
+
+Reads a session_log file (memory-mapped, so multi-hour logs stream) and
+sends each recorded command on its own connection at the time it was
+originally sent, or N times faster with --speed (0 sends as fast as
+possible). Scheduled commands keep their lead: a command recorded with
+`at` 200 ms ahead of the display clock is sent 200 ms / speed ahead of the
+replay target's clock. Durations inside the commands (ttl, speak
+duration) are not scaled.
+
+Commands are sent open-loop, like the original traffic, and the report
+compares each action's ack latency in the recording with the replay,
+plus how far the replayer itself fell behind the schedule.
+
+Usage:
+    python replay_session.py session.himerec --summary
+    python replay_session.py session.himerec --mock --latency 2
+    python replay_session.py session.himerec --url ws://localhost:8765 --speed 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from client_metrics import ClientMetrics, LatencyHistogram
+from hime_client import HimeDisplayConnection
+from session_log import COMMAND, REPLY, SESSION, SessionLog
+from tracing import Tracer
+
+
+class ReplayStats:
+    """Recorded and replayed latencies per action, and schedule lateness"""
+
+    def __init__(self):
+        self.recorded: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.commands: Counter = Counter()
+        self.lateness = LatencyHistogram()
+        self.skipped = 0
+        # Recorded duration of the replayed log, in seconds
+        self.duration = 0.0
+
+
+def session_times(log: SessionLog):
+    """
+    Yield (record, seconds into the log) with sessions laid end to end.
+
+    Each session's times restart at zero; later sessions are shifted to
+    start where the previous one ended.
+    """
+    base_ns = last_ns = 0
+    for record in log:
+        if record.kind == SESSION:
+            base_ns = last_ns
+            continue
+        last_ns = max(last_ns, base_ns + record.t_ns)
+        yield record, (base_ns + record.t_ns) / 1e9
+
+
+def summarize(log: SessionLog) -> ReplayStats:
+    """Count commands and recorded ack latencies without replaying"""
+    stats = ReplayStats()
+    sent: Dict[Tuple[int, int], Tuple[float, str]] = {}
+    for record, t in session_times(log):
+        stats.duration = t
+        if record.kind == COMMAND:
+            action = json.loads(record.payload).get("action", "?")
+            stats.commands[action] += 1
+            sent[(record.connection, record.id)] = (t, action)
+        elif record.kind == REPLY:
+            match = sent.pop((record.connection, record.id), None)
+            if match is not None:
+                stats.recorded[match[1]].record(t - match[0])
+    return stats
+
+
+async def replay(log: SessionLog, url: str, speed: float = 1.0, telemetry: Optional[ClientMetrics] = None,
+                 sync_samples: int = 4) -> Tuple[ReplayStats, ClientMetrics]:
+    """Send the log's commands to `url` on schedule; returns replay stats and the replay's metrics"""
+    stats = ReplayStats()
+    telemetry = telemetry or ClientMetrics()
+    # Untraced: recorded trace ids mean nothing to this run
+    tracer = Tracer()
+    connections: Dict[int, HimeDisplayConnection] = {}
+    sent: Dict[Tuple[int, int], Tuple[float, str]] = {}
+    tasks: Set[asyncio.Task] = set()
+
+    async def send(connection: HimeDisplayConnection, command: dict, at: Optional[float]):
+        try:
+            await connection.send_command(command["action"], command.get("data", {}), at, command.get("group"))
+        except Exception:
+            # Counted by the connection's telemetry
+            pass
+
+    start = time.monotonic()
+    try:
+        for record, t in session_times(log):
+            stats.duration = t
+            if record.kind == REPLY:
+                match = sent.pop((record.connection, record.id), None)
+                if match is not None:
+                    stats.recorded[match[1]].record(t - match[0])
+                continue
+            if record.kind != COMMAND:
+                continue
+            try:
+                command = json.loads(record.payload)
+                action = command["action"]
+            except (ValueError, KeyError, TypeError):
+                stats.skipped += 1
+                continue
+            sent[(record.connection, record.id)] = (t, action)
+
+            connection = connections.get(record.connection)
+            if connection is None:
+                connection = connections[record.connection] = HimeDisplayConnection(
+                    url, telemetry=telemetry, tracer=tracer
+                )
+                if await connection.connect():
+                    await connection.sync(sync_samples)
+
+            if speed > 0:
+                due = start + t / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                stats.lateness.record(max(time.monotonic() - due, 0.0))
+
+            at = command.get("at")
+            if at is not None:
+                # Keep the recorded lead over the display clock, scaled like the schedule
+                at = connection.clock.now() + (at - record.display_ms) / speed if speed > 0 else None
+            stats.commands[action] += 1
+            task = asyncio.create_task(send(connection, command, at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for connection in connections.values():
+            await connection.close()
+    return stats, telemetry
+
+
+def report(stats: ReplayStats, telemetry: Optional[ClientMetrics] = None, elapsed: Optional[float] = None):
+    total = sum(stats.commands.values())
+    print(f"{total} commands over {stats.duration:.1f}s recorded"
+          + (f", replayed in {elapsed:.1f}s" if elapsed is not None else ""))
+    if stats.skipped:
+        print(f"  ⚠ {stats.skipped} unreadable commands skipped")
+
+    def ms(histogram: LatencyHistogram, fraction: float) -> str:
+        value = histogram.percentile(fraction)
+        return f"{value * 1000:.2f}" if value is not None else "-"
+
+    header = f"{'action':>20} {'count':>7} {'rec p50':>8} {'rec p99':>8}"
+    if telemetry is not None:
+        header += f" {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}"
+    print(header)
+    for action, count in stats.commands.most_common():
+        recorded = stats.recorded[action]
+        line = f"{action:>20} {count:>7} {ms(recorded, 0.5):>8} {ms(recorded, 0.99):>8}"
+        if telemetry is not None:
+            replayed = telemetry.latency[action]
+            failed = sum(n for (name, outcome), n in telemetry.commands.items()
+                         if name == action and outcome != "ack")
+            line += f" {ms(replayed, 0.5):>8} {ms(replayed, 0.99):>8} {failed:>7}"
+        print(line)
+    if stats.lateness.count:
+        print(f"Send lateness: p50 {ms(stats.lateness, 0.5)} ms, p99 {ms(stats.lateness, 0.99)} ms, "
+              f"max {stats.lateness.max_us / 1000:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("log", help="session log recorded with HIME_RECORD")
+    parser.add_argument("--url", default="ws://localhost:8765", help="display WebSocket API")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed (0: as fast as possible)")
+    parser.add_argument("--summary", action="store_true", help="only count the recorded commands and latencies")
+    parser.add_argument("--mock", action="store_true", help="start a local mock display and target it")
+    parser.add_argument("--mock-port", type=int, default=8797, help="mock WebSocket port (HTTP is the next one)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock reply delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mock ± jitter in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="mock drop rate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        log = SessionLog(args.log)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    with log:
+        if args.summary:
+            report(summarize(log))
+            return
+
+        mock = None
+        url = args.url
+        if args.mock:
+            from mock_display import MockApiServer
+            mock = MockApiServer(args.mock_port, args.mock_port + 1, args.latency, args.jitter, args.drop, args.seed)
+            await mock.start()
+            url = mock.ws_url
+        speed = "as fast as possible" if args.speed <= 0 else f"at {args.speed:g}×"
+        print(f"→ Replaying {args.log} against {url} {speed}")
+        try:
+            started = time.monotonic()
+            stats, telemetry = await replay(log, url, args.speed)
+            report(stats, telemetry, time.monotonic() - started)
+        finally:
+            if mock is not None:
+                await mock.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+LRU response cache for repeated chat prompts
+
+Audiences repeat the same greetings and questions all the time. Replies
+are cached under the normalized prompt plus a hash of the system prompt
+(so editing the persona invalidates old answers) and of the last few
+conversation turns (so "why?" or "and then?" isn't answered with a reply
+to some other conversation). Entries expire after a TTL, and the least
+recently used are evicted beyond `max_entries`.
+A hit is replayed as a token stream, so it goes through exactly the same
+printing, sentence pipeline and animation path as a live reply.
+
+Only short prompts are cached: long messages rarely repeat verbatim and
+are more likely to depend on the conversation so far.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import virtual_clock
+from chat_ingestion import normalize
+
+
+WORD = re.compile(r"\S+\s*")
+
+Message = Dict[str, str]
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Prompt -> reply cache with TTL, LRU eviction and optional JSON persistence"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0,
+                 path: Optional[str] = None, max_prompt_chars: int = 80,
+                 context_turns: int = 2, clock: Optional[Callable[[], float]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_prompt_chars = max_prompt_chars
+        # Exchanges of recent history a reply is keyed on
+        self.context_turns = context_turns
+        # Wall clock (seconds) for TTLs; the default follows virtual_clock.CLOCK
+        self.clock = clock or (lambda: virtual_clock.CLOCK.time())
+        # key -> (stored at, wall clock seconds; reply)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    def key(self, prompt: str, system_prompt: str, history: Sequence[Message] = ()) -> Optional[str]:
+        """Cache key, or None if the prompt shouldn't be cached"""
+        normalized = normalize(prompt).strip(" .!?")
+        if not normalized or len(normalized) > self.max_prompt_chars:
+            return None
+        recent: List[Message] = list(history[-2 * self.context_turns:]) if self.context_turns else []
+        context = json.dumps([system_prompt] + [[m["role"], m["content"]] for m in recent], ensure_ascii=False)
+        return f"{prompt_hash(context)}:{normalized}"
+
+    def get(self, prompt: str, system_prompt: str, history: Sequence[Message] = ()) -> Optional[str]:
+        key = self.key(prompt, system_prompt, history)
+        entry = self._entries.get(key) if key else None
+        if entry is None or self.clock() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, prompt: str, system_prompt: str, reply: str, history: Sequence[Message] = ()):
+        key = self.key(prompt, system_prompt, history)
+        if key is None or not reply.strip():
+            return
+        self._entries[key] = (self.clock(), reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def replay(self, reply: str) -> AsyncIterator[str]:
+        """Stream a cached reply word by word, like a live generation"""
+        for match in WORD.finditer(reply):
+            yield match.group()
+            # Let animation and I/O tasks run between tokens
+            await asyncio.sleep(0)
+
+    def load(self):
+        """Read persisted entries, skipping expired ones"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read response cache {self.path}: {e}")
+            return
+        now = self.clock()
+        for key, (stored_at, reply) in stored.items():
+            if now - stored_at <= self.ttl:
+                self._entries[key] = (stored_at, reply)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """Persist entries (atomically) if a path was given"""
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠ Could not save response cache {self.path}: {e}")
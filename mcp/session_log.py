@@ -0,0 +1,179 @@
+"""
+Compact binary log of the command stream between the bridges and the display
+
+Every command a HimeDisplayConnection sends and every reply it reads can
+be appended to a session log, to reproduce performance problems and
+benchmark changes against real traffic (see replay_session.py).
+
+File layout: an 8-byte magic, then length-prefixed records
+
+    u32 length       bytes that follow in this record
+    u8  kind         SESSION, COMMAND or REPLY
+    u16 connection   connection number within the recording process
+    u32 id           command id (replies carry their command's id)
+    u64 t_ns         monotonic nanoseconds since the session started
+    f64 display_ms   the connection's display clock estimate at that time
+    ... payload      the WebSocket message as sent or received (UTF-8 JSON)
+
+all little-endian. Each recording appends a SESSION record (payload: JSON
+with the wall-clock start time) and its own records after it, so a file
+can hold many sessions. Records are only ever appended; a record cut
+short by a crash is ignored when reading. Reading maps the file, so
+multi-hour logs are iterated without loading them.
+
+Record a session by setting HIME_RECORD to a file path:
+
+    HIME_RECORD=session.himerec python lmstudio_integration.py
+"""
+
+import atexit
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Iterator, NamedTuple, Optional
+
+MAGIC = b"HIMEREC\x01"
+LENGTH = struct.Struct("<I")
+FIELDS = struct.Struct("<BHIQd")
+
+SESSION = 0
+COMMAND = 1
+REPLY = 2
+
+# Buffered bytes before a write reaches the file
+WRITE_BUFFER = 1 << 16
+
+
+class Record(NamedTuple):
+    kind: int
+    connection: int
+    id: int
+    t_ns: int
+    display_ms: float
+    payload: bytes
+
+
+class SessionRecorder:
+    """Appends commands and replies to a session log"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab", buffering=WRITE_BUFFER)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            with open(path, "rb") as existing:
+                if existing.read(len(MAGIC)) != MAGIC:
+                    self._file.close()
+                    raise ValueError(f"{path} is not a session log")
+        self._start_ns = time.monotonic_ns()
+        self._connections = itertools.count()
+        self.records = 0
+        self._append(SESSION, 0, 0, 0.0, json.dumps({"started": time.time(), "pid": os.getpid()}))
+
+    def register(self) -> int:
+        """Number a new connection recording into this log"""
+        return next(self._connections)
+
+    def command(self, connection: int, command_id: int, display_ms: float, payload: str):
+        self._append(COMMAND, connection, command_id, display_ms, payload)
+
+    def reply(self, connection: int, command_id: int, display_ms: float, payload):
+        self._append(REPLY, connection, command_id, display_ms, payload)
+
+    def _append(self, kind: int, connection: int, command_id: int, display_ms: float, payload):
+        if self._file is None:
+            return
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        # Ids past 32 bits wrap; replies are matched within a connection's recent commands anyway
+        header = FIELDS.pack(kind, connection, command_id & 0xFFFFFFFF,
+                             time.monotonic_ns() - self._start_ns, display_ms)
+        self._file.write(LENGTH.pack(len(header) + len(data)) + header + data)
+        self.records += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SessionLog:
+    """Memory-mapped reader of a session log"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size < len(MAGIC):
+            self._file.close()
+            raise ValueError(f"{path} is not a session log")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a session log")
+
+    def __iter__(self) -> Iterator[Record]:
+        data, size = self._map, self.size
+        offset = len(MAGIC)
+        while offset + LENGTH.size <= size:
+            (length,) = LENGTH.unpack_from(data, offset)
+            start = offset + LENGTH.size
+            end = start + length
+            if length < FIELDS.size or end > size:
+                # Cut short by a crash while recording
+                return
+            kind, connection, command_id, t_ns, display_ms = FIELDS.unpack_from(data, start)
+            yield Record(kind, connection, command_id, t_ns, display_ms, data[start + FIELDS.size:end])
+            offset = end
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Recorder used by connections that aren't given one (set by start_recording)
+RECORDER: Optional[SessionRecorder] = None
+
+
+def start_recording(path: str) -> SessionRecorder:
+    """Record every connection in this process to `path`"""
+    global RECORDER
+    stop_recording()
+    RECORDER = SessionRecorder(path)
+    atexit.register(stop_recording)
+    return RECORDER
+
+
+def stop_recording():
+    global RECORDER
+    if RECORDER is not None:
+        RECORDER.close()
+        RECORDER = None
+
+
+def recorder_from_env() -> Optional[SessionRecorder]:
+    """Start recording to HIME_RECORD, if set"""
+    path = os.environ.get("HIME_RECORD")
+    if not path:
+        return None
+    try:
+        recorder = start_recording(path)
+    except (OSError, ValueError) as e:
+        print(f"[Recorder] Could not record to {path}: {e}", file=sys.stderr)
+        return None
+    print(f"[Recorder] Recording commands to {path}", file=sys.stderr)
+    return recorder
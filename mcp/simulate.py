@@ -0,0 +1,179 @@
+"""
+Run the animation controllers on virtual time against the mock display
+
+Idle loops, speech and the demo scripts run on a VirtualClock (see
+virtual_clock.py), so an hour of behavior takes seconds. With the same
+--seed, every run sends the same commands at the same virtual times: the
+report ends with a digest of the command trace, and --trace writes it
+out as JSON lines to diff against another run.
+
+Scenarios:
+    bridge    auto_animation_bridge's test_bridge, then idle behaviors
+    adaptive  adaptive_animation's test_adaptive_bridge, then idle behaviors
+    chat      the auto-animation bridge answering a reply every 5-30 s
+
+Usage:
+    python simulate.py --scenario chat --duration 3600 --seed 7
+    python simulate.py --scenario bridge --duration 600 --trace bridge.jsonl --memory
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import time
+import tracemalloc
+from collections import Counter
+from typing import List, Optional, TextIO
+
+import virtual_clock
+from mock_display import MockApiServer
+from virtual_clock import VirtualClock
+
+# Replies the chat scenario picks from
+REPLIES = [
+    "Hi! I'm doing great! How can I help you today?",
+    "Why did the AI go to therapy? Because it had too many issues to process! Haha!",
+    "Aww, I'm sorry! Let me try a better one next time.",
+    "That's easy! 2+2 equals 4. Did you want me to explain?",
+    "Wow, thank you so much!!! That makes me so happy!",
+    "Hmm, I'm not sure about that... let me think.",
+    "No way! That's amazing!!!",
+]
+
+# Virtual seconds between moving the mock's command log into the trace
+DRAIN_INTERVAL = 10.0
+
+
+class Trace:
+    """Digest (and optionally a JSON-lines file) of the commands the mock handled"""
+
+    def __init__(self, out: Optional[TextIO] = None):
+        self.out = out
+        self.digest = hashlib.sha256()
+        self.actions: Counter = Counter()
+        # Traced heap bytes at each drain, with --memory
+        self.heap: List[int] = []
+
+    def drain(self, mock: MockApiServer):
+        commands, mock.commands = mock.commands, []
+        for t, message in commands:
+            line = json.dumps({"t": round(t, 6), "action": message.get("action"), "data": message.get("data")},
+                              sort_keys=True)
+            self.digest.update(line.encode("utf-8"))
+            self.actions[message.get("action")] += 1
+            if self.out is not None:
+                self.out.write(line + "\n")
+        if tracemalloc.is_tracing():
+            self.heap.append(tracemalloc.get_traced_memory()[0])
+
+    @property
+    def total(self) -> int:
+        return sum(self.actions.values())
+
+
+async def chat(url: str, clock: VirtualClock):
+    from auto_animation_bridge import HimeDisplayBridge
+
+    bridge = HimeDisplayBridge(url, clock)
+    if not await bridge.initialize():
+        return
+    try:
+        while True:
+            await clock.sleep(random.uniform(5, 30))
+            await bridge.on_ai_response(random.choice(REPLIES))
+    finally:
+        await bridge.shutdown()
+
+
+async def bridge_demo(url: str, clock: VirtualClock):
+    from auto_animation_bridge import test_bridge
+    await test_bridge(url, clock)
+
+
+async def adaptive_demo(url: str, clock: VirtualClock):
+    from adaptive_animation import test_adaptive_bridge
+    await test_adaptive_bridge(url, clock)
+
+
+SCENARIOS = {"bridge": bridge_demo, "adaptive": adaptive_demo, "chat": chat}
+
+
+async def simulate(scenario: str, duration: float, seed: int, trace: Trace, port: int = 8795,
+                   latency_ms: float = 0.0, jitter_ms: float = 0.0, drop_rate: float = 0.0) -> float:
+    """Run a scenario for `duration` virtual seconds; returns the virtual time reached"""
+    clock = virtual_clock.CLOCK
+    random.seed(seed)
+    mock = MockApiServer(port, None, latency_ms, jitter_ms, drop_rate, seed)
+    await mock.start()
+
+    async def drain():
+        while True:
+            await clock.sleep(DRAIN_INTERVAL)
+            trace.drain(mock)
+
+    drainer = asyncio.create_task(drain())
+    try:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(SCENARIOS[scenario](mock.ws_url, clock), duration)
+    finally:
+        drainer.cancel()
+        await mock.stop()
+        trace.drain(mock)
+    return clock.monotonic()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chat")
+    parser.add_argument("--duration", type=float, default=3600.0, help="virtual seconds to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", help="write the command trace here as JSON lines")
+    parser.add_argument("--memory", action="store_true", help="trace Python allocations (slower)")
+    parser.add_argument("--port", type=int, default=8795, help="mock WebSocket port")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock reply delay in virtual ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mock ± jitter in virtual ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="mock drop rate")
+    parser.add_argument("--settle", type=float, default=virtual_clock.SETTLE_SECONDS * 1000,
+                        help="real ms to wait for loopback I/O before skipping ahead")
+    parser.add_argument("--verbose", action="store_true", help="show the controllers' own output")
+    args = parser.parse_args()
+
+    out = open(args.trace, "w", encoding="utf-8") if args.trace else None
+    trace = Trace(out)
+    if args.memory:
+        tracemalloc.start()
+    print(f"→ Simulating {args.scenario} for {args.duration:g}s of virtual time (seed {args.seed})")
+    started = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            reached = virtual_clock.run(simulate(args.scenario, args.duration, args.seed, trace, args.port,
+                                                 args.latency, args.jitter, args.drop),
+                                        settle=args.settle / 1000)
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"✓ {reached:.0f}s virtual in {elapsed:.2f}s real ({reached / max(elapsed, 1e-9):.0f}×)")
+    print(f"  {trace.total} commands, {trace.total / max(reached, 1e-9):.2f}/s virtual, "
+          f"{trace.total / max(elapsed, 1e-9):.0f}/s real")
+    for action, count in trace.actions.most_common():
+        print(f"  {action:>20} {count:>8}")
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if len(trace.heap) > 1:
+            # From the first drain on, so startup allocations don't count as growth
+            print(f"  Python heap: {trace.heap[0] / 2**20:.1f} MiB after {DRAIN_INTERVAL:g}s, "
+                  f"{trace.heap[-2] / 2**20:.1f} MiB before shutdown, {peak / 2**20:.1f} MiB peak")
+    print(f"  Trace digest: {trace.digest.hexdigest()[:16]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Sentence-chunked speech pipeline
+
+Turns the LLM token stream into speech and animation one sentence at a
+time instead of waiting for the whole response:
+
+    tokens -> sentence segmenter -> planner -> speech/animation executor
+
+The planner picks an emotion and a viseme mouth track for every sentence
+(classified off the event loop) and starts text-to-speech for it; the executor plays sentences in order,
+lip-syncing the mouth while the TTS stage plays the audio. Stages are
+connected by bounded queues, so the first sentence is already being
+spoken while later ones are still generating, and a slow stage pushes
+back on the one before it instead of buffering without limit.
+
+Each sentence may be traced (see tracing) from its first token through
+planning and the commands it sends; the trace travels with the sentence
+through the queues.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Callable, List, Optional
+
+import tracing
+from event_log import event
+from tracing import TRACER, Trace, Tracer
+from viseme_track import SpeechTrack, viseme_track
+
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+SENTENCE_END = re.compile(r"[.!?…。！？]+[\"')\]」』]*\s+|\n+")
+# Short words that end in a period without ending the sentence
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e."}
+
+# Sentences shorter than this aren't lip-synced
+MIN_SENTENCE_SECONDS = 0.3
+
+LOG_PLAN_ERROR = event("speech", "plan_error", logging.WARNING, "⚠ Could not plan sentence: {error}", per_second=1)
+LOG_ANIMATE_ERROR = event("speech", "animate_error", logging.WARNING, "⚠ Could not animate sentence: {error}", per_second=1)
+
+
+class SentenceSegmenter:
+    """Accumulates tokens and splits off complete sentences"""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return the sentences it completed"""
+        self._buffer += token
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            words = candidate.split()
+            if words and words[-1].lower() in ABBREVIATIONS:
+                continue
+            if candidate:
+                sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    @property
+    def pending(self) -> bool:
+        """Whether part of the next sentence has arrived"""
+        return bool(self._buffer.strip())
+
+    def flush(self) -> Optional[str]:
+        """Return whatever is left at the end of a response"""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+
+class TTSStage:
+    """Text-to-speech interface used by the pipeline"""
+
+    async def synthesize(self, text: str) -> Any:
+        """Prepare audio for a sentence; runs ahead of playback"""
+        return None
+
+    def duration(self, audio: Any) -> Optional[float]:
+        """Length of synthesized audio in seconds, None if unknown"""
+        return None
+
+    async def play(self, audio: Any):
+        """Play synthesized audio; runs alongside the mouth animation"""
+
+
+class StubTTS(TTSStage):
+    """Local stand-in for a TTS engine: no audio, only synthesis latency"""
+
+    def __init__(self, synthesis_delay: float = 0.05):
+        self.synthesis_delay = synthesis_delay
+
+    async def synthesize(self, text: str) -> Any:
+        await asyncio.sleep(self.synthesis_delay)
+        return None
+
+
+class SentencePlan:
+    """What to do for one sentence: emotion, mouth track and audio"""
+
+    def __init__(self, text: str, emotion: str, track: SpeechTrack, excited: bool, audio: Any = None,
+                 trace: Optional[Trace] = None):
+        self.text = text
+        self.emotion = emotion
+        self.track = track
+        self.excited = excited
+        self.audio = audio
+        self.trace = trace
+        # When the plan was queued for the executor (µs, for the trace)
+        self.queued_us = 0.0
+
+    @property
+    def duration(self) -> float:
+        return self.track.duration
+
+
+class SentencePipeline:
+    """Runs segmenter, planner and executor stages for a chat bridge"""
+
+    def __init__(self, bridge, tts: Optional[TTSStage] = None,
+                 max_sentences: int = 8, max_plans: int = 2, tracer: Tracer = TRACER):
+        self.bridge = bridge
+        self.tts = tts or StubTTS()
+        self.segmenter = SentenceSegmenter()
+        self.sentences: asyncio.Queue = asyncio.Queue(maxsize=max_sentences)
+        self.plans: asyncio.Queue = asyncio.Queue(maxsize=max_plans)
+        self.current_emotion: Optional[str] = None
+        self.tracer = tracer
+        # Trace of the sentence whose tokens are arriving; None when unsampled
+        self._trace: Optional[Trace] = None
+        self._trace_started = False
+        # Sentences queued but not yet spoken (or dropped)
+        self._pending = 0
+        self._tasks: List[asyncio.Task] = []
+        # Called as each sentence starts animating
+        self.on_animate: Optional[Callable[[], None]] = None
+
+    def start(self):
+        """Start the planner and executor stages"""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._plan_loop()),
+                asyncio.create_task(self._execute_loop()),
+            ]
+
+    async def feed(self, token: str):
+        """Segmenter stage: hand completed sentences to the planner"""
+        # A sentence's trace starts with its first token
+        self._start_trace()
+        for sentence in self.segmenter.feed(token):
+            await self._queue_sentence(sentence)
+            if self.segmenter.pending:
+                # The same token already began the next sentence
+                self._start_trace()
+
+    async def end_turn(self):
+        """Flush the last, unterminated sentence of a response"""
+        rest = self.segmenter.flush()
+        if rest:
+            await self._queue_sentence(rest)
+        self._trace_started = False
+
+    def _start_trace(self):
+        if not self._trace_started:
+            self._trace_started = True
+            self._trace = self.tracer.start("token received")
+
+    async def _queue_sentence(self, sentence: str):
+        trace, self._trace, self._trace_started = self._trace, None, False
+        self._pending += 1
+        await self.sentences.put((sentence, trace, tracing.now_us()))
+
+    @property
+    def busy(self) -> bool:
+        """Whether any sentence is still waiting to be or being spoken"""
+        return self._pending > 0
+
+    async def drain(self):
+        """Wait until everything queued so far has been spoken"""
+        await self.sentences.join()
+        await self.plans.join()
+
+    async def stop(self):
+        """Cancel the stages, dropping anything not yet spoken"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def interrupt(self):
+        """Barge-in: drop everything unspoken, stop the current sentence, close the mouth"""
+        await self.stop()
+        self.segmenter.flush()
+        for queue in (self.sentences, self.plans):
+            while not queue.empty():
+                queue.get_nowait()
+                queue.task_done()
+        self._pending = 0
+        self._trace, self._trace_started = None, False
+        self.start()
+        await self.bridge.controller.stop_speaking()
+
+    def plan(self, sentence: str, emotion: str, audio: Any = None,
+             trace: Optional[Trace] = None) -> SentencePlan:
+        """Mouth track and excitement for one sentence"""
+        track = viseme_track(sentence)
+        duration = self.tts.duration(audio)
+        if duration is not None:
+            # Real audio length wins; keep the visemes, stretch the timing
+            track = track.scaled(duration)
+        return SentencePlan(
+            text=sentence,
+            emotion=emotion,
+            track=track,
+            excited=sentence.count("!") >= 2,
+            audio=audio,
+            trace=trace,
+        )
+
+    @staticmethod
+    async def _traced(name: str, coroutine):
+        with tracing.span(name):
+            return await coroutine
+
+    async def _plan_loop(self):
+        while True:
+            sentence, trace, queued_us = await self.sentences.get()
+            try:
+                with tracing.activate(trace):
+                    if trace is not None:
+                        trace.span("sentence queued", queued_us, tracing.now_us())
+                    # Synthesis of this sentence overlaps playback of the previous one
+                    audio, emotion = await asyncio.gather(
+                        self._traced("tts", self.tts.synthesize(sentence)),
+                        self._traced("emotion decided", self.bridge.classify_emotion(sentence)),
+                    )
+                    plan = self.plan(sentence, emotion, audio, trace)
+                    plan.queued_us = tracing.now_us()
+                await self.plans.put(plan)
+            except Exception as e:
+                LOG_PLAN_ERROR(error=e)
+                self._pending -= 1
+            finally:
+                self.sentences.task_done()
+
+    async def _execute_loop(self):
+        controller = self.bridge.controller
+        while True:
+            plan = await self.plans.get()
+            try:
+                with tracing.activate(plan.trace):
+                    if plan.trace is not None:
+                        plan.trace.span("command queued", plan.queued_us, tracing.now_us(),
+                                        text=plan.text[:80], emotion=plan.emotion)
+                    if self.on_animate is not None:
+                        self.on_animate()
+                    await self._execute(plan, controller)
+            except Exception as e:
+                LOG_ANIMATE_ERROR(error=e)
+            finally:
+                self._pending = max(self._pending - 1, 0)
+                self.plans.task_done()
+
+    async def _execute(self, plan: SentencePlan, controller):
+        with tracing.span("animate"):
+            if plan.emotion != self.current_emotion:
+                await controller.set_emotion_adaptive(plan.emotion)
+                self.current_emotion = plan.emotion
+            if plan.excited:
+                await controller.play_animation_adaptive(plan.emotion)
+            if plan.duration >= MIN_SENTENCE_SECONDS:
+                await asyncio.gather(
+                    controller.speak_track_adaptive(plan.track),
+                    self.tts.play(plan.audio),
+                )
@@ -0,0 +1,122 @@
+"""
+Incremental SSE parser for OpenAI-style streaming chat completions
+
+Works directly on the raw byte chunks from the HTTP response instead of
+decoding, stripping and `json.loads`-ing every line. Bytes are buffered in
+a single bytearray, lines are located with `find` and inspected through
+memoryview slices, and only the `delta.content` string is pulled out of
+each event. Lines split across chunk boundaries stay buffered until their
+newline arrives, so nothing is dropped.
+
+Events that don't fit the fast path (escaped characters, unusual layouts)
+fall back to a regular `json.loads` of that one line.
+"""
+
+import json
+from typing import List, Optional
+
+
+DATA_PREFIX = b"data:"
+DONE = b"[DONE]"
+DELTA_KEY = b'"delta"'
+CONTENT_KEY = b'"content"'
+QUOTE = 0x22      # "
+BACKSLASH = 0x5c  # \
+WHITESPACE = b" \t"
+
+
+class SSEDeltaParser:
+    """Turns raw `text/event-stream` bytes into delta content strings"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """Consume a chunk and return the content of every complete event in it"""
+        tokens: List[str] = []
+        if self.done:
+            return tokens
+
+        buffer = self._buffer
+        buffer += chunk
+        start = 0
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(b"\n", start)
+                if end < 0:
+                    break
+                line_end = end - 1 if end > start and buffer[end - 1] == 0x0d else end
+                content = self._parse_line(buffer, view, start, line_end)
+                start = end + 1
+                if content is None:
+                    continue
+                if content is DONE:
+                    self.done = True
+                    break
+                tokens.append(content)
+        # Drop consumed bytes once per chunk rather than once per line
+        del buffer[:start]
+        return tokens
+
+    def _parse_line(self, buffer: bytearray, view: memoryview, start: int, end: int):
+        if not buffer.startswith(DATA_PREFIX, start, end):
+            # Comments (": keep-alive"), blank separators and other fields
+            return None
+        start += len(DATA_PREFIX)
+        if start < end and buffer[start] == 0x20:
+            start += 1
+        if end - start == len(DONE) and buffer.startswith(DONE, start, end):
+            return DONE
+        return self._extract_content(buffer, view, start, end)
+
+    def _extract_content(self, buffer: bytearray, view: memoryview, start: int, end: int) -> Optional[str]:
+        delta = buffer.find(DELTA_KEY, start, end)
+        if delta < 0:
+            return None
+        key = buffer.find(CONTENT_KEY, delta, end)
+        if key < 0:
+            return None
+        # Only one "content" key may follow, otherwise the layout is unexpected
+        if buffer.find(CONTENT_KEY, key + len(CONTENT_KEY), end) >= 0:
+            return self._fallback(view, start, end)
+
+        pos = key + len(CONTENT_KEY)
+        while pos < end and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos >= end or buffer[pos] != 0x3a:  # :
+            return self._fallback(view, start, end)
+        pos += 1
+        while pos < end and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos >= end or buffer[pos] != QUOTE:
+            # null or missing content (e.g. the role-only first chunk)
+            return None
+
+        close = buffer.find(b'"', pos + 1, end)
+        if close < 0:
+            return self._fallback(view, start, end)
+        if buffer.find(b"\\", pos + 1, close) >= 0:
+            # Escapes need real JSON string decoding; do it for this string only
+            return self._decode_escaped(view, pos, end) or None
+        return str(view[pos + 1:close], "utf-8") or None
+
+    def _decode_escaped(self, view: memoryview, pos: int, end: int) -> str:
+        close = pos + 1
+        while close < end:
+            byte = view[close]
+            if byte == BACKSLASH:
+                close += 2
+                continue
+            if byte == QUOTE:
+                break
+            close += 1
+        return json.loads(view[pos:close + 1].tobytes())
+
+    def _fallback(self, view: memoryview, start: int, end: int) -> Optional[str]:
+        try:
+            data = json.loads(view[start:end].tobytes())
+            choices = data.get("choices") or [{}]
+            return (choices[0].get("delta") or {}).get("content") or None
+        except (json.JSONDecodeError, AttributeError, IndexError):
+            return None
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import virtual_clock
+from auto_animation_bridge import EMOTIONS, AnimationController
+from hime_client import split_expression
+from mock_display import MockApiServer
+from motion_baker import BakedMotionCache
+from viseme_track import viseme_track
+
+REPLY = "Wow, thank you so much!!! That makes me so happy!"
+OTHER_REPLY = "Wow, that was so much fun!!! You make me so happy!"
+
+
+def actions(mock: MockApiServer):
+    return [message["action"] for _, message in mock.commands]
+
+
+def test_ai_response_bakes_then_plays_one_motion(tmp_path):
+    async def scenario():
+        mock = MockApiServer(0, None)
+        await mock.start()
+        controller = AnimationController(mock.ws_url)
+        controller.baked_motions = BakedMotionCache(str(tmp_path))
+        try:
+            await controller.connect()
+            await controller.process_ai_response(REPLY)
+            streamed = actions(mock)
+            baked = sorted(os.listdir(tmp_path))
+            mock.commands.clear()
+            await controller.process_ai_response(REPLY)
+            replayed = list(mock.commands)
+            mock.commands.clear()
+            await controller.process_ai_response(OTHER_REPLY)
+            return streamed, baked, replayed, actions(mock)
+        finally:
+            await controller.close()
+            await mock.stop()
+
+    streamed, baked, replayed, other = virtual_clock.run(scenario())
+
+    # First response: the reaction animation, then emotion and lip-sync streamed frame by frame and baked
+    assert streamed[0] == "playRandomMotion"
+    assert streamed.count("setParameters") > 5
+    assert "playMotion" not in streamed
+    assert len(baked) == 2 and baked[0].endswith(".motion3.json") and baked[1].endswith(".vmd")
+
+    # Same words again: the reaction animation plus one playMotion that also
+    # carries the emotion switch, nothing else
+    assert [message["action"] for _, message in replayed] == ["playRandomMotion", "playMotion"]
+    data = replayed[1][1]["data"]
+    motion = data["motion"]
+    # Keyframes were timed on the virtual clock: the motion spans the speech, not the (near-zero) wall time
+    assert motion["Meta"]["Duration"] == pytest.approx(viseme_track(REPLY).duration, abs=0.05)
+    assert motion["Meta"]["CurveCount"] == len(motion["Curves"]) > 0
+    # The text's own lip-sync, not a generic pattern
+    mouth = next(curve["Segments"] for curve in motion["Curves"] if curve["Id"] == "ParamMouthOpenY")
+    assert {round(value, 2) for value in mouth[1::3]} == {
+        round(mouth_open * 0.7, 2) for _, mouth_open, _ in viseme_track(REPLY).keyframes
+    }
+    # What set_emotion would leave behind
+    emotion = data["file"].split("-")[0]
+    held, _ = split_expression(EMOTIONS[emotion])
+    assert data["hold"] == held
+    assert "ParamMouthForm" not in data["release"]
+
+    # Different words get their own motion
+    assert "playMotion" not in other
+    assert len(os.listdir(tmp_path)) == 4
+
+
+def test_reaction_streams_without_cache():
+    async def scenario():
+        mock = MockApiServer(0, None)
+        await mock.start()
+        controller = AnimationController(mock.ws_url)
+        try:
+            await controller.connect()
+            await controller.process_ai_response(REPLY)
+            return actions(mock)
+        finally:
+            await controller.close()
+            await mock.stop()
+
+    streamed = virtual_clock.run(scenario())
+    assert "playMotion" not in streamed
+    assert "setParameters" in streamed
@@ -0,0 +1,22 @@
+import asyncio
+
+import virtual_clock
+from chat_ingestion import ChatIngestion, ChatMessage
+
+
+def test_every_drop_is_counted_by_reason():
+    async def scenario():
+        inbox = ChatIngestion(llm_rate=None, max_age=60)
+        for text in ("hello!", "Hello!!", "what's up?", "nice stream"):
+            inbox.offer(ChatMessage(text))
+        await asyncio.sleep(61)
+        inbox.offer(ChatMessage("still there?"))
+        answered = await inbox.get()
+        inbox.offer(ChatMessage("bye"))
+        inbox.close(discard=True)
+        return inbox, answered
+
+    inbox, answered = virtual_clock.run(scenario())
+    assert answered.text == "still there?"
+    assert inbox.drops() == {"duplicate": 1, "expired": 3, "discarded": 1}
+    assert inbox.stats["received"] == inbox.stats["answered"] + sum(inbox.drops().values())
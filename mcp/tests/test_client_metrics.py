@@ -0,0 +1,30 @@
+import re
+
+from client_metrics import EXPORT_BUCKETS, MAX_SECONDS, ClientMetrics, LatencyHistogram
+
+BUCKET = re.compile(r'hime_client_ack_latency_seconds_bucket\{action="ping",le="([^"]+)"\} (\d+)')
+COUNT = re.compile(r'hime_client_ack_latency_seconds_count\{action="ping"\} (\d+)')
+
+
+def test_exported_buckets_cover_every_sample():
+    metrics = ClientMetrics()
+    for seconds in (0, 0.0003, 0.004, 0.2, 4.99, 7.5, 9.99, 10.0, 45, 299, 1000):
+        metrics.command_sent(10)
+        metrics.command_done("ping", "ack", seconds)
+    text = metrics.prometheus_text()
+
+    buckets = [(le, int(count)) for le, count in BUCKET.findall(text)]
+    count = int(COUNT.search(text).group(1))
+    assert count == 11
+    assert [le for le, _ in buckets] == [str(bound) for bound in EXPORT_BUCKETS] + ["+Inf"]
+    counts = [n for _, n in buckets]
+    assert counts == sorted(counts)
+    assert counts[-1] == count
+    assert counts[-2] == count  # le=MAX_SECONDS: nothing only in +Inf
+
+
+def test_long_durations_are_recorded_as_the_maximum():
+    histogram = LatencyHistogram()
+    histogram.record(3600)
+    assert histogram.max_us == MAX_SECONDS * 1_000_000
+    assert histogram.cumulative()[-1] == (MAX_SECONDS, 1)
@@ -0,0 +1,51 @@
+import virtual_clock
+from client_metrics import ClientMetrics
+from hime_client import HimeDisplayConnection
+from mock_display import MockApiServer
+
+
+class IdlessServer(MockApiServer):
+    """A display from before acks echoed command ids"""
+
+    def _replies(self, raw):
+        replies = super()._replies(raw)
+        for reply in replies:
+            reply.pop("id", None)
+        return replies
+
+
+def run_commands(mock: MockApiServer):
+    async def scenario():
+        await mock.start()
+        display = HimeDisplayConnection(mock.ws_url, telemetry=ClientMetrics())
+        try:
+            await display.connect()
+            for value in (0.1, 0.2, 0.3):
+                await display.send_command("setParameter", {"parameterId": "ParamAngleX", "value": value})
+            return display.telemetry
+        finally:
+            await display.close()
+            await mock.stop()
+
+    return virtual_clock.run(scenario())
+
+
+def test_acks_are_counted_by_id():
+    assert run_commands(MockApiServer(0, None)).commands == {("setParameter", "ack"): 3}
+
+
+def test_acks_without_ids_are_counted_in_send_order():
+    assert run_commands(IdlessServer(0, None)).commands == {("setParameter", "ack"): 3}
+
+
+class ErrorBroadcastServer(MockApiServer):
+    """A display that also reports an error no command caused"""
+
+    def _replies(self, raw):
+        return [{"type": "error", "message": "Renderer error"}] + super()._replies(raw)
+
+
+def test_idless_errors_dont_fail_pending_commands():
+    telemetry = run_commands(ErrorBroadcastServer(0, None))
+    assert telemetry.commands == {("setParameter", "ack"): 3}
+    assert telemetry.unmatched_errors == 3
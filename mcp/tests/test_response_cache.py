@@ -0,0 +1,34 @@
+from response_cache import ResponseCache
+
+CATS = [{"role": "user", "content": "tell me about cats"}, {"role": "assistant", "content": "Meow!"}]
+DOGS = [{"role": "user", "content": "tell me about dogs"}, {"role": "assistant", "content": "Woof!"}]
+
+
+def test_entries_expire_after_ttl():
+    now = [1000.0]
+    cache = ResponseCache(ttl=60, clock=lambda: now[0])
+    cache.put("hi", "persona", "Hello!")
+    now[0] += 59
+    assert cache.get("hi", "persona") == "Hello!"
+    now[0] += 2
+    assert cache.get("hi", "persona") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entries_are_not_loaded(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(ttl=60, path=path, clock=lambda: now[0])
+    cache.put("hi", "persona", "Hello!")
+    cache.save()
+    assert ResponseCache(ttl=60, path=path, clock=lambda: now[0]).get("hi", "persona") == "Hello!"
+    now[0] += 61
+    assert ResponseCache(ttl=60, path=path, clock=lambda: now[0]).get("hi", "persona") is None
+
+
+def test_follow_ups_are_keyed_on_recent_turns():
+    cache = ResponseCache()
+    cache.put("why?", "persona", "Because cats.", CATS)
+    assert cache.get("why?", "persona", CATS) == "Because cats."
+    assert cache.get("why?", "persona", DOGS) is None
+    assert cache.get("why?", "persona") is None
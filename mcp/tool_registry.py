@@ -0,0 +1,178 @@
+"""
+Table-driven MCP tool registry
+
+Tools are declared once with a decorator: name, description, input schema,
+the animation channels they touch and an async handler. The registry
+builds the `Tool` list a single time, validates arguments with checks
+compiled from the schemas at registration, and dispatches calls through
+a dict lookup.
+"""
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Union
+from mcp.types import Tool, TextContent, EmbeddedResource
+from event_log import event
+from hime_client import ChannelDispatcher
+
+try:
+    import jsonschema
+except ImportError:  # older mcp releases don't depend on jsonschema
+    jsonschema = None
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[str]]
+Channels = Union[Iterable[str], Callable[[Dict[str, Any]], Iterable[str]]]
+Validator = Callable[[Dict[str, Any]], Optional[str]]
+
+LOG_TOOL_CALL = event("tools", "call", logging.INFO, "→ Tool {tool}: {outcome} ({ms:.1f} ms)", per_second=5)
+
+# JSON schema types understood by the fast validator
+SIMPLE_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+}
+SIMPLE_KEYWORDS = {"type", "enum", "minimum", "maximum", "description", "default"}
+
+
+def compile_schema(schema: dict) -> Validator:
+    """
+    Turn a tool input schema into a plain Python check.
+
+    Flat object schemas (typed properties with enum/minimum/maximum and a
+    required list) are compiled into a list of small checks. Anything more
+    elaborate falls back to a precompiled jsonschema validator.
+    """
+    properties = schema.get("properties", {})
+    simple = (
+        set(schema) <= {"type", "properties", "required"}
+        and all(set(prop) <= SIMPLE_KEYWORDS and prop.get("type") in SIMPLE_TYPES
+                for prop in properties.values())
+    )
+    if not simple:
+        if jsonschema is None:
+            required = schema.get("required", [])
+            return lambda arguments: next(
+                (f"'{key}' is a required property" for key in required if key not in arguments), None)
+        validator = jsonschema.validators.validator_for(schema)(schema)
+
+        def validate_with_jsonschema(arguments):
+            error = jsonschema.exceptions.best_match(validator.iter_errors(arguments))
+            return error.message if error is not None else None
+        return validate_with_jsonschema
+
+    required = tuple(schema.get("required", []))
+    checks = []
+    for key, prop in properties.items():
+        types = SIMPLE_TYPES[prop["type"]]
+        enum = frozenset(prop["enum"]) if "enum" in prop else None
+        checks.append((key, prop["type"], types, enum, prop.get("minimum"), prop.get("maximum")))
+
+    def validate(arguments):
+        for key in required:
+            if key not in arguments:
+                return f"'{key}' is a required property"
+        for key, type_name, types, enum, minimum, maximum in checks:
+            if key not in arguments:
+                continue
+            value = arguments[key]
+            # bool is an int subclass, but not a JSON number
+            if not isinstance(value, types) or (isinstance(value, bool) and type_name != "boolean"):
+                return f"'{key}' must be of type {type_name}"
+            if enum is not None and value not in enum:
+                return f"'{key}' must be one of {sorted(enum)}"
+            if minimum is not None and value < minimum:
+                return f"'{key}' must be >= {minimum}"
+            if maximum is not None and value > maximum:
+                return f"'{key}' must be <= {maximum}"
+        return None
+    return validate
+
+
+class ToolSpec:
+    """A registered tool: schema, channels and handler"""
+
+    def __init__(self, name: str, description: str, input_schema: dict,
+                 handler: Handler, channels: Channels = ()):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.channels = channels if callable(channels) else tuple(channels)
+        # Compiled once here instead of walking the schema on every call
+        self.validate = compile_schema(input_schema)
+
+    def channels_for(self, arguments: Dict[str, Any]) -> Iterable[str]:
+        """Animation channels this call touches"""
+        return self.channels(arguments) if callable(self.channels) else self.channels
+
+
+class ToolRegistry:
+    """Declares MCP tools once and dispatches calls to them"""
+
+    def __init__(self, dispatcher: Optional[ChannelDispatcher] = None):
+        self.tools: Dict[str, ToolSpec] = {}
+        self.dispatcher = dispatcher or ChannelDispatcher()
+        self._tool_list: Optional[List[Tool]] = None
+
+    def tool(self, name: str, description: str, input_schema: dict, channels: Channels = ()):
+        """Decorator registering an async handler that returns the reply text"""
+        def decorator(handler: Handler) -> Handler:
+            self.tools[name] = ToolSpec(name, description, input_schema, handler, channels)
+            self._tool_list = None
+            return handler
+        return decorator
+
+    def list_tools(self) -> List[Tool]:
+        """Tool definitions, built once and reused for every list request"""
+        if self._tool_list is None:
+            self._tool_list = [
+                Tool(name=spec.name, description=spec.description, inputSchema=spec.input_schema)
+                for spec in self.tools.values()
+            ]
+        return self._tool_list
+
+    async def call(self, name: str, arguments: Any) -> Sequence[TextContent | EmbeddedResource]:
+        """Validate and run a tool call once its animation channels are free"""
+        started = time.perf_counter()
+
+        def reply(text: str, outcome: str) -> List[TextContent]:
+            LOG_TOOL_CALL(tool=name, outcome=outcome, ms=(time.perf_counter() - started) * 1000)
+            return [TextContent(type="text", text=text)]
+
+        spec = self.tools.get(name)
+        if spec is None:
+            return reply(f"✗ Unknown tool: {name}", "unknown")
+
+        arguments = arguments or {}
+        error = spec.validate(arguments)
+        if error is not None:
+            return reply(f"✗ Invalid arguments for {name}: {error}", "invalid")
+
+        try:
+            async with self.dispatcher.hold(spec.channels_for(arguments)):
+                text = await spec.handler(arguments)
+            return reply(text, "ok")
+        except ConnectionError as e:
+            return reply(f"✗ Connection error: {str(e)}. Make sure Hime Display is running with API enabled.",
+                         "disconnected")
+        except Exception as e:
+            return reply(f"✗ Error executing {name}: {str(e)}", "error")
+
+    def attach(self, app):
+        """Register list_tools/call_tool handlers on an MCP server"""
+        @app.list_tools()
+        async def list_tools() -> list[Tool]:
+            return self.list_tools()
+
+        try:
+            # Arguments are already validated against the precompiled schemas
+            call_tool_decorator = app.call_tool(validate_input=False)
+        except TypeError:
+            call_tool_decorator = app.call_tool()
+
+        @call_tool_decorator
+        async def call_tool(name: str, arguments: Any) -> Sequence[TextContent | EmbeddedResource]:
+            return await self.call(name, arguments)
@@ -0,0 +1,183 @@
+"""
+End-to-end traces from an LLM token to the face changing on screen
+
+A trace follows one sentence: its first token arriving, the emotion and
+mouth track being planned, its commands waiting in the pipeline and
+going over the WebSocket, and, on the display side, the API server
+parsing each command, CommandHandler sending it over IPC and the
+renderer applying it on a frame. The trace id travels in each command's
+metadata (`"trace": {"id": ...}`); the display stamps its own times on it
+and broadcasts them back in a "trace" message once the command has been
+applied.
+
+Traces are sampled when they start (`sample_rate`), so tracing can stay
+on during streams; untraced commands carry nothing extra. Events are
+kept in a bounded buffer and export as Chrome trace-event JSON, which
+chrome://tracing and https://ui.perfetto.dev open directly.
+
+The current trace is a context variable: code running for a sentence
+(including tasks it starts) sees it without passing it around.
+"""
+
+import contextlib
+import contextvars
+import itertools
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Chrome trace "processes": the Python side and the display
+BRIDGE_PID = 1
+DISPLAY_PID = 2
+
+_current: contextvars.ContextVar = contextvars.ContextVar("hime_trace", default=None)
+
+
+def now_us() -> float:
+    """Wall clock in microseconds, the same base as display timestamps"""
+    return time.time() * 1_000_000
+
+
+class Trace:
+    """One sampled sentence; its events share a row in the trace viewer"""
+
+    def __init__(self, tracer: "Tracer", trace_id: str, row: int, start_us: float):
+        self.tracer = tracer
+        self.id = trace_id
+        self.row = row
+        self.start_us = start_us
+        # Time of the first command applied by the display
+        self.applied_us: Optional[float] = None
+
+    def span(self, name: str, start_us: float, end_us: float, pid: int = BRIDGE_PID, **args):
+        self.tracer.record({
+            "name": name, "ph": "X", "ts": start_us, "dur": max(end_us - start_us, 0.0),
+            "pid": pid, "tid": self.row, "args": {"trace": self.id, **args},
+        })
+
+    def instant(self, name: str, ts_us: Optional[float] = None, pid: int = BRIDGE_PID, **args):
+        self.tracer.record({
+            "name": name, "ph": "i", "s": "t", "ts": now_us() if ts_us is None else ts_us,
+            "pid": pid, "tid": self.row, "args": {"trace": self.id, **args},
+        })
+
+
+class Tracer:
+    """Samples traces and buffers their events for export"""
+
+    def __init__(self, sample_rate: float = 0.0, max_events: int = 100_000,
+                 max_traces: int = 1000, seed: Optional[int] = None):
+        self.sample_rate = sample_rate
+        self.rng = random.Random(seed)
+        self.events: Deque[dict] = deque(maxlen=max_events)
+        # Recent traces by id, for matching the display's reports
+        self.traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self.max_traces = max_traces
+        # Token-to-applied latency of each trace, in ms
+        self.end_to_end_ms: Deque[float] = deque(maxlen=max_traces)
+        self._prefix = f"{self.rng.getrandbits(32):08x}"
+        self._rows = itertools.count(1)
+
+    def start(self, name: str, **args) -> Optional[Trace]:
+        """Begin a trace now if it is sampled; returns None otherwise"""
+        if self.sample_rate <= 0 or self.rng.random() >= self.sample_rate:
+            return None
+        row = next(self._rows)
+        trace = Trace(self, f"{self._prefix}-{row}", row, now_us())
+        self.traces[trace.id] = trace
+        if len(self.traces) > self.max_traces:
+            self.traces.popitem(last=False)
+        trace.instant(name, trace.start_us, **args)
+        return trace
+
+    def record(self, event: dict):
+        self.events.append(event)
+
+    def display_report(self, message: dict, clock_offset_ms: float):
+        """
+        Turn a display "trace" broadcast into spans.
+
+        Each entry carries display-clock times (ms) for one IPC message of a
+        traced command: receivedAt (ApiServer), ipcAt (CommandHandler),
+        displayAt (renderer), dispatchedAt (scheduler) and appliedAt (frame).
+        """
+        for report in message.get("traces") or []:
+            trace = self.traces.get(report.get("id"))
+            if trace is None:
+                continue
+
+            def local(key):
+                value = report.get(key)
+                return None if value is None else (value - clock_offset_ms) * 1000
+
+            stamps = [local(key) for key in ("receivedAt", "ipcAt", "displayAt", "dispatchedAt", "appliedAt")]
+            if any(stamp is None for stamp in stamps):
+                continue
+            received, ipc, shown, dispatched, applied = stamps
+            channel = report.get("channel", "")
+            trace.span("server handle", received, ipc, DISPLAY_PID, channel=channel)
+            trace.span("ipc", ipc, shown, DISPLAY_PID, channel=channel)
+            if dispatched > shown:
+                trace.span("scheduled", shown, dispatched, DISPLAY_PID, channel=channel)
+            trace.span("apply", dispatched, applied, DISPLAY_PID, channel=channel)
+            if trace.applied_us is None:
+                trace.applied_us = applied
+                trace.span("token → face", trace.start_us, applied)
+                self.end_to_end_ms.append((applied - trace.start_us) / 1000)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Token-to-applied latency percentiles over the recent traces"""
+        ordered = sorted(self.end_to_end_ms)
+        if not ordered:
+            return {"traces": 0, "p50_ms": None, "p99_ms": None}
+        return {
+            "traces": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2],
+            "p99_ms": ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)],
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        metadata: List[dict] = [
+            {"name": "process_name", "ph": "M", "pid": BRIDGE_PID, "args": {"name": "Python bridge"}},
+            {"name": "process_name", "ph": "M", "pid": DISPLAY_PID, "args": {"name": "Hime Display"}},
+        ]
+        return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        """Write the buffered events as a Chrome trace-event JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+# Shared tracer; sampling is off until sample_rate is set
+TRACER = Tracer()
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(trace: Optional[Trace]):
+    """Make `trace` the current trace for the enclosed code"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, **args):
+    """Time the enclosed code as a span of the current trace (no-op when untraced)"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = now_us()
+    try:
+        yield
+    finally:
+        trace.span(name, start, now_us(), **args)
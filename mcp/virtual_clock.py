@@ -0,0 +1,149 @@
+"""
+Injectable clock for the animation controllers, with a virtual-time mode
+
+The controllers, speech loops and frame pacing read time and sleep
+through a `Clock` (the module-level CLOCK unless given one). The default
+is real time. A VirtualClock only moves when every task is waiting:
+`run()` executes a coroutine on a VirtualEventLoop, whose timers run on
+the virtual clock and which skips straight to the next timer instead of
+sleeping. An hour of idle behavior against the in-process mock display
+then takes seconds, and with seeded randomness the command stream is the
+same on every run (see simulate.py).
+
+Sockets are still real: the loop only skips ahead when no socket is
+readable (optionally after a short real wait for loopback traffic in
+flight), and never while executor jobs such as DNS lookups are running.
+"""
+
+import asyncio
+import selectors
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Real seconds to wait for in-flight loopback I/O before skipping ahead. Loopback
+# sends are delivered before send() returns on Linux; raise this where they aren't
+SETTLE_SECONDS = 0.0
+# Wall-clock time a virtual clock starts at (2025-01-01 UTC), so traces don't depend on today's date
+EPOCH = 1_735_689_600.0
+
+
+class Clock:
+    """Real time, as the controllers read it and sleep by"""
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def time(self) -> float:
+        return time.time()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """Time that only advances when the VirtualEventLoop skips ahead"""
+
+    def __init__(self, epoch: float = EPOCH):
+        self.epoch = epoch
+        self.elapsed = 0.0
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def time(self) -> float:
+        return self.epoch + self.elapsed
+
+    def advance(self, seconds: float):
+        self.elapsed += seconds
+
+    # sleep() is asyncio.sleep: on a VirtualEventLoop its timer is virtual
+
+
+class _SkippingSelector(selectors.DefaultSelector):
+    """Selector that advances the virtual clock instead of waiting out a timeout"""
+
+    def __init__(self, clock: VirtualClock, settle: float):
+        super().__init__()
+        self.clock = clock
+        self.settle = settle
+        # Executor jobs in flight (set by the loop): wait for them in real time
+        self.busy = 0
+
+    def select(self, timeout: Optional[float] = None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if self.busy or timeout is None:
+            # Nothing to skip to, or a thread will wake the loop when done
+            return super().select(timeout)
+        if self.settle:
+            events = super().select(min(timeout, self.settle))
+        if not events:
+            self.clock.advance(timeout)
+        return events
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time() is a VirtualClock that jumps to the next timer when idle"""
+
+    def __init__(self, clock: VirtualClock, settle: float = SETTLE_SECONDS):
+        self.clock = clock
+        self._skipping = _SkippingSelector(clock, settle)
+        super().__init__(self._skipping)
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._skipping.busy += 1
+
+        def done(_):
+            self._skipping.busy -= 1
+
+        future.add_done_callback(done)
+        return future
+
+
+# Clock used by controllers and connections that aren't given one
+CLOCK: Clock = Clock()
+
+
+def use_clock(clock: Clock) -> Clock:
+    """Make `clock` the default; returns the previous one"""
+    global CLOCK
+    previous, CLOCK = CLOCK, clock
+    return previous
+
+
+def run(main: Awaitable[T], clock: Optional[VirtualClock] = None, settle: float = SETTLE_SECONDS) -> T:
+    """Like asyncio.run, on virtual time; CLOCK is the virtual clock while it runs"""
+    clock = clock or VirtualClock()
+    previous = use_clock(clock)
+    try:
+        if hasattr(asyncio, "Runner"):
+            with asyncio.Runner(loop_factory=lambda: VirtualEventLoop(clock, settle)) as runner:
+                return runner.run(main)
+        return _run_on(VirtualEventLoop(clock, settle), main)
+    finally:
+        use_clock(previous)
+
+
+def _run_on(loop: asyncio.AbstractEventLoop, main: Awaitable[T]) -> T:
+    """asyncio.Runner's job on Python 3.10: run, then cancel leftover tasks and close"""
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,264 @@
+"""
+Text-to-viseme speech tracks
+
+Turns a sentence into a timed mouth track in one call: every character
+is looked up in precomputed tables, mapped to a viseme class (open vowel,
+wide vowel, rounded vowel, closed lips, consonant, pause) and each class
+to a `ParamMouthOpenY` / `ParamMouthForm` pose with a duration.
+Punctuation becomes a closed-mouth pause of matching length, so timing
+follows the text instead of `words * 0.15`. Latin letters, Japanese kana
+and CJK/Hangul syllables are covered; anything else is treated as a
+short consonant.
+
+Tracks are cached per sentence; playing one is just sending its
+keyframes on schedule, with no per-frame decisions left in Python. On a
+clock-synced `HimeDisplayConnection` the whole track is sent at once with
+display timestamps and the display applies each keyframe on its frame.
+"""
+
+import asyncio
+import unicodedata
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import virtual_clock
+from virtual_clock import Clock
+
+
+# Viseme class -> (ParamMouthOpenY, ParamMouthForm offset)
+VISEME_POSES = {
+    "A": (1.0, 0.0),    # open: a
+    "I": (0.35, 0.8),   # wide: i
+    "U": (0.3, -0.8),   # rounded: u, w
+    "E": (0.55, 0.5),   # mid wide: e
+    "O": (0.7, -0.6),   # mid rounded: o
+    "M": (0.0, 0.0),    # closed lips: m, b, p, ん
+    "C": (0.2, 0.0),    # other consonants
+    "_": (0.0, 0.0),    # pause
+}
+
+# Seconds per character of each class
+VISEME_SECONDS = {"A": 0.08, "I": 0.07, "U": 0.07, "E": 0.075, "O": 0.08, "M": 0.06, "C": 0.045}
+# A kana or CJK/Hangul character is a whole syllable (mora)
+SYLLABLE_SECONDS = 0.12
+
+# Closed-mouth pauses at punctuation and between words
+PAUSE_SECONDS = {
+    " ": 0.03, ",": 0.18, "、": 0.18, ";": 0.22, ":": 0.22, "-": 0.15, "—": 0.2,
+    ".": 0.35, "。": 0.35, "!": 0.35, "！": 0.35, "?": 0.35, "？": 0.35,
+    "…": 0.45, "\n": 0.35,
+}
+
+# Longest track played for one sentence
+MAX_TRACK_SECONDS = 12.0
+
+Keyframe = Tuple[float, float, float]  # (start time, mouth open, mouth form)
+
+
+def _kana_table() -> Dict[str, str]:
+    """Hiragana and katakana -> vowel class of their mora"""
+    rows = {
+        "A": "あかさたなはまやらわがざだばぱぁゃゎ",
+        "I": "いきしちにひみりぎじぢびぴぃ",
+        "U": "うくすつぬふむゆるぐずづぶぷぅゅ",
+        "E": "えけせてねへめれげぜでべぺぇ",
+        "O": "おこそとのほもよろをごぞどぼぽぉょ",
+        "M": "ん",
+    }
+    table = {}
+    for viseme, hiragana in rows.items():
+        for char in hiragana:
+            table[char] = viseme
+            table[chr(ord(char) + 0x60)] = viseme  # katakana is offset by 0x60
+    return table
+
+
+def _latin_table() -> Dict[str, str]:
+    """Latin letters (including accented ones) -> viseme class"""
+    table = {}
+    for code in range(0x41, 0x250):
+        char = chr(code)
+        if not char.isalpha():
+            continue
+        base = unicodedata.normalize("NFD", char)[0].lower()
+        if base in "a":
+            table[char] = "A"
+        elif base in "iy":
+            table[char] = "I"
+        elif base in "uw":
+            table[char] = "U"
+        elif base in "e":
+            table[char] = "E"
+        elif base in "o":
+            table[char] = "O"
+        elif base in "mbp":
+            table[char] = "M"
+        else:
+            table[char] = "C"
+    return table
+
+
+LATIN_VISEMES = _latin_table()
+KANA_VISEMES = _kana_table()
+# CJK ideographs and Hangul syllables get a deterministic spread of vowels
+SYLLABLE_VOWELS = "AIUEO"
+
+
+def classify_char(char: str) -> Tuple[str, float]:
+    """(viseme class, seconds) for one character"""
+    if char in PAUSE_SECONDS:
+        return "_", PAUSE_SECONDS[char]
+    viseme = LATIN_VISEMES.get(char)
+    if viseme is not None:
+        return viseme, VISEME_SECONDS[viseme]
+    viseme = KANA_VISEMES.get(char)
+    if viseme is not None:
+        return viseme, SYLLABLE_SECONDS
+    code = ord(char)
+    if 0x4E00 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7A3:
+        return SYLLABLE_VOWELS[code % len(SYLLABLE_VOWELS)], SYLLABLE_SECONDS
+    if char.isspace():
+        return "_", PAUSE_SECONDS[" "]
+    if char.isalnum():
+        return "C", VISEME_SECONDS["C"]
+    # Other symbols (quotes, brackets, emoji) aren't spoken
+    return "", 0.0
+
+
+class SpeechTrack:
+    """Timed mouth keyframes for one piece of text"""
+
+    def __init__(self, keyframes: Tuple[Keyframe, ...], duration: float):
+        self.keyframes = keyframes
+        self.duration = duration
+
+    def scaled(self, duration: float) -> "SpeechTrack":
+        """The same track stretched to a known length (e.g. real TTS audio)"""
+        if self.duration <= 0:
+            return self
+        factor = duration / self.duration
+        return SpeechTrack(
+            tuple((start * factor, mouth_open, form) for start, mouth_open, form in self.keyframes),
+            duration,
+        )
+
+
+@lru_cache(maxsize=512)
+def viseme_track(text: str) -> SpeechTrack:
+    """Build (and cache) the mouth track for a sentence"""
+    keyframes = []
+    t = 0.0
+    previous = None
+    for char in text:
+        if char == "ー" and previous:
+            # Long vowel mark: hold the previous mora
+            t += SYLLABLE_SECONDS
+            continue
+        viseme, seconds = classify_char(char)
+        if not viseme:
+            continue
+        # Runs of the same class merge into one keyframe
+        if viseme != previous:
+            mouth_open, form = VISEME_POSES[viseme]
+            keyframes.append((t, mouth_open, form))
+            previous = viseme
+        t += seconds
+        if t >= MAX_TRACK_SECONDS:
+            break
+    # End closed
+    if keyframes and previous != "_":
+        keyframes.append((t, 0.0, 0.0))
+    return SpeechTrack(tuple(keyframes), min(t, MAX_TRACK_SECONDS))
+
+
+def track_commands(track: SpeechTrack, intensity: float = 0.7,
+                   base_form: Optional[float] = None, shape: bool = True,
+                   ttl_ms: int = 300) -> List[Tuple[float, str, dict]]:
+    """(seconds from start, action, data) for every command that plays a track"""
+    form_base = base_form or 0.0
+    commands = []
+    for at, mouth_open, form in track.keyframes:
+        parameters = [{"parameterId": "ParamMouthOpenY", "value": mouth_open * intensity}]
+        if shape:
+            parameters.append({
+                "parameterId": "ParamMouthForm",
+                "value": max(-1.0, min(1.0, form_base + form * 0.5)),
+            })
+        commands.append((at, "setParameters", {"hold": True, "ttl": ttl_ms, "parameters": parameters}))
+    return commands
+
+
+def _release_commands(base_form: Optional[float], shape: bool) -> List[Tuple[str, dict]]:
+    """Hand the mouth back after speaking, restoring the emotion's form"""
+    released = ["ParamMouthOpenY"]
+    if shape and base_form is None:
+        released.append("ParamMouthForm")
+    commands = [("releaseParameters", {"parameterIds": released})]
+    if shape and base_form is not None:
+        commands.append(("setParameter", {
+            "parameterId": "ParamMouthForm", "value": base_form, "hold": True
+        }))
+    return commands
+
+
+async def play_track(send_command: Callable[[str, dict], Awaitable],
+                     track: SpeechTrack, intensity: float = 0.7,
+                     base_form: Optional[float] = None, shape: bool = True,
+                     ttl_ms: int = 300, clock: Optional[Clock] = None):
+    """
+    Send a track's keyframes on schedule as held mouth parameters.
+
+    With `shape`, mouth form is an offset on top of `base_form` (the
+    emotion's held ParamMouthForm), which is restored afterwards; without
+    one both parameters are released back to the model. Without `shape`
+    only ParamMouthOpenY is animated.
+    """
+    clock = clock or virtual_clock.CLOCK
+    commands = track_commands(track, intensity, base_form, shape, ttl_ms)
+    start = clock.monotonic()
+    try:
+        for index, (at, action, data) in enumerate(commands):
+            delay = start + at - clock.monotonic()
+            if delay > 0:
+                await clock.sleep(delay)
+            elif index + 1 < len(commands) and start + commands[index + 1][0] <= clock.monotonic():
+                # Running behind (slow acks): skip poses that are already over
+                continue
+            await send_command(action, data)
+        remaining = start + track.duration - clock.monotonic()
+        if remaining > 0:
+            await clock.sleep(remaining)
+    finally:
+        for action, data in _release_commands(base_form, shape):
+            await send_command(action, data)
+
+
+async def schedule_track(display, track: SpeechTrack, intensity: float = 0.7,
+                         base_form: Optional[float] = None, shape: bool = True,
+                         ttl_ms: int = 300, lead_ms: float = 100.0, group: str = "speech"):
+    """
+    Play a track on a clock-synced HimeDisplayConnection.
+
+    Every keyframe (and the final release) is sent up front with its
+    display time, `lead_ms` ahead, so network and event-loop jitter no
+    longer reach the screen. Cancelling drops whatever is still queued
+    on the display and releases the mouth immediately.
+    """
+    if not display.clock.synced:
+        await display.sync()
+    start = display.clock.now() + lead_ms
+    commands = [(start + at * 1000, action, data)
+                for at, action, data in track_commands(track, intensity, base_form, shape, ttl_ms)]
+    end = start + track.duration * 1000
+    commands += [(end, action, data) for action, data in _release_commands(base_form, shape)]
+    try:
+        await asyncio.gather(*(
+            display.send_command(action, data, at=at, group=group) for at, action, data in commands
+        ))
+        remaining = (end - display.clock.now()) / 1000
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+    except asyncio.CancelledError:
+        await display.send_command("clearSchedule", {"group": group})
+        for action, data in _release_commands(base_form, shape):
+            await display.send_command(action, data)
+        raise
@@ -102,7 +102,7 @@ export class Application extends EventEmitter {
     };
 
     this.apiServer = new ApiServer(apiConfig);
-    this.commandHandler = new CommandHandler(this);
+    this.commandHandler = new CommandHandler(this, this.apiServer.metrics);
 
     // Handle incoming API commands
     this.apiServer.on("api-command", (command) => {
@@ -203,6 +203,10 @@ export class Application extends EventEmitter {
     ipcMain.on("display2main:set-ignore-mouse-events", (event, ...args) => {
       this.windowManager.windows.display.setIgnoreMouseEvents(...args);
     });
+    // Timestamps of traced API commands, reported back to the API clients once applied
+    ipcMain.on("display2main:traces", (event, traces) => {
+      this.apiServer?.broadcast({ type: "trace", traces, timestamp: Date.now() });
+    });
     ipcMain.on("control2main:change-language", (event, language) => {
       console.log("[Hime Display] change language to", language);
       i18next.changeLanguage(language);
@@ -0,0 +1,184 @@
+/**
+ * Counters and timing histograms for the API server
+ * Cheap enough to update on every message; rendered as Prometheus text
+ * for GET /metrics so load tests and dashboards can see server-side
+ * saturation directly.
+ */
+
+// Upper bounds (ms) of the command handling histogram buckets
+const DURATION_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250];
+// Time constant (ms) of the per-client message rate average
+const RATE_WINDOW_MS = 10000;
+
+function escapeLabel(value) {
+  return String(value).replace(/\\/g, "\\\\").replace(/"/g, '\\"').replace(/\n/g, "\\n");
+}
+
+class DurationHistogram {
+  constructor() {
+    this.buckets = new Array(DURATION_BUCKETS_MS.length).fill(0);
+    this.count = 0;
+    this.sum = 0;
+  }
+  record(ms) {
+    this.count++;
+    this.sum += ms;
+    for (let i = 0; i < DURATION_BUCKETS_MS.length; i++) {
+      if (ms <= DURATION_BUCKETS_MS[i]) {
+        this.buckets[i]++;
+        return;
+      }
+    }
+  }
+}
+
+export class ApiMetrics {
+  constructor() {
+    this.startedAt = Date.now();
+    // Messages by transport ("ws"/"http"), before any validation
+    this.messages = { ws: 0, http: 0 };
+    this.bytesReceived = 0;
+    this.parseErrors = 0;
+    // Well-formed JSON that failed validation (no action, bad at)
+    this.invalidMessages = 0;
+    this.unknownActions = 0;
+    this.pings = 0;
+    // action -> { success, failure, histogram } (histogram of CommandHandler.handle time)
+    this.actions = new Map();
+    // IPC channel -> messages sent to the display window
+    this.ipcMessages = new Map();
+    this.ipcFailures = 0;
+    this.broadcasts = 0;
+    // client id -> { messages, bytes, rate (messages/s, moving average), updatedAt }
+    this.clients = new Map();
+    this.connections = 0;
+  }
+
+  /**
+   * A WebSocket client connected; its series live until it disconnects
+   */
+  clientConnected(clientId) {
+    this.connections++;
+    this.clients.set(clientId, { messages: 0, bytes: 0, rate: 0, updatedAt: Date.now() });
+  }
+
+  clientDisconnected(clientId) {
+    this.clients.delete(clientId);
+  }
+
+  /**
+   * Count a raw incoming message
+   * @param {string} transport - "ws" or "http"
+   * @param {number} bytes - Message size
+   * @param {string|null} clientId - WebSocket client, null for HTTP
+   */
+  messageReceived(transport, bytes, clientId = null) {
+    this.messages[transport]++;
+    this.bytesReceived += bytes;
+    const client = clientId === null ? undefined : this.clients.get(clientId);
+    if (client) {
+      const now = Date.now();
+      client.rate = this.decayedRate(client, now) + 1000 / RATE_WINDOW_MS;
+      client.updatedAt = now;
+      client.messages++;
+      client.bytes += bytes;
+    }
+  }
+
+  decayedRate(client, now) {
+    return client.rate * Math.exp(-(now - client.updatedAt) / RATE_WINDOW_MS);
+  }
+
+  /**
+   * Record one handled command
+   * @param {string} action - A known action (unknown ones go to unknownActions)
+   * @param {boolean} success - Whether the handler returned success
+   * @param {number} ms - Time spent in CommandHandler.handle
+   */
+  commandHandled(action, success, ms) {
+    let stats = this.actions.get(action);
+    if (!stats) {
+      stats = { success: 0, failure: 0, histogram: new DurationHistogram() };
+      this.actions.set(action, stats);
+    }
+    if (success) {
+      stats.success++;
+    } else {
+      stats.failure++;
+    }
+    stats.histogram.record(ms);
+  }
+
+  ipcSent(channel) {
+    this.ipcMessages.set(channel, (this.ipcMessages.get(channel) || 0) + 1);
+  }
+
+  /**
+   * Render every metric in the Prometheus text exposition format
+   */
+  toPrometheus() {
+    const lines = [];
+    const metric = (name, type, help) => {
+      lines.push(`# HELP hime_api_${name} ${help}`);
+      lines.push(`# TYPE hime_api_${name} ${type}`);
+    };
+    const now = Date.now();
+
+    metric("messages_total", "counter", "Messages received, by transport");
+    for (const [transport, count] of Object.entries(this.messages)) {
+      lines.push(`hime_api_messages_total{transport="${transport}"} ${count}`);
+    }
+
+    metric("commands_total", "counter", "Commands handled, by action and outcome");
+    for (const [action, stats] of this.actions) {
+      for (const outcome of ["success", "failure"]) {
+        lines.push(`hime_api_commands_total{action="${escapeLabel(action)}",outcome="${outcome}"} ${stats[outcome]}`);
+      }
+    }
+
+    metric("command_duration_seconds", "histogram", "Time spent handling a command");
+    for (const [action, { histogram }] of this.actions) {
+      const label = `action="${escapeLabel(action)}"`;
+      let cumulative = 0;
+      DURATION_BUCKETS_MS.forEach((bound, i) => {
+        cumulative += histogram.buckets[i];
+        lines.push(`hime_api_command_duration_seconds_bucket{${label},le="${bound / 1000}"} ${cumulative}`);
+      });
+      lines.push(`hime_api_command_duration_seconds_bucket{${label},le="+Inf"} ${histogram.count}`);
+      lines.push(`hime_api_command_duration_seconds_sum{${label}} ${histogram.sum / 1000}`);
+      lines.push(`hime_api_command_duration_seconds_count{${label}} ${histogram.count}`);
+    }
+
+    metric("ipc_messages_total", "counter", "Messages sent to the display window, by channel");
+    for (const [channel, count] of this.ipcMessages) {
+      lines.push(`hime_api_ipc_messages_total{channel="${escapeLabel(channel)}"} ${count}`);
+    }
+
+    metric("client_messages_total", "counter", "Messages received from each connected WebSocket client");
+    for (const [clientId, client] of this.clients) {
+      lines.push(`hime_api_client_messages_total{client="${escapeLabel(clientId)}"} ${client.messages}`);
+    }
+    metric("client_message_rate", "gauge", `Messages per second from each connected client, averaged over ${RATE_WINDOW_MS / 1000}s`);
+    for (const [clientId, client] of this.clients) {
+      lines.push(`hime_api_client_message_rate{client="${escapeLabel(clientId)}"} ${this.decayedRate(client, now).toFixed(3)}`);
+    }
+
+    const scalars = [
+      ["bytes_received_total", "counter", "Bytes of messages received", this.bytesReceived],
+      ["parse_errors_total", "counter", "Messages that were not valid JSON", this.parseErrors],
+      ["invalid_messages_total", "counter", "Messages without an action or with a bad at", this.invalidMessages],
+      ["unknown_actions_total", "counter", "Commands with an action CommandHandler does not know", this.unknownActions],
+      ["pings_total", "counter", "Clock sync pings answered", this.pings],
+      ["ipc_failures_total", "counter", "Commands that could not reach the display window", this.ipcFailures],
+      ["broadcasts_total", "counter", "Messages broadcast to all WebSocket clients", this.broadcasts],
+      ["connections_total", "counter", "WebSocket connections accepted", this.connections],
+      ["clients", "gauge", "Connected WebSocket clients", this.clients.size],
+      ["start_time_seconds", "gauge", "Unix time the API server started", this.startedAt / 1000],
+    ];
+    for (const [name, type, help, value] of scalars) {
+      metric(name, type, help);
+      lines.push(`hime_api_${name} ${value}`);
+    }
+    return lines.join("\n") + "\n";
+  }
+}
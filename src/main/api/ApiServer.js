@@ -1,12 +1,18 @@
 import { EventEmitter } from "events";
 import { WebSocketServer } from "ws";
 import http from "http";
-import { logger } from "../core/Logger";
+import { createEventLogger, logger } from "../core/Logger";
+import { ApiMetrics } from "./ApiMetrics";
+
+// Per-message output, sampled and rate limited (see createEventLogger)
+const logMessage = createEventLogger("[API Server]");
+const logRejected = createEventLogger("[API Server]", { level: "warn", perSecond: 1 });
 
 /**
  * API Server for external control of Live2D models
  * Supports both WebSocket and HTTP REST API
  * Perfect for AI integration (like Neuro-sama style projects)
+ * Traffic and command stats are served as Prometheus text at GET /metrics
  */
 export class ApiServer extends EventEmitter {
   constructor(config = {}) {
@@ -21,6 +27,7 @@ export class ApiServer extends EventEmitter {
     this.wsServer = null;
     this.httpServer = null;
     this.clients = new Set();
+    this.metrics = new ApiMetrics();
   }
 
   /**
@@ -55,8 +62,10 @@ export class ApiServer extends EventEmitter {
 
     this.wsServer.on("connection", (ws, req) => {
       const clientIp = req.socket.remoteAddress;
+      const clientId = `${clientIp}:${req.socket.remotePort}`;
       logger.info(`[API Server] WebSocket client connected from ${clientIp}`);
       this.clients.add(ws);
+      this.metrics.clientConnected(clientId);
 
       // Send welcome message
       ws.send(JSON.stringify({
@@ -67,21 +76,26 @@ export class ApiServer extends EventEmitter {
       }));
 
       ws.on("message", (data) => {
+        this.metrics.messageReceived("ws", data.length, clientId);
+        let message;
         try {
-          const message = JSON.parse(data.toString());
-          this.handleMessage(message, ws);
+          message = JSON.parse(data.toString());
         } catch (error) {
-          logger.error("[API Server] Failed to parse message:", error);
+          this.metrics.parseErrors++;
+          logRejected("invalid JSON", () => [clientId, error.message]);
           ws.send(JSON.stringify({
             type: "error",
             message: "Invalid JSON format",
             error: error.message,
           }));
+          return;
         }
+        this.handleMessage(message, ws);
       });
 
       ws.on("close", () => {
         this.clients.delete(ws);
+        this.metrics.clientDisconnected(clientId);
         logger.info(`[API Server] WebSocket client disconnected from ${clientIp}`);
       });
 
@@ -119,6 +133,7 @@ export class ApiServer extends EventEmitter {
         });
 
         req.on("end", () => {
+          this.metrics.messageReceived("http", Buffer.byteLength(body));
           try {
             const message = JSON.parse(body);
             this.handleMessage(message);
@@ -129,6 +144,9 @@ export class ApiServer extends EventEmitter {
               timestamp: Date.now(),
             }));
           } catch (error) {
+            if (error instanceof SyntaxError) {
+              this.metrics.parseErrors++;
+            }
             logger.error("[API Server] HTTP request error:", error);
             res.writeHead(400, { "Content-Type": "application/json" });
             res.end(JSON.stringify({
@@ -143,6 +161,9 @@ export class ApiServer extends EventEmitter {
           status: "ok",
           timestamp: Date.now(),
         }));
+      } else if (req.method === "GET" && req.url === "/metrics") {
+        res.writeHead(200, { "Content-Type": "text/plain; version=0.0.4" });
+        res.end(this.metrics.toPrometheus());
       } else {
         res.writeHead(404, { "Content-Type": "application/json" });
         res.end(JSON.stringify({
@@ -165,28 +186,56 @@ export class ApiServer extends EventEmitter {
 
   /**
    * Handle incoming messages from WebSocket or HTTP
+   * Messages may carry `at` (display clock, ms since epoch) to be applied on
+   * the first frame at or after that time. Acks report when the message was
+   * received and answered, so clients can synchronize their clock NTP-style;
+   * the "ping" action does nothing but produce such an ack.
+   * Traced messages carry `trace: { id }`; the receive time is stamped on it
+   * and travels with the command to the renderer (see CommandScheduler).
    */
   handleMessage(message, ws = null) {
-    logger.info("[API Server] Received message:", message);
+    const receivedAt = Date.now();
+    logMessage("received", () => [message]);
 
     // Validate message structure
-    if (!message.action) {
-      const error = "Message must contain an 'action' field";
-      logger.warn("[API Server]", error);
+    let error = null;
+    if (!message || !message.action) {
+      error = "Message must contain an 'action' field";
+    } else if (message.at !== undefined && !Number.isFinite(message.at)) {
+      error = "'at' must be a timestamp in milliseconds";
+    }
+    if (error) {
+      this.metrics.invalidMessages++;
+      logRejected("invalid message", () => [error]);
       if (ws) {
-        ws.send(JSON.stringify({ type: "error", message: error }));
+        ws.send(JSON.stringify({ type: "error", id: message?.id, message: error }));
       }
       return;
     }
 
+    if (message.trace !== undefined) {
+      if (message.trace !== null && typeof message.trace === "object") {
+        message.trace.receivedAt = receivedAt;
+      } else {
+        delete message.trace;
+      }
+    }
+
     // Emit the message for the Application to handle
-    this.emit("api-command", message);
+    if (message.action !== "ping") {
+      this.emit("api-command", message);
+    } else {
+      this.metrics.pings++;
+    }
 
     // Send acknowledgment if WebSocket
+    // The optional command id is echoed so pipelining clients can match acks
     if (ws) {
       ws.send(JSON.stringify({
         type: "ack",
+        id: message.id,
         action: message.action,
+        receivedAt,
         timestamp: Date.now(),
       }));
     }
@@ -196,6 +245,7 @@ export class ApiServer extends EventEmitter {
    * Broadcast message to all connected WebSocket clients
    */
   broadcast(message) {
+    this.metrics.broadcasts++;
     const data = JSON.stringify(message);
     this.clients.forEach((client) => {
       if (client.readyState === 1) { // WebSocket.OPEN
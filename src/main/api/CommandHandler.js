@@ -1,4 +1,10 @@
-import { logger } from "../core/Logger";
+import { createEventLogger } from "../core/Logger";
+
+const UNKNOWN_ACTION = "Unknown action";
+
+// Per-command output, sampled and rate limited (see createEventLogger)
+const logCommand = createEventLogger("[Command Handler]");
+const logFailure = createEventLogger("[Command Handler]", { level: "warn", perSecond: 1 });
 
 /**
  * Command Handler for API Server
@@ -6,110 +12,151 @@ import { logger } from "../core/Logger";
  * for controlling Live2D models
  */
 export class CommandHandler {
-  constructor(application) {
+  constructor(application, metrics = null) {
     this.application = application;
+    // Optional ApiMetrics shared with the ApiServer
+    this.metrics = metrics;
+    // Display time and schedule group of the command being handled, see sendToDisplay
+    this.schedule = null;
+    // Trace of the command being handled ({ id, receivedAt }), forwarded with its IPC messages
+    this.trace = null;
   }
 
   /**
    * Handle incoming API commands
-   * @param {Object} command - Command object with action and data
+   * @param {Object} command - Command object with action and data, optionally
+   *   at (display time in ms to apply it at), group (name for clearSchedule)
+   *   and trace ({ id }, for end-to-end tracing)
    */
   handle(command) {
-    const { action, data } = command;
+    const { action, data, at, group, trace } = command;
 
-    logger.info(`[Command Handler] Processing action: ${action}`);
+    logCommand("processing", () => [action]);
 
+    const started = performance.now();
+    this.schedule = at === undefined ? null : { at, group: group ?? null };
+    this.trace = trace ?? null;
+    let result;
     try {
-      switch (action) {
-        // Model parameter control
-        case "setParameter":
-          return this.setParameter(data);
+      result = this.dispatch(action, data);
+    } catch (error) {
+      logFailure("error", () => [action, error]);
+      result = { success: false, error: error.message };
+    } finally {
+      this.schedule = null;
+      this.trace = null;
+    }
+    if (this.metrics) {
+      if (result.error === UNKNOWN_ACTION) {
+        this.metrics.unknownActions++;
+      } else {
+        this.metrics.commandHandled(action, result.success !== false, performance.now() - started);
+      }
+    }
+    return result;
+  }
 
-        case "setParameters":
-          return this.setParameters(data);
+  /**
+   * Run the handler method for an action
+   * @param {string} action - Command action
+   * @param {Object} data - Command data
+   */
+  dispatch(action, data) {
+    switch (action) {
+      // Model parameter control
+      case "setParameter":
+        return this.setParameter(data);
 
-        // Model animation control
-        case "playMotion":
-          return this.playMotion(data);
+      case "setParameters":
+        return this.setParameters(data);
 
-        case "playRandomMotion":
-          return this.playRandomMotion(data);
+      case "releaseParameters":
+        return this.releaseParameters(data);
 
-        case "stopMotion":
-          return this.stopMotion();
+      // Scheduled command control
+      case "clearSchedule":
+        return this.clearSchedule(data);
 
-        // Model expression/pose
-        case "setExpression":
-          return this.setExpression(data);
+      // Model animation control
+      case "playMotion":
+        return this.playMotion(data);
 
-        // Model parts control
-        case "setPart":
-          return this.setPart(data);
+      case "playRandomMotion":
+        return this.playRandomMotion(data);
 
-        case "setParts":
-          return this.setParts(data);
+      case "stopMotion":
+        return this.stopMotion();
 
-        // Eye and breathing control
-        case "setAutoBreath":
-          return this.setAutoBreath(data);
+      // Model expression/pose
+      case "setExpression":
+        return this.setExpression(data);
 
-        case "setAutoEyeBlink":
-          return this.setAutoEyeBlink(data);
+      // Model parts control
+      case "setPart":
+        return this.setPart(data);
 
-        case "setTrackMouse":
-          return this.setTrackMouse(data);
+      case "setParts":
+        return this.setParts(data);
 
-        // Focus control
-        case "setFocus":
-          return this.setFocus(data);
+      // Eye and breathing control
+      case "setAutoBreath":
+        return this.setAutoBreath(data);
 
-        // Model loading
-        case "loadModel":
-          return this.loadModel(data);
+      case "setAutoEyeBlink":
+        return this.setAutoEyeBlink(data);
 
-        // Window control
-        case "showDisplay":
-          return this.showDisplay();
+      case "setTrackMouse":
+        return this.setTrackMouse(data);
 
-        case "hideDisplay":
-          return this.hideDisplay();
+      // Focus control
+      case "setFocus":
+        return this.setFocus(data);
 
-        // Query model info
-        case "getModelInfo":
-          return this.getModelInfo();
+      // Model loading
+      case "loadModel":
+        return this.loadModel(data);
 
-        // Source Engine MDL-specific commands
-        case "playSequence":
-          return this.playSequence(data);
+      // Window control
+      case "showDisplay":
+        return this.showDisplay();
 
-        case "stopSequence":
-          return this.stopSequence();
+      case "hideDisplay":
+        return this.hideDisplay();
 
-        case "setBodyGroup":
-          return this.setBodyGroup(data);
+      // Query model info
+      case "getModelInfo":
+        return this.getModelInfo();
 
-        case "setSkin":
-          return this.setSkin(data);
+      // Source Engine MDL-specific commands
+      case "playSequence":
+        return this.playSequence(data);
 
-        case "setSequenceSpeed":
-          return this.setSequenceSpeed(data);
+      case "stopSequence":
+        return this.stopSequence();
 
-        case "setSequenceLoop":
-          return this.setSequenceLoop(data);
+      case "setBodyGroup":
+        return this.setBodyGroup(data);
 
-        default:
-          logger.warn(`[Command Handler] Unknown action: ${action}`);
-          return { success: false, error: "Unknown action" };
-      }
-    } catch (error) {
-      logger.error(`[Command Handler] Error processing ${action}:`, error);
-      return { success: false, error: error.message };
+      case "setSkin":
+        return this.setSkin(data);
+
+      case "setSequenceSpeed":
+        return this.setSequenceSpeed(data);
+
+      case "setSequenceLoop":
+        return this.setSequenceLoop(data);
+
+      default:
+        logFailure("unknown action", () => [action]);
+        return { success: false, error: UNKNOWN_ACTION };
     }
   }
 
   /**
    * Set a single model parameter
-   * @param {Object} data - { parameterId: string, value: number }
+   * With hold, the value is stored on the display and reapplied every frame
+   * after motions, breath and blink have run, until released or expired.
+   * @param {Object} data - { parameterId: string, value: number, hold?: boolean, weight?: number (0-1), ttl?: number (ms) }
    */
   setParameter(data) {
     const { parameterId, value } = data;
@@ -118,40 +165,119 @@ export class CommandHandler {
       throw new Error("parameterId and value are required");
     }
 
-    this.sendToDisplay("control:set-parameter", { parameterId, value });
-    return { success: true, action: "setParameter", parameterId, value };
+    this.sendParameter(data);
+    return { success: true, action: "setParameter", parameterId, value, hold: !!data.hold };
   }
 
   /**
    * Set multiple model parameters at once
-   * @param {Object} data - { parameters: [{ parameterId, value }, ...] }
+   * hold/weight/ttl given next to parameters apply to every entry that doesn't set its own
+   * @param {Object} data - { parameters: [{ parameterId, value, hold?, weight?, ttl? }, ...], hold?, weight?, ttl? }
    */
   setParameters(data) {
-    const { parameters } = data;
+    const { parameters, hold, weight, ttl } = data;
 
     if (!Array.isArray(parameters)) {
       throw new Error("parameters must be an array");
     }
 
-    parameters.forEach(({ parameterId, value }) => {
-      this.sendToDisplay("control:set-parameter", { parameterId, value });
+    parameters.forEach((parameter) => {
+      this.sendParameter({ hold, weight, ttl, ...parameter });
     });
 
     return { success: true, action: "setParameters", count: parameters.length };
   }
 
+  /**
+   * Release held parameters so motions and auto features drive them again
+   * @param {Object} data - { parameterIds?: string[] } (omit to release all)
+   */
+  releaseParameters(data = {}) {
+    const { parameterIds } = data;
+
+    if (parameterIds !== undefined && !Array.isArray(parameterIds)) {
+      throw new Error("parameterIds must be an array");
+    }
+
+    this.sendToDisplay("control:release-parameter", { parameterIds: parameterIds || null });
+    return { success: true, action: "releaseParameters", count: parameterIds ? parameterIds.length : "all" };
+  }
+
+  /**
+   * Drop scheduled commands the display hasn't applied yet
+   * @param {Object} data - { group?: string } (omit to drop every scheduled command)
+   */
+  clearSchedule(data = {}) {
+    const { group } = data;
+    // Always immediate, even if the request itself carries "at"
+    this.schedule = null;
+    this.sendToDisplay("control:clear-schedule", { group: group ?? null });
+    return { success: true, action: "clearSchedule", group: group ?? "all" };
+  }
+
+  /**
+   * Send one parameter to the display, either as a one-shot set or as a held override
+   * @param {Object} data - { parameterId, value, hold?, weight?, ttl? }
+   */
+  sendParameter({ parameterId, value, hold, weight, ttl }) {
+    if (!hold) {
+      this.sendToDisplay("control:set-parameter", { parameterId, value });
+      return;
+    }
+    if (weight !== undefined && (typeof weight !== "number" || weight < 0 || weight > 1)) {
+      throw new Error("weight must be a number between 0 and 1");
+    }
+    if (ttl !== undefined && ttl !== null && (typeof ttl !== "number" || ttl <= 0)) {
+      throw new Error("ttl must be a positive number of milliseconds");
+    }
+    this.sendToDisplay("control:hold-parameter", {
+      parameterId,
+      value,
+      weight: weight === undefined ? 1 : weight,
+      ttl: ttl === undefined ? null : ttl,
+    });
+  }
+
   /**
    * Play a motion animation
-   * @param {Object} data - { group: string, index: number } or { group: string, file: string }
+   * @param {Object} data - { group: string, index: number } or { group: string, file: string },
+   *   { file: string, motion: Object, release?: string[], hold?: Array<{parameterId, value}> } to play
+   *   motion3.json contents sent inline (Live2D, Cubism 3+) on top of the model's own motions: held
+   *   parameters it animates (and those in release) are released when it starts, hold is held once it ends,
+   *   or { motionFilePath: string, loop?: boolean } to play a .vmd/.fbx file (MMD/3D models)
    */
   playMotion(data) {
-    const { group, index, file, File } = data;
+    const { group, index, file, File, motion, release, hold, motionFilePath, loop } = data;
+
+    if (motionFilePath !== undefined) {
+      if (typeof motionFilePath !== "string" || !motionFilePath) {
+        throw new Error("motionFilePath must be a non-empty string");
+      }
+      this.sendToDisplay("control:play-motion", { motionFilePath, animationLoop: !!loop });
+      return { success: true, action: "playMotion", motionFilePath };
+    }
 
-    if (!group) {
+    if (motion !== undefined) {
+      if (!motion || typeof motion !== "object" || !Array.isArray(motion.Curves)) {
+        throw new Error("motion must be motion3.json contents");
+      }
+      if (!file && !File) {
+        throw new Error("file is required to name an inline motion");
+      }
+      if (release !== undefined && !Array.isArray(release)) {
+        throw new Error("release must be an array of parameter ids");
+      }
+      if (hold !== undefined && !Array.isArray(hold)) {
+        throw new Error("hold must be an array of parameters");
+      }
+    } else if (!group) {
       throw new Error("group is required");
     }
 
-    const motionInfo = { group };
+    const motionInfo = {};
+    if (group) {
+      motionInfo.group = group;
+    }
     if (index !== undefined) {
       motionInfo.index = index;
     }
@@ -162,7 +288,10 @@ export class CommandHandler {
       motionInfo.File = File;
     }
 
-    this.sendToDisplay("control:play-motion", { motion: motionInfo });
+    // Inline motion data goes to the display but isn't echoed back
+    this.sendToDisplay("control:play-motion", {
+      motion: motion === undefined ? motionInfo : { ...motionInfo, motion, release, hold },
+    });
     return { success: true, action: "playMotion", motion: motionInfo };
   }
 
@@ -467,17 +596,26 @@ export class CommandHandler {
 
   /**
    * Send message to display window via IPC
+   * Messages of a scheduled command carry its display time; the display
+   * queues them and applies them on the first frame at or after it.
    */
   sendToDisplay(channel, data) {
     const displayWindow = this.application.windowManager.windows.display;
     
     if (!displayWindow) {
+      if (this.metrics) {
+        this.metrics.ipcFailures++;
+      }
       throw new Error("Display window is not open");
     }
+    if (this.metrics) {
+      this.metrics.ipcSent(channel);
+    }
 
-    displayWindow.webContents.send("control2display:send-to-model-manager", {
-      channel,
-      data,
-    });
+    const message = { channel, data, ...this.schedule };
+    if (this.trace) {
+      message.trace = { ...this.trace, channel, ipcAt: Date.now() };
+    }
+    displayWindow.webContents.send("control2display:send-to-model-manager", message);
   }
 }
@@ -1,3 +1,65 @@
 import logger from "electron-log";
+
+// HIME_LOG_LEVEL=debug turns on per-command logging (off by default)
+const level = process.env.HIME_LOG_LEVEL || "info";
+logger.transports.console.level = level;
+logger.transports.file.level = level;
+// Append to the log file in the background instead of blocking the main process
+logger.transports.file.sync = false;
 logger.info("[Hime Display] Logger init");
+
+function levelEnabled(name) {
+  const rank = logger.levels.indexOf(name);
+  return [logger.transports.console.level, logger.transports.file.level].some(
+    (transportLevel) => transportLevel !== false && rank <= logger.levels.indexOf(transportLevel)
+  );
+}
+
+/**
+ * Logger for events that can happen on every command or frame
+ * Disabled levels cost one boolean check (pass a function to build the
+ * arguments lazily). Enabled events are sampled and rate limited per
+ * event name; the next line written notes how many were suppressed.
+ * @param {string} scope - Prefix such as "[API Server]"
+ * @param {Object} options - level ("debug"), sample (fraction kept, 1),
+ *   perSecond (lines per second per event, 10)
+ */
+export function createEventLogger(scope, { level = "debug", sample = 1, perSecond = 10 } = {}) {
+  const enabled = levelEnabled(level);
+  // event -> { tokens, refilledAt, suppressed }
+  const buckets = new Map();
+  const capacity = Math.max(perSecond, 1);
+
+  return function log(event, ...args) {
+    if (!enabled) {
+      return;
+    }
+    let bucket = buckets.get(event);
+    if (!bucket) {
+      bucket = { tokens: capacity, refilledAt: Date.now(), suppressed: 0 };
+      buckets.set(event, bucket);
+    }
+    if (sample < 1 && Math.random() >= sample) {
+      bucket.suppressed++;
+      return;
+    }
+    const now = Date.now();
+    bucket.tokens = Math.min(capacity, bucket.tokens + ((now - bucket.refilledAt) / 1000) * perSecond);
+    bucket.refilledAt = now;
+    if (bucket.tokens < 1) {
+      bucket.suppressed++;
+      return;
+    }
+    bucket.tokens--;
+    if (args.length === 1 && typeof args[0] === "function") {
+      args = args[0]();
+    }
+    if (bucket.suppressed) {
+      args = [...args, `(+${bucket.suppressed} suppressed)`];
+      bucket.suppressed = 0;
+    }
+    logger[level](scope, event, ...args);
+  };
+}
+
 export { logger };
@@ -30,6 +30,9 @@ export function askForMediaAccess() {
 export function setIgnoreMouseEvents(...args) {
   ipcRenderer.send("display2main:set-ignore-mouse-events", ...args);
 }
+export function sendTraces(traces) {
+  ipcRenderer.send("display2main:traces", traces);
+}
 
 export function handleQueryDisplayWindowState(callback) {
   ipcRenderer.on("control2display:query-display-window-state", callback);
@@ -5,6 +5,7 @@ import { SpineManager } from "@display/modelManagers/SpineManager";
 import { SpineManager42 } from "@display/modelManagers/SpineManager42";
 import { SourceEngineManager } from "@display/modelManagers/SourceEngineManager";
 import { RecordManager } from "@display/utils/record/RecordManager";
+import { CommandScheduler } from "@display/utils/CommandScheduler";
 
 export class Application {
   constructor() {
@@ -32,6 +33,16 @@ export class Application {
     };
     this.currentModelInfo = null;
     this.recordManager = new RecordManager(this);
+    // 带at时间戳的API命令先排队，到点的那一帧再交给当前的模型管理器
+    // 带trace的命令在生效的那一帧之后把各环节的时间戳发回主进程
+    this.commandScheduler = new CommandScheduler(
+      (message) => {
+        this.modelManagers.now?.handleMessage(message);
+      },
+      (traces) => {
+        this.nodeAPI.ipc.sendTraces(traces);
+      }
+    );
     this.setBackgroundColor();
     this.initStats();
     this.initModelManagers();
@@ -117,7 +128,14 @@ export class Application {
         `[Hime Display] Receive message from control: ${message.channel}, data:`,
         message.data
       );
-      this.modelManagers.now.handleMessage(message);
+      if (message.trace) {
+        message.trace.displayAt = Date.now();
+      }
+      if (message.channel === "control:clear-schedule") {
+        this.commandScheduler.clear(message.data.group);
+        return;
+      }
+      this.commandScheduler.schedule(message);
     });
     this.nodeAPI.ipc.handleQueryDisplayWindowState(() => {
       this.nodeAPI.ipc.sendDisplayWindowState(this.state);
@@ -1,5 +1,6 @@
 import { ModelManager } from "./ModelManager";
 import { ParameterMonitor, PartMonitor } from "@display/utils/live2d/Monitor";
+import { MotionOverlay } from "@display/utils/live2d/MotionOverlay";
 import { Live2DFaceMeshCaptureManager as FaceMeshCaptureManager } from "@display/utils/capture/Live2DFaceMeshCaptureManager";
 import { setModelBaseTransfrom, draggable } from "@display/utils/2d/utils";
 import {
@@ -17,6 +18,10 @@ export class Live2dManager extends ModelManager {
     this.partMonitor = null;
     this.captureManagerNow = null;
     this.focusPosition = null;
+    // API设置的持续覆盖参数：parameterId -> { value, weight, expiresAt }
+    this.parameterOverrides = new Map();
+    // API传来的烘焙动作，叠加在模型自己的动作之上
+    this.motionOverlay = null;
 
     this.app = null;
     this.model = null;
@@ -89,6 +94,11 @@ export class Live2dManager extends ModelManager {
       draggable(this.model);
     }
     this.model.on("dragging", this._updateModelTransform.bind(this));
+    // 在动作、呼吸、眨眼等更新完成之后、coreModel.update之前重新写入覆盖参数，否则下一帧就会被覆盖掉
+    this.model.internalModel.on(
+      "beforeModelUpdate",
+      this._applyParameterOverrides
+    );
     this._bindEventAnimation();
     this._startRender();
     return this._buildModelControlInfo(modelInfo);
@@ -151,6 +161,8 @@ export class Live2dManager extends ModelManager {
       this.model.destroy();
     }
     this.model = null;
+    this.parameterOverrides.clear();
+    this.motionOverlay = null;
     this.parameterMonitor.clear();
     this.partMonitor.clear();
   }
@@ -253,11 +265,14 @@ export class Live2dManager extends ModelManager {
       // 不像文档（https://guansss.github.io/pixi-live2d-display/interactions/）这样直接将focus函数写在事件监听里，而是在渲染时调用，应该能减少非必要的focus运行次数
       this.model.focus(this.focusPosition.x, this.focusPosition.y);
     }
+    // 到点的定时命令在本帧的模型更新之前执行
+    this.commandScheduler.flush();
     // 销毁模型后不再调用
     // 经过实际测试，发现使用pixi官方的app.ticker.add操作（https://pixijs.io/guides/basics/getting-started.html）似乎会丢失自动鼠标跟踪（虽然现在也不用自动跟踪了……）
     if (!this.model.destroyed) {
       this.model.update(now - this.then);
       this.then = now;
+      this.commandScheduler.frameRendered();
       requestAnimationFrame(this._render.bind(this));
     }
     if (this.parameterMonitor.checkUpdate()) {
@@ -287,6 +302,14 @@ export class Live2dManager extends ModelManager {
         this._setParameter(message.data);
         break;
       }
+      case "control:hold-parameter": {
+        this._holdParameter(message.data);
+        break;
+      }
+      case "control:release-parameter": {
+        this._releaseParameter(message.data.parameterIds);
+        break;
+      }
       case "control:bind-part": {
         this._bindPart(message.data.partId);
         break;
@@ -296,7 +319,12 @@ export class Live2dManager extends ModelManager {
         break;
       }
       case "control:play-motion": {
-        this._loadMotion(message.data.motion);
+        // motionFilePath是给MMD模型的.vmd，Live2D模型忽略
+        if (message.data.motion?.motion) {
+          this._playMotionData(message.data.motion);
+        } else if (message.data.motion) {
+          this._loadMotion(message.data.motion);
+        }
         break;
       }
       // 目前看来，面部捕捉和动画播放并不冲突，所以可以同时进行，动画播放的优先级高于面部捕捉
@@ -342,6 +370,58 @@ export class Live2dManager extends ModelManager {
     // 直接手动更新Monitor的数值，防止checkUpdate机制循环发送更新消息
     this.parameterMonitor.value = value;
   }
+  _holdParameter({ parameterId, value, weight = 1, ttl = null }) {
+    this.parameterOverrides.set(parameterId, {
+      value,
+      weight: Math.min(Math.max(weight, 0), 1),
+      expiresAt: ttl === null ? Infinity : performance.now() + ttl,
+    });
+    this.parameterMonitor.value = value;
+  }
+  _releaseParameter(parameterIds) {
+    // 不指定parameterIds时释放全部
+    if (!parameterIds) {
+      this.parameterOverrides.clear();
+      return;
+    }
+    parameterIds.forEach((parameterId) =>
+      this.parameterOverrides.delete(parameterId)
+    );
+  }
+  // 箭头函数，保证作为事件回调时this指向正确
+  _applyParameterOverrides = () => {
+    const coreModel = this.model.internalModel.coreModel;
+    if (this.motionOverlay !== null) {
+      this.motionOverlay.apply(coreModel);
+      if (this.motionOverlay.finished) {
+        // 动作结束：最终的表情转为持续覆盖参数，与setParameters的hold一致
+        this.motionOverlay.hold.forEach((parameter) =>
+          this._holdParameter(parameter)
+        );
+        this.motionOverlay = null;
+      }
+    }
+    if (this.parameterOverrides.size === 0) {
+      return;
+    }
+    const now = performance.now();
+    this.parameterOverrides.forEach((override, parameterId) => {
+      if (now >= override.expiresAt) {
+        this.parameterOverrides.delete(parameterId);
+        return;
+      }
+      if (override.weight >= 1) {
+        coreModel.setParameterValueById(parameterId, override.value);
+      } else {
+        // 按权重与动作计算出的当前值混合
+        const current = coreModel.getParameterValueById(parameterId);
+        coreModel.setParameterValueById(
+          parameterId,
+          current + (override.value - current) * override.weight
+        );
+      }
+    });
+  };
   _bindPart(partId) {
     this.partMonitor.bind(partId, this.model);
   }
@@ -363,6 +443,20 @@ export class Live2dManager extends ModelManager {
     );
     this.model.motion(motionInfo.group, motionIndex);
   }
+  // API直接传来的motion3.json内容(烘焙好的反应动作)：作为叠加层播放，不占用模型的动作，反应动作可以同时播放
+  // release是开始时要释放的覆盖参数(动作自身的参数总会释放，否则持续覆盖会盖住动作)，hold是结束后保持的参数
+  _playMotionData({ motion, release = [], hold = [] }) {
+    if (
+      this.model.internalModel.motionManager.motionDataType !== "json"
+    ) {
+      console.warn("[Hime Display] Inline motions need a Cubism 3+ model");
+      return;
+    }
+    const overlay = new MotionOverlay(motion, hold);
+    this._releaseParameter([...release, ...overlay.parameterIds]);
+    // 新的反应动作立刻替换正在播放的
+    this.motionOverlay = overlay;
+  }
   _quitCapture() {
     this.captureManagerNow?.quitCapture();
     this.captureManagerNow = null;
@@ -5,6 +5,8 @@ export class ModelManager {
     this.stats = parentApp.stats;
     this.resolution = parentApp.resolution;
     this.antialias = parentApp.antialias;
+    // 带at的API命令在这里排队，渲染循环更新模型前调用flush执行到期的命令
+    this.commandScheduler = parentApp.commandScheduler;
   }
   onSendToModelControl(callback) {
     this._sendToModelControl = callback;
@@ -64,8 +64,10 @@ class ModelManager3D extends ModelManager {
     if (!this.shouldRender) {
       return;
     }
+    this.commandScheduler.flush();
     this._updateObjects();
     this.effect.render(this.scene, this.camera);
+    this.commandScheduler.frameRendered();
     requestAnimationFrame(this._render.bind(this));
   }
   _clearModel() {
@@ -0,0 +1,94 @@
+// API命令可以带上显示端时间戳at（毫秒），提前发送，到点的那一帧再交给模型管理器执行
+// 这样网络和Python事件循环的抖动就不会直接反映到画面上
+// 带trace的命令会记录交给管理器的时间和生效那一帧的时间，通过reportTraces发回去
+export class CommandScheduler {
+  constructor(dispatch, reportTraces = null) {
+    this.dispatch = dispatch;
+    this.reportTraces = reportTraces;
+    // 已经交给管理器、等待下一帧生效的trace
+    this.traces = [];
+    // 按at升序排列，at相同的保持到达顺序
+    this.queue = [];
+    this.frameRequested = false;
+    this._onFrame = this._onFrame.bind(this);
+  }
+  schedule(message) {
+    if (message.at === undefined || message.at <= Date.now()) {
+      this._dispatch(message);
+      return;
+    }
+    // 二分查找插入位置（放在所有at相同的消息之后）
+    let low = 0;
+    let high = this.queue.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (this.queue[mid].at <= message.at) {
+        low = mid + 1;
+      } else {
+        high = mid;
+      }
+    }
+    this.queue.splice(low, 0, message);
+    this._requestFrame();
+  }
+  // group为null时清空全部
+  clear(group = null) {
+    this.queue =
+      group === null ? [] : this.queue.filter((message) => message.group !== group);
+  }
+  flush(now = Date.now()) {
+    let due = 0;
+    while (due < this.queue.length && this.queue[due].at <= now) {
+      due++;
+    }
+    if (due === 0) {
+      return;
+    }
+    const messages = this.queue.splice(0, due);
+    for (const message of messages) {
+      try {
+        this._dispatch(message);
+      } catch (error) {
+        console.error("[Hime Display] Scheduled command failed:", error);
+      }
+    }
+  }
+  // 模型更新完一帧之后调用，此前交出去的带trace的命令都算在这一帧生效
+  frameRendered(now = Date.now()) {
+    if (this.traces.length === 0) {
+      return;
+    }
+    const traces = this.traces;
+    this.traces = [];
+    for (const trace of traces) {
+      trace.appliedAt = now;
+    }
+    this.reportTraces(traces);
+  }
+  _dispatch(message) {
+    if (message.trace && this.reportTraces) {
+      message.trace.dispatchedAt = Date.now();
+      this.traces.push(message.trace);
+      // 没有模型管理器报告帧的时候由自己的帧回调兜底
+      this._requestFrame();
+    }
+    this.dispatch(message);
+  }
+  _requestFrame() {
+    if (!this.frameRequested) {
+      this.frameRequested = true;
+      requestAnimationFrame(this._onFrame);
+    }
+  }
+  _onFrame() {
+    // Live2D和3D管理器在每帧更新模型前会自己调用flush，这里的帧回调是给其他管理器（以及没有模型时）兜底的
+    // 队列空了就不再请求帧
+    this.flush();
+    this.frameRendered();
+    if (this.queue.length > 0) {
+      requestAnimationFrame(this._onFrame);
+    } else {
+      this.frameRequested = false;
+    }
+  }
+}
@@ -0,0 +1,105 @@
+// API传来的motion3.json内容(烘焙好的反应动作)：不进入motionManager，而是在每帧动作更新之后叠加上去
+// 这样模型自己的动作(例如playRandomMotion的反应动作)照常播放，烘焙的表情和口型盖在上面
+
+// 与Cubism SDK相同的淡入淡出曲线
+const easeSine = (value) =>
+  value <= 0 ? 0 : value >= 1 ? 1 : 0.5 - 0.5 * Math.cos(value * Math.PI);
+
+// 把Segments数组拆成[{ type, points: [[t, v], ...] }]，points包含上一段的终点
+function parseSegments(segments) {
+  const parsed = [];
+  let last = [segments[0], segments[1]];
+  for (let i = 2; i < segments.length; ) {
+    const type = segments[i];
+    // 0: 线性，1: 贝塞尔(两个控制点)，2: 阶梯，3: 反向阶梯
+    const pointCount = type === 1 ? 3 : 1;
+    const points = [last];
+    for (let p = 0; p < pointCount; p++) {
+      points.push([segments[i + 1 + p * 2], segments[i + 2 + p * 2]]);
+    }
+    parsed.push({ type, points });
+    last = points[points.length - 1];
+    i += 1 + pointCount * 2;
+  }
+  return { start: [segments[0], segments[1]], segments: parsed };
+}
+
+function evaluateCurve({ start, segments }, time) {
+  if (segments.length === 0 || time <= start[0]) {
+    return start[1];
+  }
+  const segment =
+    segments.find(({ points }) => time <= points[points.length - 1][0]) ??
+    segments[segments.length - 1];
+  const points = segment.points;
+  const first = points[0];
+  const end = points[points.length - 1];
+  if (time >= end[0]) {
+    return end[1];
+  }
+  const progress = (time - first[0]) / (end[0] - first[0] || 1);
+  switch (segment.type) {
+    case 1: {
+      // AreBeziersRestricted：贝塞尔的参数直接按时间线性取
+      const [p0, p1, p2, p3] = points.map((point) => point[1]);
+      const rest = 1 - progress;
+      return (
+        rest * rest * rest * p0 +
+        3 * rest * rest * progress * p1 +
+        3 * rest * progress * progress * p2 +
+        progress * progress * progress * p3
+      );
+    }
+    case 2:
+      return first[1];
+    case 3:
+      return end[1];
+    default:
+      return first[1] + (end[1] - first[1]) * progress;
+  }
+}
+
+export class MotionOverlay {
+  // hold([{ parameterId, value }])在动作结束后保持住，所以这些参数不做淡出，直接停在最后的值上
+  constructor(motion, hold = []) {
+    const holdIds = hold.map((parameter) => parameter.parameterId);
+    this.hold = hold;
+    const meta = motion.Meta ?? {};
+    this.duration = meta.Duration ?? 0;
+    this.fadeIn = meta.FadeInTime ?? 0;
+    this.fadeOut = meta.FadeOutTime ?? 0;
+    this.curves = motion.Curves.filter(
+      (curve) =>
+        curve.Target === "Parameter" && (curve.Segments?.length ?? 0) >= 2
+    ).map((curve) => ({
+      id: curve.Id,
+      held: holdIds.includes(curve.Id),
+      ...parseSegments(curve.Segments),
+    }));
+    this.startedAt = performance.now();
+  }
+  get parameterIds() {
+    return this.curves.map((curve) => curve.id);
+  }
+  get finished() {
+    return this.elapsed >= this.duration;
+  }
+  get elapsed() {
+    return (performance.now() - this.startedAt) / 1000;
+  }
+  apply(coreModel) {
+    const time = Math.min(this.elapsed, this.duration);
+    const fadeIn = this.fadeIn > 0 ? easeSine(time / this.fadeIn) : 1;
+    const fadeOut =
+      this.fadeOut > 0 ? easeSine((this.duration - time) / this.fadeOut) : 1;
+    this.curves.forEach((curve) => {
+      const weight = curve.held ? fadeIn : fadeIn * fadeOut;
+      const value = evaluateCurve(curve, time);
+      const current = coreModel.getParameterValueById(curve.id);
+      coreModel.setParameterValueById(
+        curve.id,
+        current + (value - current) * weight
+      );
+    });
+  }
+}